@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks on synthetic kernels.
+
+    python benchmark.py                          # print a table
+    python benchmark.py --output base.json       # and save the results
+    python benchmark.py --compare base.json      # exit 1 on regressions
+
+The kernels are generated by synthetic_kernels into a temporary
+directory (or --kernels DIR, reused if it already holds a
+meta-kernel), so no NAIF data is needed. The groups are
+
+    search    gfposc elevation and gfoclt occultation/eclipse searches
+              over span lengths and step sizes
+    example   viewpr, visibl, shade and geometry_find as shipped
+    window    IntervalSet operations against the SPICE wn* routines
+              for growing interval counts
+    convert   ET to UTC conversion and result export
+
+Each case is timed --repeat times and the best and median wall times
+are recorded. --compare matches cases by group, name and parameters
+and reports those whose best time grew by more than --tolerance.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import spiceypy
+
+import synthetic_kernels
+from et_convert import et2datetime64
+from export import SearchResult, write_csv
+from interval_set import IntervalSet
+from kernel_session import KernelSession
+from parallel_search import run_search
+
+EPOCH = '2004 MAY 2 TDB'
+DAY = 86400.0
+
+SPANS = [1, 4, 16]
+STEPS = [60.0, 300.0, 900.0]
+COUNTS = [1000, 10000, 100000]
+
+
+def measure(fn, repeat=3):
+    """
+    Best and median wall time of repeat calls of fn().
+    """
+    times = []
+    for _ in range( repeat ):
+        t0 = time.perf_counter()
+        fn()
+        times.append( time.perf_counter() - t0 )
+    return { 'best': min( times ), 'median': float( np.median( times ) ),
+             'repeat': repeat }
+
+
+def _record(group, name, params, timing, **extra):
+    record = { 'group': group, 'name': name, 'params': params }
+    record.update( timing )
+    record.update( extra )
+    return record
+
+
+def _confine(span):
+    et0 = spiceypy.str2et( EPOCH )
+    return np.array( [[et0, et0 + span * DAY]] )
+
+
+def bench_search(spans, steps, repeat):
+    elvlim = spiceypy.rpd() * 6.0
+    records = []
+    for span in spans:
+        cnfine = _confine( span )
+        for step in steps:
+            args = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14', 'LATITUDINAL',
+                     'LATITUDE', '>', elvlim, 0.0, step, 10000 )
+            found = []
+            timing = measure( lambda: found.append(
+                run_search( 'gfposc', args, 20000, cnfine ) ), repeat )
+            records.append( _record( 'search', 'gfposc_elevation',
+                                     { 'span': span, 'step': step },
+                                     timing, intervals=len( found[-1] ) ) )
+
+            for name, args in (
+                    ( 'gfoclt_occultation',
+                      ( 'ANY', 'MARS', 'ELLIPSOID', 'IAU_MARS', 'MEX',
+                        'POINT', ' ', 'CN+S', 'DSS-14', step ) ),
+                    ( 'gfoclt_eclipse',
+                      ( 'ANY', 'MARS', 'ELLIPSOID', 'IAU_MARS', 'SUN',
+                        'ELLIPSOID', 'IAU_SUN', 'CN+S', 'MEX', step ) ) ):
+                found = []
+                timing = measure( lambda: found.append(
+                    run_search( 'gfoclt', args, 20000, cnfine ) ), repeat )
+                records.append( _record( 'search', name,
+                                         { 'span': span, 'step': step },
+                                         timing,
+                                         intervals=len( found[-1] ) ) )
+    return records
+
+
+def bench_example(directory, repeat):
+    #
+    # mex_visible loads './mexMetaK.tm.txt', so run it from the kernel
+    # directory.
+    #
+    import mex_visible
+
+    records = []
+    cwd = os.getcwd()
+    os.chdir( directory )
+    try:
+        for name in ( 'viewpr', 'visibl', 'shade', 'geometry_find' ):
+            fn = getattr( mex_visible, name )
+            timing = measure( lambda: fn( verbose=False ), repeat )
+            records.append( _record( 'example', name, {}, timing ) )
+    finally:
+        os.chdir( cwd )
+    return records
+
+
+def random_window(count, seed):
+    """
+    count disjoint intervals with random lengths and gaps.
+    """
+    rng = np.random.default_rng( seed )
+    ends = np.cumsum( rng.uniform( 1.0, 100.0, 2 * count ) )
+    return IntervalSet( ends.reshape( -1, 2 ) )
+
+
+def bench_window(counts, repeat):
+    records = []
+    for count in counts:
+        a = random_window( count, 1 )
+        b = random_window( count, 2 )
+        size = 4 * count
+        ca = a.to_cell( size )
+        cb = b.to_cell( size )
+        cells = {
+            'union':      spiceypy.wnunid,
+            'intersect':  spiceypy.wnintd,
+            'difference': spiceypy.wndifd,
+        }
+        for op, wn in sorted( cells.items() ):
+            timing = measure( lambda: getattr( a, op )( b ), repeat )
+            records.append( _record( 'window', 'IntervalSet.' + op,
+                                     { 'count': count }, timing ) )
+
+            timing = measure( lambda: wn( ca, cb ), repeat )
+            records.append( _record( 'window', 'spiceypy.' + wn.__name__,
+                                     { 'count': count }, timing ) )
+
+        timing = measure( lambda: a.complement( a.array[0, 0],
+                                                a.array[-1, 1] ), repeat )
+        records.append( _record( 'window', 'IntervalSet.complement',
+                                 { 'count': count }, timing ) )
+        timing = measure( lambda: a.to_cell( size ), repeat )
+        records.append( _record( 'window', 'IntervalSet.to_cell',
+                                 { 'count': count }, timing ) )
+        timing = measure( lambda: IntervalSet.from_cell( ca ), repeat )
+        records.append( _record( 'window', 'IntervalSet.from_cell',
+                                 { 'count': count }, timing ) )
+    return records
+
+
+def bench_convert(counts, directory, repeat):
+    et0 = spiceypy.str2et( EPOCH )
+    fmt = 'YYYY-MM-DDTHR:MN:SC.### ::RND'
+    records = []
+    for count in counts:
+        ets = et0 + np.linspace( 0.0, 365.25 * DAY, count )
+        timing = measure( lambda: et2datetime64( ets ), repeat )
+        records.append( _record( 'convert', 'et2datetime64',
+                                 { 'count': count }, timing ) )
+
+        #
+        # The per-epoch loop is what the examples did before; only time
+        # it while it stays affordable.
+        #
+        if count <= 10000:
+            timing = measure( lambda: [spiceypy.timout( et, fmt )
+                                       for et in ets], repeat )
+            records.append( _record( 'convert', 'timout_loop',
+                                     { 'count': count }, timing ) )
+
+        result = SearchResult( 'benchmark', {},
+                               { 'random': random_window( count, 3 ) } )
+        path = os.path.join( directory, 'benchmark.csv' )
+        timing = measure( lambda: write_csv( result, path ), repeat )
+        records.append( _record( 'convert', 'write_csv',
+                                 { 'count': count }, timing ) )
+        os.remove( path )
+    return records
+
+
+def environment():
+    return { 'python': platform.python_version(),
+             'platform': platform.platform(),
+             'machine': platform.machine(),
+             'cpus': os.cpu_count(),
+             'numpy': np.__version__,
+             'spiceypy': spiceypy.__version__,
+             'toolkit': spiceypy.tkvrsn( 'TOOLKIT' ),
+             'time': time.strftime( '%Y-%m-%dT%H:%M:%S' ) }
+
+
+def _key(record):
+    return ( record['group'], record['name'],
+             json.dumps( record['params'], sort_keys=True ) )
+
+
+def compare(records, baseline, tolerance=0.2):
+    """
+    (record, baseline record, ratio) for every case whose best time
+    exceeds the baseline's by more than tolerance.
+    """
+    base = dict( ( _key( r ), r ) for r in baseline )
+    slower = []
+    for record in records:
+        old = base.get( _key( record ) )
+        if old is None or old['best'] <= 0.0:
+            continue
+        ratio = record['best'] / old['best']
+        if ratio > 1.0 + tolerance:
+            slower.append( ( record, old, ratio ) )
+    return slower
+
+
+def _label(record):
+    params = ' '.join( '{:s}={}'.format( k, v )
+                       for k, v in sorted( record['params'].items() ) )
+    return '{:8s} {:24s} {:20s}'.format( record['group'], record['name'],
+                                         params )
+
+
+@contextlib.contextmanager
+def kernel_directory(directory=None):
+    """
+    Directory holding the synthetic kernels, generated if needed.
+    A temporary directory is removed afterwards.
+    """
+    temporary = directory is None
+    if temporary:
+        directory = tempfile.mkdtemp( prefix='spice_bench_' )
+    metakr = os.path.join( directory, synthetic_kernels.METAKR )
+    if not os.path.exists( metakr ):
+        synthetic_kernels.generate( directory )
+    try:
+        yield directory
+    finally:
+        if temporary:
+            shutil.rmtree( directory, ignore_errors=True )
+
+
+def run(groups, directory=None, repeat=3, quick=False):
+    spans  = SPANS[:2]  if quick else SPANS
+    steps  = STEPS[1:2] if quick else STEPS
+    counts = COUNTS[:2] if quick else COUNTS
+
+    records = []
+    with kernel_directory( directory ) as directory:
+        metakr = os.path.join( directory, synthetic_kernels.METAKR )
+        with KernelSession.open( metakr ) as kernels:
+            records.append( _record( 'load', 'furnsh', {},
+                                     { 'best': kernels.load_time,
+                                       'median': kernels.load_time,
+                                       'repeat': 1 } ) )
+            if 'search' in groups:
+                records += bench_search( spans, steps, repeat )
+            if 'example' in groups:
+                records += bench_example( directory, repeat )
+            if 'window' in groups:
+                records += bench_window( counts, repeat )
+            if 'convert' in groups:
+                records += bench_convert( counts, directory, repeat )
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[1] )
+    parser.add_argument( '--groups', default='search,example,window,convert',
+                         help='comma separated benchmark groups' )
+    parser.add_argument( '--kernels', default=None,
+                         help='directory for the synthetic kernels' )
+    parser.add_argument( '--repeat', type=int, default=3 )
+    parser.add_argument( '--quick', action='store_true',
+                         help='smaller parameter grid' )
+    parser.add_argument( '--output', default=None,
+                         help='write the results as JSON' )
+    parser.add_argument( '--compare', default=None,
+                         help='baseline JSON to check for regressions' )
+    parser.add_argument( '--tolerance', type=float, default=0.2 )
+    opts = parser.parse_args( argv )
+
+    records = run( opts.groups.split( ',' ), opts.kernels, opts.repeat,
+                   opts.quick )
+    for record in records:
+        print( '{:s}  {:10.6f} s'.format( _label( record ),
+                                          record['best'] ) )
+
+    if opts.output:
+        with open( opts.output, 'w' ) as f:
+            json.dump( { 'environment': environment(),
+                         'results': records }, f, indent=1 )
+
+    if opts.compare:
+        with open( opts.compare ) as f:
+            baseline = json.load( f )['results']
+        slower = compare( records, baseline, opts.tolerance )
+        for record, old, ratio in slower:
+            print( 'SLOWER {:s}  {:.6f} s -> {:.6f} s ({:.2f}x)'.format(
+                _label( record ), old['best'], record['best'], ratio ) )
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
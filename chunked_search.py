@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming, memory-bounded geometry finder searches.
+
+Instead of one SPICEDOUBLE_CELL(MAXWIN) for the whole span, the span
+is walked in chunks and the intervals found are yielded as they
+complete:
+
+    with KernelSession.open( METAKR ):
+        args = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14',
+                 'LATITUDINAL', 'LATITUDE', '>', revlim, 0.0, 300.0 )
+        for batch in chunked_search( 'gfposc', args, cnfine ):
+            for intbeg, intend in batch:
+                ...
+
+args are the arguments of spiceypy.<name> before nintvls (gfposc)
+or before cnfine (gfoclt). Each chunk is sized so that it should hold
+about `target` intervals at the event density seen so far. If a
+chunk still overflows its cell (SPICE(WINDOWEXCESS)) the capacity is
+doubled and the chunk retried. An interval that reaches the end of a
+chunk is held back and joined with its continuation in the next
+chunk, so every yielded interval is complete; memory use depends on
+target, not on the length of the span.
+"""
+
+import numpy as np
+from spiceypy.utils.exceptions import SpiceyError
+
+from interval_set import IntervalSet
+from parallel_search import run_search
+
+
+def _overflow(exc):
+    return 'WINDOWEXCESS' in ( getattr( exc, 'short', '' ) or str( exc ) )
+
+
+def search_chunk(name, args, search, capacity):
+    """
+    One chunk with the given interval capacity, doubled until the
+    result fits. Returns the result and the capacity that worked.
+    """
+    while True:
+        if name == 'gfposc':
+            full = args + (capacity,)
+        else:
+            full = args
+        try:
+            return run_search( name, full, 2 * capacity, search ), capacity
+        except SpiceyError as exc:
+            if not _overflow( exc ):
+                raise
+            capacity *= 2
+
+
+def chunked_search(name, args, cnfine, chunk=86400.0, target=250,
+                   capacity=None, min_chunk=None, max_chunk=None):
+    """
+    Generator of (N,2) arrays of complete result intervals, in time
+    order, for spiceypy.<name> over cnfine.
+    """
+    win = IntervalSet.from_cell( cnfine )
+    if len( win ) == 0:
+        return
+    step = args[-1]
+    if capacity is None:
+        capacity = 2 * target
+    if min_chunk is None:
+        min_chunk = 10.0 * step
+    if max_chunk is None:
+        max_chunk = 365.25 * 86400.0
+
+    t = win.array[0, 0]
+    stop = win.array[-1, 1]
+    pending = None
+
+    while t < stop:
+        t1 = min( t + chunk, stop )
+        search = win & IntervalSet( [[t, t1]] )
+        if len( search ):
+            found, capacity = search_chunk( name, args, search.array,
+                                            capacity )
+        else:
+            found = np.empty( (0, 2) )
+
+        #
+        # Join the interval held back from the previous chunk if this
+        # chunk's first interval picks it up at the seam.
+        #
+        if pending is not None:
+            if len( found ) and found[0, 0] <= pending[1]:
+                found = found.copy()
+                found[0, 0] = pending[0]
+            else:
+                found = np.vstack( (pending, found) )
+            pending = None
+
+        if len( found ) and found[-1, 1] >= t1 and t1 < stop:
+            pending = found[-1]
+            found = found[:-1]
+        if len( found ):
+            yield found
+
+        #
+        # Size the next chunk from the event density seen here.
+        #
+        measure = search.measure()
+        if measure > 0:
+            count = len( found ) + ( pending is not None )
+            density = max( count, 1 ) / measure
+            chunk = min( max( target / density, min_chunk ), max_chunk )
+        t = t1
+
+    if pending is not None:
+        yield pending.reshape( 1, 2 )
+
+
+def collect(batches):
+    """
+    All yielded intervals as one IntervalSet.
+    """
+    arrays = list( batches ) + [np.empty( (0, 2) )]
+    return IntervalSet( np.concatenate( arrays ) )
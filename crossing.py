@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Batched threshold-crossing searches on a shared sample grid.
+
+gfposc scans the whole confinement window once per condition. Here
+the positions are sampled once on a grid of `step` seconds, with one
+spkpos call per distinct (target, frame, abcorr, observer), and every
+query is answered from the same samples:
+
+    windows = crossing_search( [ ('latitude',  '<', 0.0),
+                                 ('latitude',  '>', rpd * 30.0),
+                                 ('altitude',  '<', 1000.0),
+                                 ('elevation', '>', rpd * 6.0) ],
+                               cnfine )
+
+The quantities are
+
+    latitude, longitude   planetocentric, of target seen from obsrvr
+                          in frame (gfposc LATITUDINAL)
+    altitude              geodetic altitude above the bodvrd ellipsoid
+                          of body (gfposc GEODETIC ALTITUDE)
+    elevation             latitude of target in the topocentric frame
+                          stafrm of station
+
+Each query gives a window in which `quantity relate refval` holds,
+like gfposc. Crossings of refval between samples (and, for longitude,
+of the branch cut at +/-pi, where the condition also flips) are
+bracketed and all brackets are refined together: each iteration
+evaluates every open bracket in one spkpos call per source, using
+the Illinois variant of regula falsi. Brackets are refined to tol
+seconds (the GF convergence tolerance by default).
+As with gfposc, a condition that holds for less than step seconds
+between two samples can be missed.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+from prescan import sample_grid
+
+CNVTOL = 1.0e-6
+
+MAXITER = 100
+
+
+def _geodetic_altitude(pos, radii):
+    """
+    Altitude above the spheroid with equatorial radius radii[0] and
+    polar radius radii[2], as recgeo computes it, for rows of pos.
+    """
+    re = radii[0]
+    rp = radii[2]
+    e2 = 1.0 - ( rp / re )**2
+    rho = np.hypot( pos[:, 0], pos[:, 1] )
+    z = pos[:, 2]
+
+    #
+    # Fixed-point iteration on the geodetic latitude; converges to
+    # machine precision in a few steps for a planet's flattening.
+    #
+    lat = np.arctan2( z, rho * ( 1.0 - e2 ) )
+    for _ in range( 5 ):
+        n = re / np.sqrt( 1.0 - e2 * np.sin( lat )**2 )
+        alt = np.where( np.abs( lat ) < np.pi / 4,
+                        rho / np.cos( lat ) - n,
+                        z / np.sin( lat ) - n * ( 1.0 - e2 ) )
+        lat = np.arctan2( z, rho * ( 1.0 - e2 * n / ( n + alt ) ) )
+    n = re / np.sqrt( 1.0 - e2 * np.sin( lat )**2 )
+    return np.where( np.abs( lat ) < np.pi / 4,
+                     rho / np.cos( lat ) - n,
+                     z / np.sin( lat ) - n * ( 1.0 - e2 ) )
+
+
+def _latitude(pos):
+    return np.arctan2( pos[:, 2], np.hypot( pos[:, 0], pos[:, 1] ) )
+
+
+def _longitude(pos):
+    return np.arctan2( pos[:, 1], pos[:, 0] )
+
+
+class _Sources(object):
+    """
+    Positions of each source (target, frame, abcorr, obsrvr) by the
+    quantities that need them.
+    """
+
+    def __init__(self, target, frame, abcorr, obsrvr, body, station,
+                 stafrm, table=None):
+        self.keys = { 'latitude':  ( target, frame,  abcorr, obsrvr ),
+                      'longitude': ( target, frame,  abcorr, obsrvr ),
+                      'altitude':  ( target, frame,  abcorr, body ),
+                      'elevation': ( target, stafrm, abcorr, station ) }
+        self.body = body
+        self.table = table
+
+    def evaluate(self, quantity, pos):
+        if quantity == 'latitude' or quantity == 'elevation':
+            return _latitude( pos )
+        if quantity == 'longitude':
+            return _longitude( pos )
+        if quantity == 'altitude':
+            _, radii = spiceypy.bodvrd( self.body, 'RADII', 3 )
+            return _geodetic_altitude( pos, radii )
+        raise ValueError( 'unknown quantity {:s}'.format( quantity ) )
+
+    def positions(self, key, ets):
+        if self.table is not None and key in self.table:
+            return self.table.position( key, ets )
+        target, frame, abcorr, obsrvr = key
+        pos, _ = spiceypy.spkpos( target, ets, frame, abcorr, obsrvr )
+        return np.asarray( pos ).reshape( -1, 3 )
+
+
+def _difference(quantity, values, level):
+    """
+    values - level, with longitudes wrapped into [-pi, pi) so that the
+    difference is continuous where it changes sign.
+    """
+    diff = values - level
+    if quantity == 'longitude':
+        diff = np.mod( diff + np.pi, 2.0 * np.pi ) - np.pi
+    return diff
+
+
+def _holds(values, relate, refval):
+    if relate == '>':
+        return values > refval
+    if relate == '<':
+        return values < refval
+    raise ValueError( 'relate must be > or <' )
+
+
+def _brackets(quantity, values, level, same):
+    """
+    Indices i of the samples after which the quantity crosses level
+    before sample i + 1. Longitudes are unwrapped first, so that a
+    crossing of level + 2 pi k is found wherever it happens.
+    """
+    if quantity == 'longitude':
+        track = np.unwrap( values )
+        k = np.floor( ( track - level ) / ( 2.0 * np.pi ) )
+        cross = k[1:] != k[:-1]
+    else:
+        above = values > level
+        cross = above[1:] != above[:-1]
+    return np.flatnonzero( same & cross )
+
+
+def _refine(sources, brackets, tol):
+    """
+    Roots of all brackets together. brackets is a list of
+    (quantity, level, t0, t1) with arrays t0, t1 between which
+    quantity - level changes sign.
+    """
+    state = []
+    for quantity, level, a, b in brackets:
+        state.append( { 'quantity': quantity, 'level': level,
+                        'key': sources.keys[quantity],
+                        'a': a.copy(), 'b': b.copy() } )
+
+    #
+    # Signed distances from the level at the bracket ends, for the
+    # regula falsi steps. One spkpos call per source for all ends.
+    #
+    _evaluate_all( sources, state, 'a', 'fa' )
+    _evaluate_all( sources, state, 'b', 'fb' )
+    for s in state:
+        s['side'] = np.zeros( len( s['a'] ), dtype=int )
+        s['open'] = s['b'] - s['a'] > tol
+
+    for _ in range( MAXITER ):
+        if not any( np.any( s['open'] ) for s in state ):
+            break
+        for s in state:
+            i = np.flatnonzero( s['open'] )
+            a, b = s['a'][i], s['b'][i]
+            fa, fb = s['fa'][i], s['fb'][i]
+
+            #
+            # Regula falsi, falling back to bisection where the step
+            # would not move away from the ends.
+            #
+            t = 0.5 * ( a + b )
+            with np.errstate( divide='ignore', invalid='ignore' ):
+                tf = b - fb * ( b - a ) / ( fb - fa )
+            ok = ( tf > a + 0.25 * tol ) & ( tf < b - 0.25 * tol )
+            t[ok] = tf[ok]
+            s['i'] = i
+            s['t'] = t
+        _evaluate_all( sources, state, 't', 'ft' )
+
+        for s in state:
+            i, t, ft = s['i'], s['t'], s['ft']
+            left = np.sign( ft ) == np.sign( s['fa'][i] )
+
+            #
+            # Illinois: when the same end is kept twice running, halve
+            # its value so that the next step lands on the other side.
+            #
+            s['fb'][i[left & ( s['side'][i] == 1 )]] *= 0.5
+            s['fa'][i[~left & ( s['side'][i] == -1 )]] *= 0.5
+            s['a'][i[left]] = t[left]
+            s['fa'][i[left]] = ft[left]
+            s['b'][i[~left]] = t[~left]
+            s['fb'][i[~left]] = ft[~left]
+            s['side'][i] = np.where( left, 1, -1 )
+            s['open'][i] = s['b'][i] - s['a'][i] > tol
+
+    return [ 0.5 * ( s['a'] + s['b'] ) for s in state ]
+
+
+def _evaluate_all(sources, state, tname, fname):
+    """
+    Set s[fname] to quantity - level at the times s[tname] of every
+    state, with one spkpos call per source.
+    """
+    by_key = {}
+    for s in state:
+        by_key.setdefault( s['key'], [] ).append( s )
+    for key, group in by_key.items():
+        ets = np.concatenate( [s[tname] for s in group] )
+        if len( ets ):
+            pos = sources.positions( key, ets )
+        else:
+            pos = np.empty( (0, 3) )
+        first = 0
+        for s in group:
+            part = pos[first:first + len( s[tname] )]
+            first += len( s[tname] )
+            s[fname] = _difference( s['quantity'],
+                                    sources.evaluate( s['quantity'], part ),
+                                    s['level'] )
+
+
+def crossing_search(queries, cnfine, step=300.0, target='MEX',
+                    frame='IAU_MARS', abcorr='NONE', obsrvr='MARS',
+                    body='MARS', station='DSS-14', stafrm='DSS-14_TOPO',
+                    tol=CNVTOL, table=None):
+    """
+    One IntervalSet per (quantity, relate, refval) query: the part of
+    cnfine in which the condition holds. Positions are looked up in
+    table (an ephemeris_table.EphemerisTable) where it has them.
+    """
+    sources = _Sources( target, frame, abcorr, obsrvr, body, station,
+                        stafrm, table )
+    win = IntervalSet.from_cell( cnfine )
+    if len( win ) == 0:
+        return [ IntervalSet() for _ in queries ]
+    ets, group = sample_grid( win, step )
+    same = group[1:] == group[:-1]
+
+    #
+    # Sample each source once on the grid.
+    #
+    samples = {}
+    for quantity, _, _ in queries:
+        key = sources.keys[quantity]
+        if key not in samples:
+            samples[key] = sources.positions( key, ets )
+
+    #
+    # The condition changes wherever the quantity crosses refval and,
+    # for longitude, wherever it jumps at the branch cut (a crossing
+    # of pi).
+    #
+    starts = []
+    brackets = []
+    owners = []
+    for quantity, relate, refval in queries:
+        values = sources.evaluate( quantity,
+                                   samples[sources.keys[quantity]] )
+        starts.append( _holds( values, relate, refval ) )
+        levels = [refval]
+        if quantity == 'longitude':
+            levels.append( np.pi )
+        owner = []
+        for level in levels:
+            i = _brackets( quantity, values, level, same )
+            brackets.append( ( quantity, level, ets[i], ets[i + 1] ) )
+            owner.append( i )
+        owners.append( owner )
+
+    roots = iter( _refine( sources, brackets, tol ) )
+
+    first = np.concatenate( ( [0], np.flatnonzero( ~same ) + 1 ) )
+    last = np.concatenate( ( np.flatnonzero( ~same ), [len( ets ) - 1] ) )
+    windows = []
+    for h, owner in zip( starts, owners ):
+        t = np.concatenate( [next( roots ) for _ in owner] )
+        g = group[np.concatenate( owner )]
+        order = np.lexsort( ( t, g ) )
+        t, g = t[order], g[order]
+
+        #
+        # The condition flips at every event; its state after the
+        # j-th event of an interval of cnfine follows from the state
+        # at the interval's first sample.
+        #
+        rank = np.arange( len( t ) ) - np.searchsorted( g, g )
+        after = h[first][g] ^ ( rank % 2 == 0 )
+        count = np.bincount( g, minlength=len( first ) )
+        at_end = h[first] ^ ( count % 2 == 1 )
+
+        rise = np.concatenate( ( ets[first][h[first]], t[after] ) )
+        fall = np.concatenate( ( t[~after], ets[last][at_end] ) )
+        windows.append( IntervalSet( np.column_stack(
+                            ( np.sort( rise ), np.sort( fall ) ) ) ) )
+    return windows
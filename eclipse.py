@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Per-eclipse statistics from nested occultation windows.
+
+shade finds the ANY (penumbra: any part of the Sun hidden), FULL
+(umbra) and ANNULAR windows. Umbra and annular phases lie inside a
+penumbra interval, so each is assigned to its eclipse with one
+searchsorted and summed per eclipse:
+
+    stats = eclipse_statistics( result['penumbra'], result['umbra'],
+                                result['annular'] )
+    stats['umbra_duration'].max()
+
+All values are arrays with one entry per penumbra interval; times of
+a phase that does not occur in an eclipse are NaN and its duration 0.
+
+An annular phase needs the front body to look smaller than the Sun.
+Mars seen from MEX is tens of degrees across and the Sun about a
+third of a degree, so annular_possible, a bound from the distances
+sampled over the penumbra, lets shade skip that search.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+
+
+def _assign(outer, inner):
+    """
+    Index of the outer interval containing each inner interval, and
+    the inner intervals that lie in one.
+    """
+    owner = np.searchsorted( outer[:, 0], inner[:, 0], side='right' ) - 1
+    inside = owner >= 0
+    inside[inside] = inner[inside, 1] <= outer[owner[inside], 1]
+    return owner[inside], inner[inside]
+
+
+def eclipse_statistics(penumbra, umbra, annular=None):
+    """
+    Dict of per-eclipse arrays:
+
+        begin, end, duration           penumbra entry, exit and length
+        umbra_begin, umbra_end         first umbra entry, last exit
+        umbra_duration                 total time in umbra
+        annular_begin, annular_end,
+        annular_duration               the same for annular phases
+        partial_duration               time with the Sun partly hidden
+    """
+    pen = IntervalSet.from_cell( penumbra ).array
+    count = len( pen )
+    stats = { 'begin': pen[:, 0], 'end': pen[:, 1],
+              'duration': pen[:, 1] - pen[:, 0] }
+
+    partial = stats['duration'].copy()
+    for label, window in ( ('umbra', umbra), ('annular', annular) ):
+        if window is None:
+            inner = np.empty( (0, 2) )
+        else:
+            inner = IntervalSet.from_cell( window ).array
+        owner, inner = _assign( pen, inner )
+
+        begin = np.full( count, np.inf )
+        end = np.full( count, -np.inf )
+        np.minimum.at( begin, owner, inner[:, 0] )
+        np.maximum.at( end, owner, inner[:, 1] )
+        begin[np.isinf( begin )] = np.nan
+        end[np.isinf( end )] = np.nan
+        duration = np.zeros( count )
+        np.add.at( duration, owner, inner[:, 1] - inner[:, 0] )
+
+        stats[label + '_begin'] = begin
+        stats[label + '_end'] = end
+        stats[label + '_duration'] = duration
+        partial -= duration
+
+    stats['partial_duration'] = partial
+    return stats
+
+
+def _apparent_radius(body, observer, abcorr, ets, step, radius):
+    """
+    Smallest and largest angular radius (radians) body of the given
+    radius can have as seen from observer between the samples ets,
+    step seconds apart.
+    """
+    states, _ = spiceypy.spkezr( body, ets, 'J2000', abcorr, observer )
+    states = np.asarray( states ).reshape( -1, 6 )
+    dist = np.linalg.norm( states[:, :3], axis=1 )
+    drift = np.linalg.norm( states[:, 3:], axis=1 ) * 0.5 * step
+    far = dist + drift
+    near = np.maximum( dist - drift, radius )
+    return ( np.arcsin( radius / far ).min(),
+             np.arcsin( np.minimum( radius / near, 1.0 ) ).max() )
+
+
+def annular_possible(window, observer, front, back, abcorr, step):
+    """
+    Whether front can look smaller than back from observer at some
+    time in window, judged from states step seconds apart with the
+    distance allowed to drift by speed * step / 2 in between.
+    """
+    win = IntervalSet.from_cell( window )
+    if len( win ) == 0:
+        return False
+    ets = np.concatenate( [ np.append( np.arange( b, e, step ), e )
+                            for b, e in win.array ] )
+    _, fradii = spiceypy.bodvrd( front, 'RADII', 3 )
+    _, bradii = spiceypy.bodvrd( back, 'RADII', 3 )
+    smallest, _ = _apparent_radius( front, observer, abcorr, ets, step,
+                                    min( fradii ) )
+    _, largest = _apparent_radius( back, observer, abcorr, ets, step,
+                                   max( bradii ) )
+    return smallest < largest
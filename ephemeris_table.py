@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed, memory-mapped Chebyshev tables of relative states.
+
+The examples ask SPICE for the same few aberration-corrected states
+(MEX seen from DSS-14, the Sun and Mars seen from MEX, ...) over the
+same span again and again. build_table samples each of them once with
+spkezr, fits Chebyshev polynomials of the given degree to position
+and velocity on segments of equal length and writes one .npy file per
+state plus an index.json:
+
+    with KernelSession.open( METAKR ):
+        build_table( './ephem', [ ('MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14'),
+                                  ('SUN', 'IAU_MARS',    'CN+S', 'MEX') ],
+                     et0, et1, tol=1.0e-3 )
+
+    table = EphemerisTable( './ephem' )          # no kernels needed
+    pos = table.position( ('MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14'), ets )
+
+The coefficient files are opened with mmap_mode='r', so any number of
+worker processes share one copy in the page cache and a lookup touches
+only the segments it needs.
+
+Error bound: after the fit every segment is checked against spkezr at
+the extrema of the next Chebyshev polynomial, between the fitting
+nodes and at the segment ends, where the interpolation error peaks.
+With tol given, the segment length is halved until the largest
+position error found there is below tol km; if that still fails at
+min_seglen, build_table raises ValueError. The largest position (km)
+and velocity (km/s) errors found are stored as error_pos and
+error_vel for each state, and the worst over all states for the
+table, and reported by table.error( key ) and table.error().
+
+The segments tile [start, stop] exactly: their length is the largest
+that divides the span into whole segments and is not above seglen.
+"""
+
+import json
+import os
+
+import numpy as np
+import spiceypy
+
+from result_cache import kernel_fingerprint
+
+
+def _name(key):
+    return '_'.join( part.strip().replace( '-', '' ).replace( ' ', '' )
+                     for part in key ) or 'state'
+
+
+def _states(key, ets):
+    target, frame, abcorr, obsrvr = key
+    states, _ = spiceypy.spkezr( target, ets, frame, abcorr, obsrvr )
+    return np.asarray( states ).reshape( -1, 6 )
+
+
+def _chebval(tau, coef):
+    """
+    Clenshaw evaluation of coef[n, :, :] at tau[n], for all n.
+    """
+    b1 = np.zeros( coef.shape[:2] )
+    b2 = np.zeros( coef.shape[:2] )
+    t = tau[:, None]
+    for j in range( coef.shape[2] - 1, 0, -1 ):
+        b1, b2 = 2.0 * t * b1 - b2 + coef[:, :, j], b1
+    return t * b1 - b2 + coef[:, :, 0]
+
+
+def fit_segments(key, start, seglen, nseg, degree):
+    """
+    Chebyshev coefficients, shape (nseg, 6, degree + 1), of the state
+    on each of nseg segments of seglen seconds from start.
+    """
+    k = np.arange( degree + 1 )
+    nodes = np.cos( np.pi * ( k + 0.5 ) / ( degree + 1 ) )
+    begins = start + seglen * np.arange( nseg )
+    ets = ( begins[:, None] + 0.5 * seglen * ( nodes + 1.0 ) ).ravel()
+    states = _states( key, ets ).reshape( nseg, degree + 1, 6 )
+
+    #
+    # One least squares fit for all segments and components at once;
+    # on the Chebyshev nodes it is the interpolant.
+    #
+    y = states.transpose( 1, 0, 2 ).reshape( degree + 1, nseg * 6 )
+    coef = np.polynomial.chebyshev.chebfit( nodes, y, degree )
+    return coef.reshape( degree + 1, nseg, 6 ).transpose( 1, 2, 0 )
+
+
+def check_segments(key, coef, start, seglen):
+    """
+    Largest position and velocity errors of coef against spkezr
+    between the fitting nodes of every segment.
+    """
+    nseg, _, ncoef = coef.shape
+
+    #
+    # The extrema of T_(degree+1), between the nodes and at the
+    # segment ends.
+    #
+    tau = np.cos( np.pi * np.arange( ncoef + 1 ) / ncoef )
+    seg = np.repeat( np.arange( nseg ), len( tau ) )
+    tau = np.tile( tau, nseg )
+    ets = start + seglen * ( seg + 0.5 * ( tau + 1.0 ) )
+    err = _chebval( tau, coef[seg] ) - _states( key, ets )
+    return ( float( np.max( np.linalg.norm( err[:, :3], axis=1 ) ) ),
+             float( np.max( np.linalg.norm( err[:, 3:], axis=1 ) ) ) )
+
+
+def build_table(directory, keys, start, stop, seglen=3600.0, degree=15,
+                tol=None, min_seglen=60.0):
+    """
+    Fit and store the states keys, each a (target, frame, abcorr,
+    obsrvr) tuple, over [start, stop]. Kernels must be loaded.
+    Returns the EphemerisTable. Raises ValueError if tol is not met
+    with segments of min_seglen seconds.
+    """
+    if not os.path.isdir( directory ):
+        os.makedirs( directory )
+    index = { 'kernels': kernel_fingerprint(), 'tables': [] }
+
+    for key in keys:
+        key = tuple( key )
+        nseg = max( int( np.ceil( ( stop - start ) / seglen ) ), 1 )
+        while True:
+            length = ( stop - start ) / nseg
+            coef = fit_segments( key, start, length, nseg, degree )
+            error_pos, error_vel = check_segments( key, coef, start, length )
+            if tol is None or error_pos <= tol:
+                break
+            if length / 2 < min_seglen:
+                raise ValueError( '{:s}: position error {:.3e} km above '
+                                  'tol {:.3e} km with {:.1f} s segments'
+                                  .format( ', '.join( key ), error_pos,
+                                           tol, length ) )
+            nseg *= 2
+
+        name = _name( key ) + '.npy'
+        np.save( os.path.join( directory, name ), coef )
+        index['tables'].append( { 'key': list( key ), 'file': name,
+                                  'start': start, 'stop': stop,
+                                  'seglen': length, 'nseg': nseg,
+                                  'degree': degree,
+                                  'error_pos': error_pos,
+                                  'error_vel': error_vel } )
+
+    index['error_pos'] = max( [ t['error_pos'] for t in index['tables'] ]
+                              or [0.0] )
+    index['error_vel'] = max( [ t['error_vel'] for t in index['tables'] ]
+                              or [0.0] )
+    with open( os.path.join( directory, 'index.json' ), 'w' ) as f:
+        json.dump( index, f, indent=1 )
+    return EphemerisTable( directory )
+
+
+class EphemerisTable(object):
+
+    def __init__(self, directory, verify=False):
+        """
+        Open the tables in directory. With verify=True the kernels
+        loaded now must be those the tables were built from.
+        """
+        self.directory = directory
+        with open( os.path.join( directory, 'index.json' ) ) as f:
+            index = json.load( f )
+        if verify and index['kernels'] != json.loads(
+                          json.dumps( kernel_fingerprint() ) ):
+            raise ValueError( '{:s} was built from other kernels'.format(
+                directory ) )
+        self.error_pos = index.get( 'error_pos' )
+        self.error_vel = index.get( 'error_vel' )
+        self.tables = {}
+        for entry in index['tables']:
+            entry = dict( entry )
+            entry['coef'] = np.load( os.path.join( directory,
+                                                   entry['file'] ),
+                                     mmap_mode='r' )
+            self.tables[tuple( entry['key'] )] = entry
+
+    def __contains__(self, key):
+        return tuple( key ) in self.tables
+
+    def keys(self):
+        return list( self.tables )
+
+    def error(self, key=None):
+        """
+        (position km, velocity km/s) error bound found when building,
+        of one state or the worst of all.
+        """
+        if key is None:
+            return self.error_pos, self.error_vel
+        entry = self.tables[tuple( key )]
+        return entry['error_pos'], entry['error_vel']
+
+    def state(self, key, ets):
+        """
+        (N,6) states at ets, from the table alone.
+        """
+        entry = self.tables[tuple( key )]
+        ets = np.atleast_1d( np.asarray( ets, dtype=float ) )
+        rel = ( ets - entry['start'] ) / entry['seglen']
+        if np.any( ets < entry['start'] ) or np.any( ets > entry['stop'] ):
+            raise ValueError( 'epochs outside the table span '
+                              '[{:.3f}, {:.3f}]'.format( entry['start'],
+                                                         entry['stop'] ) )
+        seg = np.minimum( rel.astype( int ), entry['nseg'] - 1 )
+        tau = 2.0 * ( rel - seg ) - 1.0
+        return _chebval( tau, entry['coef'][seg] )
+
+    def position(self, key, ets):
+        return self.state( key, ets )[:, :3]
+
+    def velocity(self, key, ets):
+        return self.state( key, ets )[:, 3:]
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized ET -> UTC conversion.
+
+Rather than formatting every epoch with timout and parsing it back
+with strptime, the leapsecond kernel constants (DELTET/...) are read
+from the kernel pool once and the whole ET array is converted with
+NumPy:
+
+    ET(TDB) -> TDT -> TAI -> UTC -> datetime64
+
+The result is truncated to the requested unit the same way timout
+truncates "SC.###", so the default millisecond output matches
+
+    timout( et, 'YYYY-MM-DDTHR:MN:SC.###::UTC' )
+
+exactly. NumPy has no 23:59:60, so epochs inside a positive leap
+second are held at the last representable instant of 23:59:59.
+Before the first DELTA_AT entry (1972) the offset is one second less
+than that entry, as deltet takes it, so those epochs match timout
+too.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+
+#
+# J2000 expressed as a (leapsecond-free) calendar epoch.
+#
+J2000 = np.datetime64('2000-01-01T12:00:00', 'us')
+
+UNITS = {'s': 1, 'ms': 1000, 'us': 1000000}
+
+
+class LeapSecondTable(object):
+    """
+    DELTET constants and the TAI epochs at which DELTA_AT changes,
+    read from the kernel pool (an LSK must be loaded).
+    """
+
+    def __init__(self):
+        self.delta_t_a = spiceypy.gdpool( 'DELTET/DELTA_T_A', 0, 1 )[0]
+        self.k         = spiceypy.gdpool( 'DELTET/K',         0, 1 )[0]
+        self.eb        = spiceypy.gdpool( 'DELTET/EB',        0, 1 )[0]
+        self.m0, self.m1 = spiceypy.gdpool( 'DELTET/M',       0, 2 )
+
+        n, _ = spiceypy.dtpool( 'DELTET/DELTA_AT' )
+        table = np.asarray( spiceypy.gdpool( 'DELTET/DELTA_AT', 0, n ) )
+
+        #
+        # The pool stores DELTA_AT as (offset, UTC epoch) pairs with
+        # the epochs in formal calendar seconds past J2000. Shift each
+        # epoch to TAI so that the table can be searched directly.
+        # An entry one second below the first, from the beginning of
+        # time, covers the epochs before the table as deltet does.
+        #
+        self.dat = np.concatenate( ( [table[0] - 1.0], table[0::2] ) )
+        self.utc = np.concatenate( ( [-np.inf], table[1::2] ) )
+        self.tai = self.utc + self.dat
+
+    def et2tai(self, et):
+        #
+        # TDB -> TDT: TDB = TDT + K*sin(E), with E evaluated at TDT.
+        # A few fixed point iterations converge far below a
+        # microsecond.
+        #
+        tdt = et
+        for _ in range(3):
+            m = self.m0 + self.m1 * tdt
+            e = m + self.eb * np.sin( m )
+            tdt = et - self.k * np.sin( e )
+        return tdt - self.delta_t_a
+
+    def et2utc(self, et):
+        """
+        UTC as formal calendar seconds past J2000, and for epochs that
+        fall inside a leap second the calendar epoch it precedes
+        (+inf elsewhere).
+        """
+        tai = self.et2tai( np.asarray( et, dtype=np.float64 ) )
+        i = np.searchsorted( self.tai, tai, side='right' ) - 1
+        utc = tai - self.dat[i]
+
+        #
+        # A positive leap second occupies the last second before the
+        # next table entry; at that point the old offset runs the
+        # calendar past midnight.
+        #
+        nxt = np.minimum( i + 1, len( self.utc ) - 1 )
+        leap = ( nxt > i ) & ( utc >= self.utc[nxt] )
+        return utc, np.where( leap, self.utc[nxt], np.inf )
+
+
+def et2datetime64(et, unit='ms', table=None):
+    """
+    Convert an ET scalar or array to numpy datetime64[unit] UTC.
+    """
+    if table is None:
+        table = LeapSecondTable()
+    scale = UNITS[unit]
+    utc, bound = table.et2utc( et )
+    utc = np.minimum( utc, bound - 0.5 / scale )
+
+    #
+    # Split off whole seconds before scaling: at 1e8 s the product
+    # utc*scale no longer resolves a nanosecond and would round up
+    # across a millisecond boundary that timout truncates below.
+    #
+    whole = np.floor( utc )
+    ticks = whole.astype( np.int64 ) * scale + \
+            np.floor( ( utc - whole ) * scale ).astype( np.int64 )
+    return J2000.astype( 'datetime64[{:s}]'.format( unit ) ) + \
+           ticks.astype( 'timedelta64[{:s}]'.format( unit ) )
+
+
+def et2datetime(et, unit='ms', table=None):
+    """
+    Same as et2datetime64 but as an object array of datetime.datetime.
+    """
+    return et2datetime64( et, unit, table ).astype( 'datetime64[us]' ) \
+                                           .astype( object )
+
+
+def window2datetime(window, unit='ms', table=None, as_datetime=True):
+    """
+    Convert every interval of a SPICE window, an IntervalSet or an
+    (N,2) ET array in one call. Returns the begin and end arrays.
+    """
+    if isinstance( window, np.ndarray ):
+        ets = window.reshape( -1, 2 )
+    else:
+        ets = IntervalSet.from_cell( window ).array
+    if table is None:
+        table = LeapSecondTable()
+    convert = et2datetime if as_datetime else et2datetime64
+    return ( convert( ets[:, 0], unit, table ),
+             convert( ets[:, 1], unit, table ) )
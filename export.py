@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Structured search results and streaming writers.
+
+viewpr, visibl, shade and geometry_find return a SearchResult: the
+search inputs plus one IntervalSet per named window. The writers
+stream every interval as a row
+
+    window, begin_et, end_et, duration, begin_utc, end_utc
+
+in batches, converting ETs to UTC with et_convert one batch at a
+time, so the cost is dominated by I/O rather than per-row
+formatting:
+
+    result = visibl( verbose=False )
+    write_csv( result, 'visibl.csv' )
+    write_jsonl( result, 'visibl.jsonl' )
+    write_parquet( result, 'visibl.parquet' )    # needs pyarrow
+
+The leapsecond constants are captured when the result is built, so
+the writers work after the kernels have been unloaded.
+"""
+
+import csv
+import json
+
+import numpy as np
+
+from et_convert import LeapSecondTable, et2datetime64
+from interval_set import IntervalSet
+
+COLUMNS = ['window', 'begin_et', 'end_et', 'duration',
+           'begin_utc', 'end_utc']
+
+BATCH = 65536
+
+
+class SearchResult(object):
+
+    def __init__(self, name, inputs, windows, table=None):
+        self.name = name
+        self.inputs = dict( inputs )
+        self.windows = {}
+        for label, window in windows.items():
+            self.windows[label] = IntervalSet.from_cell( window )
+        if table is None:
+            table = LeapSecondTable()
+        self.table = table
+
+    def __getitem__(self, label):
+        return self.windows[label]
+
+    def __repr__(self):
+        return 'SearchResult({:s}: {:s})'.format(
+            self.name, ', '.join( '{:s}={:d}'.format( k, len( w ) )
+                                  for k, w in self.windows.items() ) )
+
+    def batches(self, size=BATCH):
+        """
+        Rows as dicts of column arrays, at most size rows each.
+        """
+        for label, window in self.windows.items():
+            arr = window.array
+            for i in range( 0, len( arr ), size ):
+                part = arr[i:i + size]
+                yield { 'window':    np.full( len( part ), label,
+                                              dtype=object ),
+                        'begin_et':  part[:, 0],
+                        'end_et':    part[:, 1],
+                        'duration':  part[:, 1] - part[:, 0],
+                        'begin_utc': et2datetime64( part[:, 0], 'ms',
+                                                    self.table ),
+                        'end_utc':   et2datetime64( part[:, 1], 'ms',
+                                                    self.table ) }
+
+
+def _text_columns(batch):
+    return ( batch['window'],
+             np.char.mod( '%.6f', batch['begin_et'] ),
+             np.char.mod( '%.6f', batch['end_et'] ),
+             np.char.mod( '%.6f', batch['duration'] ),
+             np.datetime_as_string( batch['begin_utc'], unit='ms' ),
+             np.datetime_as_string( batch['end_utc'],   unit='ms' ) )
+
+
+def write_csv(result, path, batch=BATCH):
+    with open( path, 'w', newline='' ) as f:
+        writer = csv.writer( f )
+        writer.writerow( COLUMNS )
+        for rows in result.batches( batch ):
+            writer.writerows( zip( *_text_columns( rows ) ) )
+
+
+def write_jsonl(result, path, batch=BATCH):
+    #
+    # The numbers and timestamps are formatted by NumPy already; only
+    # the window label needs JSON quoting, once per window.
+    #
+    line = ( '{{"window": {0}, "begin_et": {1}, "end_et": {2}, '
+             '"duration": {3}, "begin_utc": "{4}", "end_utc": "{5}"}}\n' )
+    quoted = {}
+    with open( path, 'w' ) as f:
+        for rows in result.batches( batch ):
+            cols = list( _text_columns( rows ) )
+            label = cols[0][0]
+            if label not in quoted:
+                quoted[label] = json.dumps( label )
+            cols[0] = [quoted[label]] * len( cols[1] )
+            f.write( ''.join( line.format( *row ) for row in zip( *cols ) ) )
+
+
+def _arrow_batches(result, batch):
+    import pyarrow as pa
+    schema = pa.schema( [('window',    pa.string()),
+                         ('begin_et',  pa.float64()),
+                         ('end_et',    pa.float64()),
+                         ('duration',  pa.float64()),
+                         ('begin_utc', pa.timestamp( 'ms' )),
+                         ('end_utc',   pa.timestamp( 'ms' ))] )
+    def generate():
+        for rows in result.batches( batch ):
+            yield pa.record_batch( [pa.array( rows[name].tolist()
+                                              if name == 'window'
+                                              else rows[name] )
+                                    for name in COLUMNS], schema=schema )
+    return schema, generate()
+
+
+def write_parquet(result, path, batch=BATCH):
+    """
+    Columnar Parquet file, one row group per batch. Needs pyarrow.
+    """
+    import pyarrow.parquet as pq
+    schema, batches = _arrow_batches( result, batch )
+    with pq.ParquetWriter( path, schema ) as writer:
+        for rb in batches:
+            writer.write_batch( rb )
+
+
+def write_arrow(result, path, batch=BATCH):
+    """
+    Arrow IPC (Feather v2) file, one record batch per batch. Needs
+    pyarrow.
+    """
+    import pyarrow as pa
+    schema, batches = _arrow_batches( result, batch )
+    with pa.OSFile( path, 'wb' ) as sink:
+        with pa.ipc.new_file( sink, schema ) as writer:
+            for rb in batches:
+                writer.write_batch( rb )
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized fraction of the solar disk visible from a spacecraft.
+
+For an array of ETs, two spkpos calls give the apparent positions of
+the Sun and of Mars as seen from MEX in IAU_MARS; everything else is
+NumPy. The Sun is a disk of angular radius asin( R_sun / r ). Mars is
+the ellipsoid with the bodvrd radii shade uses (so the fraction is 0
+and 1 where the FULL and ANY gfoclt windows end), represented by the
+angular radius of its limb in the direction of the Sun: the tangent
+from MEX in the plane containing MEX, the Mars centre and the Sun.
+The hidden fraction is the overlap of the two disks,
+
+    1 - area( sun & mars ) / area( sun )
+
+which is exact at the contacts; the Sun disk is small enough that
+the curvature of the Mars limb across it does not matter for power
+modelling.
+
+    for ets, frac in illumination_series( et0, et1, 10.0 ):
+        ...
+
+walks a long span in chunks of `chunk` samples, so memory stays
+bounded.
+"""
+
+import numpy as np
+import spiceypy
+
+
+def _angle(a, b):
+    """
+    Angle between the rows of a and b.
+    """
+    cross = np.linalg.norm( np.cross( a, b ), axis=1 )
+    return np.arctan2( cross, np.einsum( 'ij,ij->i', a, b ) )
+
+
+def limb_radius(obspos, direction, radii):
+    """
+    Angular radius of the limb of the ellipsoid with the given radii,
+    as seen from obspos (body-fixed, relative to its centre), measured
+    from the centre towards direction.
+    """
+    radii = np.asarray( radii, dtype=float )
+
+    #
+    # Scale the ellipsoid to the unit sphere. Lines and tangency are
+    # preserved, so the tangent point found there maps back to the
+    # tangent point on the ellipsoid.
+    #
+    o = obspos / radii
+    d = direction / radii
+    dist = np.linalg.norm( o, axis=1 )
+    ohat = o / dist[:, None]
+    perp = d - np.einsum( 'ij,ij->i', d, ohat )[:, None] * ohat
+    norm = np.linalg.norm( perp, axis=1 )
+
+    #
+    # Sun straight behind the centre: any side will do.
+    #
+    flat = norm < 1.0e-12
+    if np.any( flat ):
+        perp[flat] = np.cross( ohat[flat], [0.0, 0.0, 1.0] )
+        bad = np.linalg.norm( perp[flat], axis=1 ) < 1.0e-12
+        perp[np.flatnonzero( flat )[bad]] = np.cross(
+            ohat[np.flatnonzero( flat )[bad]], [1.0, 0.0, 0.0] )
+        norm = np.linalg.norm( perp, axis=1 )
+    ehat = perp / norm[:, None]
+
+    tangent = ( ohat / dist[:, None] +
+                np.sqrt( 1.0 - 1.0 / dist**2 )[:, None] * ehat ) * radii
+    return _angle( -obspos, tangent - obspos )
+
+
+def disk_overlap(r1, r2, d):
+    """
+    Area of the overlap of disks of radii r1 and r2 whose centres are
+    d apart (all arrays, same units).
+    """
+    r1, r2, d = np.broadcast_arrays( r1, r2, d )
+    area = np.zeros( r1.shape )
+
+    inner = d <= np.abs( r1 - r2 )
+    area[inner] = np.pi * np.minimum( r1, r2 )[inner]**2
+
+    part = ~inner & ( d < r1 + r2 )
+    a, b, c = r1[part], r2[part], d[part]
+    x = np.clip( ( c**2 + a**2 - b**2 ) / ( 2.0 * c * a ), -1.0, 1.0 )
+    y = np.clip( ( c**2 + b**2 - a**2 ) / ( 2.0 * c * b ), -1.0, 1.0 )
+    k = ( ( -c + a + b ) * ( c + a - b ) * ( c - a + b ) * ( c + a + b ) )
+    area[part] = ( a**2 * np.arccos( x ) + b**2 * np.arccos( y ) -
+                   0.5 * np.sqrt( np.maximum( k, 0.0 ) ) )
+    return area
+
+
+def _positions(target, ets, frame, abcorr, obsrvr, table):
+    key = ( target, frame, abcorr, obsrvr )
+    if table is not None and key in table:
+        return table.position( key, ets )
+    pos, _ = spiceypy.spkpos( target, ets, frame, abcorr, obsrvr )
+    return np.asarray( pos ).reshape( -1, 3 )
+
+
+def illumination_fraction(ets, obssat='MEX', front='MARS',
+                          fframe='IAU_MARS', ilusrc='SUN', abcorr='CN+S',
+                          table=None):
+    """
+    Fraction of the disk of ilusrc not hidden by front, as seen from
+    obssat at each of ets. Positions are looked up in table (an
+    ephemeris_table.EphemerisTable) where it has them.
+    """
+    ets = np.atleast_1d( np.asarray( ets, dtype=float ) )
+    _, frad = spiceypy.bodvrd( front, 'RADII', 3 )
+    _, srad = spiceypy.bodvrd( ilusrc, 'RADII', 3 )
+
+    body = _positions( front, ets, fframe, abcorr, obssat, table )
+    sun = _positions( ilusrc, ets, fframe, abcorr, obssat, table )
+
+    rsun = np.arcsin( np.minimum( srad[0] / np.linalg.norm( sun, axis=1 ),
+                                  1.0 ) )
+    rbody = limb_radius( -body, sun, frad )
+    sep = _angle( body, sun )
+
+    hidden = disk_overlap( rsun, rbody, sep ) / ( np.pi * rsun**2 )
+    return np.clip( 1.0 - hidden, 0.0, 1.0 )
+
+
+def illumination_series(start, stop, step, chunk=100000, **kwargs):
+    """
+    Generator of (ets, fraction) arrays of at most chunk samples,
+    sampling [start, stop] every step seconds. kwargs are passed to
+    illumination_fraction.
+    """
+    count = int( np.floor( ( stop - start ) / step ) ) + 1
+    for first in range( 0, count, chunk ):
+        ets = start + step * np.arange( first, min( first + chunk, count ) )
+        yield ets, illumination_fraction( ets, **kwargs )
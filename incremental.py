@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Rolling-horizon searches that only compute the new tail.
+
+A RollingWindow keeps the window found so far and the ET up to which
+it is valid. Extending the horizon searches only
+
+    [valid_until - overlap, new stop]
+
+and splices the result onto what is kept before valid_until - overlap.
+An interval that was cut at the old horizon is found again whole in
+the overlap and merges with its kept part, so the spliced window is
+the same as a search from scratch.
+
+    with KernelSession.open( METAKR ):
+        horizon = RollingWindow( visible_search(),
+                                 spiceypy.str2et( '2004 MAY 2 TDB' ) )
+        horizon.extend( spiceypy.str2et( '2004 MAY 6 TDB' ) )
+        horizon.save( 'visible.npz' )
+
+    # next day
+        horizon = RollingWindow.load( 'visible.npz', visible_search() )
+        horizon.extend( spiceypy.str2et( '2004 MAY 7 TDB' ) )
+
+The search functions built here run in-process; load the kernels
+before calling extend.
+"""
+
+import json
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+from parallel_search import run_search
+
+
+def view_period_search(target='MEX', srfpt='DSS-14', obsfrm='DSS-14_TOPO',
+                       abcorr='CN+S', elvlim=6.0, stepsz=300.0,
+                       maxivl=1000):
+    """
+    The viewpr elevation search as a function of the confinement
+    window.
+    """
+    args = ( target, obsfrm, abcorr, srfpt,
+             'LATITUDINAL', 'LATITUDE', '>', spiceypy.rpd() * elvlim,
+             0.0, stepsz, maxivl )
+
+    def search(cnfine):
+        return IntervalSet( run_search( 'gfposc', args, 2 * maxivl,
+                                        cnfine.array ) )
+    search.params = [ 'gfposc' ] + list( args )
+    search.step = stepsz
+    return search
+
+
+def visible_search(target='MEX', srfpt='DSS-14', obsfrm='DSS-14_TOPO',
+                   abcorr='CN+S', elvlim=6.0, stepsz=300.0,
+                   front='MARS', fshape='ELLIPSOID', fframe='IAU_MARS',
+                   maxivl=1000):
+    """
+    The visibl search: view periods less occultations by front.
+    """
+    rise = view_period_search( target, srfpt, obsfrm, abcorr, elvlim,
+                               stepsz, maxivl )
+    args = ( 'ANY', front, fshape, fframe,
+             target, 'POINT', ' ', abcorr,
+             srfpt, stepsz )
+
+    def search(cnfine):
+        riswin = rise( cnfine )
+        if len( riswin ) == 0:
+            return riswin
+        occwin = IntervalSet( run_search( 'gfoclt', args, 2 * maxivl,
+                                          riswin.array ) )
+        return riswin - occwin
+    search.params = rise.params + [ 'gfoclt' ] + list( args )
+    search.step = stepsz
+    return search
+
+
+def occultation_search(target='MEX', srfpt='DSS-14', abcorr='CN+S',
+                       stepsz=300.0, front='MARS', fshape='ELLIPSOID',
+                       fframe='IAU_MARS', maxivl=1000):
+    """
+    The occultation search of visibl on its own: target behind front
+    as seen from srfpt.
+    """
+    args = ( 'ANY', front, fshape, fframe,
+             target, 'POINT', ' ', abcorr,
+             srfpt, stepsz )
+
+    def search(cnfine):
+        return IntervalSet( run_search( 'gfoclt', args, 2 * maxivl,
+                                        cnfine.array ) )
+    search.params = [ 'gfoclt' ] + list( args )
+    search.step = stepsz
+    return search
+
+
+def shade_search(obssat='MEX', occtyp='ANY', abcorr='CN+S', stepsz=300.0,
+                 front='MARS', fshape='ELLIPSOID', fframe='IAU_MARS',
+                 maxivl=1000):
+    """
+    The shade search: eclipses of the Sun by front seen from obssat.
+    """
+    args = ( occtyp, front, fshape, fframe,
+             'SUN', 'ELLIPSOID', 'IAU_SUN', abcorr,
+             obssat, stepsz )
+
+    def search(cnfine):
+        return IntervalSet( run_search( 'gfoclt', args, 2 * maxivl,
+                                        cnfine.array ) )
+    search.params = [ 'gfoclt' ] + list( args )
+    search.step = stepsz
+    return search
+
+
+class RollingWindow(object):
+
+    def __init__(self, search, start, overlap=None):
+        self.search = search
+        self.start = start
+        self.valid_until = start
+        self.window = IntervalSet()
+        if overlap is None:
+            overlap = 2.0 * getattr( search, 'step', 300.0 )
+        self.overlap = overlap
+
+    def extend(self, stop):
+        """
+        Make the window valid up to stop, searching only the part of
+        [start, stop] not covered yet (plus the overlap).
+        """
+        if stop <= self.valid_until:
+            return self.window & IntervalSet( [[self.start, stop]] )
+
+        seam = max( self.start, self.valid_until - self.overlap )
+        kept = self.window & IntervalSet( [[self.start, seam]] )
+        tail = self.search( IntervalSet( [[seam, stop]] ) )
+
+        #
+        # Both pieces contain the seam if an interval runs across it,
+        # so the union joins them.
+        #
+        self.window = kept | tail
+        self.valid_until = stop
+        return self.window
+
+    def save(self, path):
+        np.savez( path, window=self.window.array,
+                  span=np.array( [self.start, self.valid_until,
+                                  self.overlap] ),
+                  params=json.dumps( getattr( self.search, 'params',
+                                              None ) ) )
+
+    @classmethod
+    def load(cls, path, search):
+        """
+        Restore a saved horizon. search must be built with the same
+        parameters as the one that produced it.
+        """
+        with np.load( path ) as data:
+            params = json.loads( str( data['params'] ) )
+            if params != json.loads( json.dumps(
+                             getattr( search, 'params', None ) ) ):
+                raise ValueError( '{:s} was computed with different '
+                                  'search parameters'.format( path ) )
+            start, valid_until, overlap = data['span']
+            horizon = cls( search, start, overlap )
+            horizon.valid_until = valid_until
+            horizon.window = IntervalSet( data['window'] )
+        return horizon
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed interval sets.
+
+An IntervalSet holds a SPICE-style window as a sorted, disjoint
+(N,2) float64 array of closed intervals [begin, end]. The set
+operations are vectorized sweeps over the endpoints instead of
+wnintd/wnunid/wndifd calls followed by one wnfetd per interval,
+and conversion to and from SPICEDOUBLE_CELLs copies the cell's data
+buffer in one go.
+
+    win = IntervalSet.from_cell( riswin )
+    vis = win - IntervalSet.from_cell( eocwin )
+    cell = vis.to_cell()
+
+Membership of many points is one binary search over the sorted
+endpoints per window:
+
+    vis.contains( ets )                   # wnelmd for every ET
+    vis.locate( ets )                     # interval index, or -1
+    membership( [w1, w2, w3], ets )       # (3, len( ets )) booleans
+"""
+
+import ctypes
+
+import numpy as np
+import spiceypy.utils.support_types as stypes
+
+
+def cell2array(cell):
+    """
+    Contents of a SPICE double precision cell as an (N,2) array.
+    """
+    card = cell.card
+    if card == 0:
+        return np.empty( (0, 2) )
+    data = ( ctypes.c_double * card ).from_address( cell.data )
+    return np.array( data ).reshape( -1, 2 )
+
+
+def array2cell(intervals, size=None, cell=None):
+    """
+    Build a SPICE window from a sorted, disjoint (N,2) array, such as
+    IntervalSet.array. size defaults to exactly what the intervals
+    need; pass cell to fill an existing window instead. The input is
+    trusted; run wnvald on the result if it came from elsewhere.
+    """
+    intervals = np.ascontiguousarray( intervals, dtype=np.float64 ) \
+                  .reshape( -1 )
+    card = len( intervals )
+    if cell is None:
+        if size is None:
+            size = max( card, 2 )
+        cell = stypes.SPICEDOUBLE_CELL( size )
+    elif card > cell.size:
+        raise ValueError( 'window of size {:d} cannot hold {:d} '
+                          'endpoints'.format( cell.size, card ) )
+    if card:
+        data = ( ctypes.c_double * card ).from_address( cell.data )
+        ctypes.memmove( data, intervals.ctypes.data, intervals.nbytes )
+    cell.card = card
+    return cell
+
+
+def _sweep(a, b, need):
+    """
+    Sweep the endpoints of two normalized interval arrays and return
+    the intervals covered by at least `need` of them (1: union,
+    2: intersection). Starts sort before ends at equal times so that
+    touching closed intervals meet in a point.
+    """
+    times = np.concatenate( (a[:, 0], b[:, 0], a[:, 1], b[:, 1]) )
+    nbeg = len( a ) + len( b )
+    delta = np.concatenate( (np.ones( nbeg, dtype=np.int64 ),
+                             -np.ones( nbeg, dtype=np.int64 )) )
+    order = np.lexsort( (-delta, times) )
+    times = times[order]
+    depth = np.cumsum( delta[order] )
+    before = depth - delta[order]
+    begins = times[( depth >= need ) & ( before < need )]
+    ends   = times[( depth < need ) & ( before >= need )]
+    return np.column_stack( (begins, ends) )
+
+
+def _inside(points, array):
+    """
+    Mask of points lying in one of the closed intervals of a
+    normalized (N,2) array.
+    """
+    if len( array ) == 0:
+        return np.zeros( len( points ), dtype=bool )
+    i = np.searchsorted( array[:, 0], points, side='right' ) - 1
+    return ( i >= 0 ) & ( points <= array[np.maximum( i, 0 ), 1] )
+
+
+def _locate(points, array):
+    """
+    Index of the closed interval of a normalized (N,2) array holding
+    each point, or -1.
+    """
+    if len( array ) == 0:
+        return np.full( len( points ), -1, dtype=np.intp )
+    i = np.searchsorted( array[:, 0], points, side='right' ) - 1
+    i[( i >= 0 ) & ( points > array[np.maximum( i, 0 ), 1] )] = -1
+    return i
+
+
+def membership(windows, points):
+    """
+    (len( windows ), len( points )) boolean matrix: whether each point
+    lies in each window, e.g. station x time from a ViewPeriodMatrix.
+    """
+    points = np.atleast_1d( np.asarray( points, dtype=np.float64 ) )
+    out = np.empty( ( len( windows ), len( points ) ), dtype=bool )
+    for k, window in enumerate( windows ):
+        out[k] = _inside( points, IntervalSet.from_cell( window ).array )
+    return out
+
+
+def locate_all(windows, points):
+    """
+    Like membership, but with the index of the containing interval
+    of each window, or -1.
+    """
+    points = np.atleast_1d( np.asarray( points, dtype=np.float64 ) )
+    out = np.empty( ( len( windows ), len( points ) ), dtype=np.intp )
+    for k, window in enumerate( windows ):
+        out[k] = _locate( points, IntervalSet.from_cell( window ).array )
+    return out
+
+
+class IntervalSet(object):
+
+    def __init__(self, intervals=None):
+        if intervals is None:
+            intervals = np.empty( (0, 2) )
+        self.array = self.normalize( intervals )
+
+    @staticmethod
+    def normalize(intervals):
+        """
+        Sort intervals and merge the ones that overlap or touch, as
+        wninsd does when building a window.
+        """
+        arr = np.asarray( intervals, dtype=np.float64 ).reshape( -1, 2 )
+        if len( arr ) == 0:
+            return np.empty( (0, 2) )
+        if np.any( arr[:, 0] > arr[:, 1] ):
+            raise ValueError( 'interval begins after it ends' )
+        arr = arr[np.argsort( arr[:, 0], kind='mergesort' )]
+        reach = np.maximum.accumulate( arr[:, 1] )
+        first = np.ones( len( arr ), dtype=bool )
+        first[1:] = arr[1:, 0] > reach[:-1]
+        group = np.cumsum( first ) - 1
+        out = np.empty( (group[-1] + 1, 2) )
+        out[:, 0] = arr[first, 0]
+        out[:, 1] = np.maximum.reduceat( arr[:, 1], np.flatnonzero( first ) )
+        return out
+
+    @classmethod
+    def _wrap(cls, array):
+        #
+        # Results of the sweeps are already normalized.
+        #
+        new = cls.__new__( cls )
+        new.array = array
+        return new
+
+    @classmethod
+    def from_cell(cls, cell):
+        if isinstance( cell, IntervalSet ):
+            return cell
+        if isinstance( cell, np.ndarray ):
+            return cls( cell )
+        return cls._wrap( cell2array( cell ) )
+
+    def to_cell(self, size=None, cell=None):
+        return array2cell( self.array, size, cell )
+
+    #
+    # Window attributes: wncard, wnsumd.
+    #
+    def __len__(self):
+        return len( self.array )
+
+    def __iter__(self):
+        return iter( map( tuple, self.array ) )
+
+    def __array__(self, dtype=None, copy=None):
+        return self.array if dtype is None else self.array.astype( dtype )
+
+    def __eq__(self, other):
+        return isinstance( other, IntervalSet ) and \
+               np.array_equal( self.array, other.array )
+
+    def __repr__(self):
+        return 'IntervalSet({:d} intervals)'.format( len( self ) )
+
+    @property
+    def begins(self):
+        return self.array[:, 0]
+
+    @property
+    def ends(self):
+        return self.array[:, 1]
+
+    @property
+    def durations(self):
+        return self.array[:, 1] - self.array[:, 0]
+
+    def measure(self):
+        return float( np.sum( self.durations ) )
+
+    #
+    # Membership: wnelmd for arrays of points.
+    #
+    def contains(self, points):
+        """
+        Mask of the points (ETs) lying in the window.
+        """
+        points = np.atleast_1d( np.asarray( points, dtype=np.float64 ) )
+        return _inside( points, self.array )
+
+    def locate(self, points):
+        """
+        Index of the interval holding each point, or -1.
+        """
+        points = np.atleast_1d( np.asarray( points, dtype=np.float64 ) )
+        return _locate( points, self.array )
+
+    #
+    # Set operations: wnunid, wnintd, wndifd, wncomd.
+    #
+    def union(self, other):
+        other = IntervalSet.from_cell( other )
+        return self._wrap( _sweep( self.array, other.array, 1 ) )
+
+    def intersect(self, other):
+        other = IntervalSet.from_cell( other )
+        return self._wrap( _sweep( self.array, other.array, 2 ) )
+
+    def complement(self, left, right):
+        """
+        Complement with respect to [left, right], clipped to that
+        interval. As with wncomd this is the closure of the
+        complement, so removing a single point does not split it.
+        When [left, right] lies inside one gap between intervals the
+        result is [left, right]; wncomd (N0067) does not clip such a
+        gap at right.
+        """
+        if left > right:
+            raise ValueError( 'left endpoint exceeds right endpoint' )
+        if left == right:
+            covered = _inside( np.array( [left] ), self.array )[0]
+            return IntervalSet( [] if covered else [[left, right]] )
+        inner = self.intersect( IntervalSet( [[left, right]] ) ).array
+        begins = np.concatenate( ([left], inner[:, 1]) )
+        ends   = np.concatenate( (inner[:, 0], [right]) )
+        keep = begins < ends
+        return IntervalSet( np.column_stack( (begins[keep], ends[keep]) ) )
+
+    def difference(self, other):
+        """
+        Closure of the points of self not in other, as wndifd
+        computes it: the boundary of a removed interval stays in the
+        result, and a singleton survives only if it is a singleton of
+        self that other does not cover.
+        """
+        other = IntervalSet.from_cell( other )
+        if len( self ) == 0 or len( other ) == 0:
+            return self._wrap( self.array.copy() )
+        lo = min( self.array[0, 0], other.array[0, 0] )
+        hi = max( self.array[-1, 1], other.array[-1, 1] )
+        gaps = np.concatenate( ([lo], other.array.reshape( -1 ), [hi]) )
+        gaps = gaps.reshape( -1, 2 )
+        gaps = IntervalSet.normalize( gaps[gaps[:, 0] < gaps[:, 1]] )
+        result = _sweep( self.array, gaps, 2 )
+
+        single = result[:, 0] == result[:, 1]
+        if np.any( single ):
+            points = result[single, 0]
+            own = self.array[self.array[:, 0] == self.array[:, 1], 0]
+            single[single] = ~np.isin( points, own ) | \
+                             _inside( points, other.array )
+            result = result[~single]
+        return self._wrap( result )
+
+    __or__  = union
+    __and__ = intersect
+    __sub__ = difference
+
+    #
+    # Window adjustments: wnexpd, wncond, wnfltd, wnfild.
+    #
+    def expand(self, left, right):
+        """
+        Move each begin left and each end right; as with wnexpd,
+        negative amounts shrink intervals and those that invert are
+        dropped.
+        """
+        arr = self.array + [-left, right]
+        return IntervalSet( arr[arr[:, 0] <= arr[:, 1]] )
+
+    def contract(self, left, right):
+        if left < 0 or right < 0:
+            return self.expand( -left, -right )
+        #
+        # Shrinking keeps the intervals apart, so only the inverted
+        # ones have to go.
+        #
+        arr = self.array + [left, -right]
+        return self._wrap( arr[arr[:, 0] <= arr[:, 1]] )
+
+    def filter(self, small):
+        """
+        Drop intervals of measure less than or equal to small.
+        """
+        return self._wrap( self.array[self.durations > small] )
+
+    def fill(self, small):
+        """
+        Fill gaps of measure less than or equal to small.
+        """
+        if len( self ) < 2:
+            return self._wrap( self.array.copy() )
+        gap = self.array[1:, 0] - self.array[:-1, 1]
+        first = np.concatenate( ([True], gap > small) )
+        last  = np.concatenate( (gap > small, [True]) )
+        return self._wrap( np.column_stack( (self.array[first, 0],
+                                             self.array[last, 1]) ) )
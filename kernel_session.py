@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Shared, reference-counted meta-kernel loading.
+
+    kernels = KernelSession.open( METAKR )   # furnsh on first open
+    ...
+    kernels.close()                          # unload on last close
+
+or as a context manager:
+
+    with KernelSession.open( METAKR ) as kernels:
+        print( kernels )
+
+write_metakernel writes a meta-kernel naming a list of kernel files
+kept in one directory.
+"""
+
+import os
+import threading
+import time
+
+import spiceypy
+
+import profiling
+
+
+class KernelSession(object):
+
+    #
+    # One session per meta-kernel path, shared by every caller
+    # in this process.
+    #
+    _sessions = {}
+    _lock = threading.RLock()
+
+    def __init__(self, metakr):
+        self.metakr = metakr
+        self.refcount = 0
+        self.load_time = 0.0
+        self.kernel_count = 0
+
+    @classmethod
+    def open(cls, metakr):
+        key = os.path.abspath( metakr )
+        with cls._lock:
+            session = cls._sessions.get( key )
+            if session is None:
+                session = cls( metakr )
+                cls._sessions[key] = session
+            session._acquire()
+        return session
+
+    def _acquire(self):
+        if self.refcount == 0:
+            #
+            # ktotal counts the meta-kernel itself as well as the
+            # kernels it names; the difference is what we loaded.
+            #
+            before = spiceypy.ktotal( 'ALL' )
+            t0 = time.perf_counter()
+            with profiling.stage( 'furnsh' ):
+                spiceypy.furnsh( self.metakr )
+            self.load_time = time.perf_counter() - t0
+            self.kernel_count = spiceypy.ktotal( 'ALL' ) - before - 1
+        self.refcount += 1
+
+    def close(self):
+        with self._lock:
+            if self.refcount == 0:
+                return
+            self.refcount -= 1
+            if self.refcount == 0:
+                spiceypy.unload( self.metakr )
+                del self._sessions[os.path.abspath( self.metakr )]
+
+    @property
+    def loaded(self):
+        return self.refcount > 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __str__(self):
+        return ( '{:s}: {:d} kernels loaded in {:.3f} s '
+                 '(refcount {:d})'.format( self.metakr, self.kernel_count,
+                                           self.load_time, self.refcount ) )
+
+
+def write_metakernel(directory, kernels, name='mexMetaK.tm.txt'):
+    """
+    Write a meta-kernel named name to directory, loading kernels (in
+    that order) from the same directory, and return its path.
+    """
+    #
+    # Relative to PATH_SYMBOLS, so the directory can be moved.
+    #
+    root = os.path.abspath( directory )
+    files = ',\n                     '.join(
+        "'$KERNELS/{:s}'".format( os.path.basename( k ) ) for k in kernels )
+    text = ( 'KPL/MK\n\n\\begindata\n\n'
+             "PATH_VALUES     = ( '{:s}' )\n"
+             "PATH_SYMBOLS    = ( 'KERNELS' )\n\n"
+             'KERNELS_TO_LOAD = ( {:s} )\n\n'
+             '\\begintext\n' ).format( root, files )
+    path = os.path.join( directory, name )
+    with open( path, 'w' ) as f:
+        f.write( text )
+    return path
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal kernel sets for a time span and a list of bodies.
+
+    meta = subset_kernels( 'mexMetaK.tm.txt', './subset',
+                           '2004 MAY 2 TDB', '2004 MAY 6 TDB',
+                           [ 'MEX', 'MARS', 'EARTH', 'DSS-14', 'SUN' ] )
+    report = verify_subset( 'mexMetaK.tm.txt', meta,
+                            '2004 MAY 2 TDB', '2004 MAY 6 TDB' )
+
+or
+
+    python kernel_subset.py mexMetaK.tm.txt ./subset \\
+        --start '2004 MAY 2 TDB' --stop '2004 MAY 6 TDB' \\
+        --bodies MEX,MARS,EARTH,DSS-14,SUN --verify
+
+With the full meta-kernel loaded, every SPK segment is read from its
+descriptor. A body is needed if it was asked for or is the centre of
+a segment of a needed body (down to the solar system barycentre).
+The segments of the needed bodies that overlap the span, widened by
+`margin` seconds for light time, are copied with spksub, clipped to
+the widened span. They go in load order into one SPK, so the
+precedence between segments is unchanged.
+
+Text kernels (LSK, PCK, FK, SCLK) are small and are copied whole.
+CSPICE has no CK or DSK subsetting routine, so those files are
+copied whole, but only when they hold data for the bodies or the
+frames asked for. Binary PCKs are copied whole. A new meta-kernel
+names the copies.
+
+verify_subset runs the same searches (by default the view period,
+visible and shade searches of incremental) with each meta-kernel
+loaded in turn. It reports the largest difference between window
+endpoints and the furnsh time and size of each kernel set.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+import numpy as np
+import spiceypy
+
+from incremental import shade_search, view_period_search, visible_search
+from interval_set import IntervalSet
+from kernel_session import KernelSession, write_metakernel
+
+METAKR = './mexMetaK.tm.txt'
+
+SSB = 0
+
+#
+# SPK descriptor sizes.
+#
+ND = 2
+NI = 6
+
+
+def _segments(handle):
+    """
+    (descriptor, name, body, center, begin, end) of every segment of
+    a loaded SPK, in file order.
+    """
+    segments = []
+    spiceypy.dafbfs( handle )
+    while spiceypy.daffna():
+        descr = spiceypy.dafgs( ND + ( NI + 1 ) // 2 )
+        dc, ic = spiceypy.dafus( descr, ND, NI )
+        segments.append( ( descr, spiceypy.dafgn(), int( ic[0] ),
+                           int( ic[1] ), dc[0], dc[1] ) )
+    return segments
+
+
+def _needed_bodies(segments, bodies):
+    """
+    bodies plus the centres their segments are given relative to.
+    """
+    needed = set( bodies )
+    while True:
+        more = set( center for _, _, body, center, _, _ in segments
+                    if body in needed ) - needed
+        if not more:
+            return needed
+        needed |= more
+
+
+def _cell(cell):
+    return [ int( cell[i] ) for i in range( cell.card ) ]
+
+
+def _ck_ids(frames):
+    """
+    CK structure IDs of the CK-based frames among frames.
+    """
+    ids = set()
+    for frame in frames:
+        code = spiceypy.namfrm( frame )
+        if code == 0:
+            raise ValueError( 'unknown frame {:s}'.format( frame ) )
+        _, frclss, clssid = spiceypy.frinfo( code )
+        if frclss == 3:
+            ids.add( clssid )
+    return ids
+
+
+def _copy_name(directory, path, used):
+    name = os.path.basename( path )
+    stem, ext = os.path.splitext( name )
+    k = 1
+    while name in used:
+        name = '{:s}_{:d}{:s}'.format( stem, k, ext )
+        k += 1
+    used.add( name )
+    return os.path.join( directory, name )
+
+
+def subset_kernels(metakr, directory, start, stop, bodies, frames=(),
+                   margin=86400.0, dsk=True,
+                   name=os.path.basename( METAKR )):
+    """
+    Write the kernels needed for bodies (names or IDs) and frames
+    between start and stop to directory, and return the path of the
+    new meta-kernel. Any other kernels must be unloaded.
+    """
+    if not os.path.isdir( directory ):
+        os.makedirs( directory )
+    used = set()
+    kernels = []
+
+    with KernelSession.open( metakr ):
+        begin = spiceypy.str2et( start ) - margin
+        end = spiceypy.str2et( stop ) + margin
+        ids = set( spiceypy.bods2c( b ) if isinstance( b, str ) else b
+                   for b in bodies )
+        ckids = _ck_ids( frames )
+
+        loaded = [ spiceypy.kdata( i, 'ALL' )
+                   for i in range( spiceypy.ktotal( 'ALL' ) ) ]
+        spks = [ ( file, _segments( handle ) )
+                 for file, kind, _, handle in loaded if kind == 'SPK' ]
+        needed = _needed_bodies( [ s for _, segs in spks for s in segs ],
+                                 ids | { SSB } )
+
+        segments = dict( spks )
+        newh = None
+        copied = 0
+        for file, kind, _, handle in loaded:
+            if kind == 'META':
+                continue
+
+            if kind == 'SPK':
+                #
+                # One output SPK, opened at the first SPK so that it
+                # stays in the load order of the originals.
+                #
+                if newh is None:
+                    path = _copy_name( directory, 'subset.bsp', used )
+                    if os.path.exists( path ):
+                        os.remove( path )
+                    newh = spiceypy.spkopn( path, 'SUBSET', 0 )
+                    kernels.append( path )
+                for descr, ident, body, _, b, e in segments[file]:
+                    if body in needed and b <= end and e >= begin:
+                        spiceypy.spksub( handle, descr, ident,
+                                         max( b, begin ), min( e, end ),
+                                         newh )
+                        copied += 1
+                continue
+
+            if kind == 'CK':
+                keep = False
+                for ckid in _cell( spiceypy.ckobj( file ) ):
+                    if frames and ckid not in ckids:
+                        continue
+                    cover = spiceypy.ckcov( file, ckid, False, 'INTERVAL',
+                                            0.0, 'TDB' )
+                    if len( IntervalSet.from_cell( cover ) &
+                            IntervalSet( [[begin, end]] ) ):
+                        keep = True
+                if not keep:
+                    continue
+            elif kind == 'DSK':
+                if not dsk or not ( set( _cell( spiceypy.dskobj( file ) ) )
+                                    & needed ):
+                    continue
+
+            path = _copy_name( directory, file, used )
+            shutil.copyfile( file, path )
+            kernels.append( path )
+
+        if newh is not None:
+            spiceypy.spkcls( newh )
+            if copied == 0:
+                raise ValueError( 'no SPK data for the bodies in the span' )
+
+    return write_metakernel( directory, kernels, name )
+
+
+def _run_searches(metakr, start, stop, searches):
+    with KernelSession.open( metakr ) as kernels:
+        cnfine = IntervalSet( [[spiceypy.str2et( start ),
+                                spiceypy.str2et( stop )]] )
+        windows = [ search( cnfine ) for search in searches ]
+        load_time = kernels.load_time
+    return windows, load_time
+
+
+def _kernel_bytes(metakr):
+    with KernelSession.open( metakr ):
+        return sum( os.path.getsize( spiceypy.kdata( i, 'ALL' )[0] )
+                    for i in range( spiceypy.ktotal( 'ALL' ) ) )
+
+
+def verify_subset(full, subset, start, stop, searches=None, tol=1.0e-6):
+    """
+    Run searches with the full and the subset meta-kernel loaded and
+    compare. Returns a dict with, per search, the largest endpoint
+    difference (s) and whether the windows match to tol, plus load
+    times and kernel sizes. No kernels may be loaded by the caller.
+    """
+    if searches is None:
+        searches = { 'view': view_period_search(),
+                     'visible': visible_search(),
+                     'shade': shade_search() }
+    names = list( searches )
+    funcs = [ searches[n] for n in names ]
+
+    windows_full, load_full = _run_searches( full, start, stop, funcs )
+    windows_subset, load_subset = _run_searches( subset, start, stop, funcs )
+
+    report = { 'searches': {}, 'match': True,
+               'load_time': { 'full': load_full, 'subset': load_subset },
+               'bytes': { 'full': _kernel_bytes( full ),
+                          'subset': _kernel_bytes( subset ) } }
+    for name, a, b in zip( names, windows_full, windows_subset ):
+        if len( a ) != len( b ):
+            diff = np.inf
+        elif len( a ) == 0:
+            diff = 0.0
+        else:
+            diff = float( np.max( np.abs( a.array - b.array ) ) )
+        report['searches'][name] = { 'intervals': len( a ),
+                                     'max_diff': diff,
+                                     'match': diff <= tol }
+        report['match'] = report['match'] and diff <= tol
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[1] )
+    parser.add_argument( 'metakr' )
+    parser.add_argument( 'directory' )
+    parser.add_argument( '--start', required=True )
+    parser.add_argument( '--stop', required=True )
+    parser.add_argument( '--bodies', default='MEX,MARS,EARTH,DSS-14,SUN' )
+    parser.add_argument( '--frames', default='',
+                         help='comma separated CK-based frames to keep' )
+    parser.add_argument( '--margin', type=float, default=86400.0 )
+    parser.add_argument( '--no-dsk', action='store_true' )
+    parser.add_argument( '--verify', action='store_true' )
+    opts = parser.parse_args( argv )
+
+    frames = [ f for f in opts.frames.split( ',' ) if f ]
+    meta = subset_kernels( opts.metakr, opts.directory, opts.start,
+                           opts.stop, opts.bodies.split( ',' ), frames,
+                           opts.margin, not opts.no_dsk )
+    print( meta )
+    if not opts.verify:
+        return 0
+
+    report = verify_subset( opts.metakr, meta, opts.start, opts.stop )
+    for name, row in report['searches'].items():
+        print( '{:10s} {:4d} intervals  max diff {:.3e} s  {:s}'.format(
+            name, row['intervals'], row['max_diff'],
+            'ok' if row['match'] else 'MISMATCH' ) )
+    print( 'furnsh     {:.4f} s -> {:.4f} s'.format(
+        report['load_time']['full'], report['load_time']['subset'] ) )
+    print( 'kernels    {:d} -> {:d} bytes'.format(
+        report['bytes']['full'], report['bytes']['subset'] ) )
+    return 0 if report['match'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
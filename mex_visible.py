@@ -15,671 +15,865 @@ import spiceypy.utils.support_types as stypes
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
+import parallel_search
+from crossing import crossing_search
+from eclipse import annular_possible, eclipse_statistics
+from export import SearchResult
+from interval_set import IntervalSet
+from prescan import elevation_prescan
+from profiling import stage
+from refine import aberration_margin, refine_edges, tiered_search
+from kernel_session import KernelSession
+
 iframe = 0
 donothing = False  # switch to stop all recordering
 
-def viewpr():
-    #
-    # Local Parameters
-    #
-    METAKR = './mexMetaK.tm.txt'
-    TDBFMT = 'YYYY MON DD HR:MN:SC.### (TDB) ::TDB'
-    MAXIVL = 1000
-    MAXWIN = 2 * MAXIVL
 
-    #
-    # Load the meta-kernel.
-    #
-    spiceypy.furnsh( METAKR )
+def _quiet( *args, **kwargs ):
+    pass
 
-    #
-    # Assign the inputs for our search.
-    #
-    # Since we're interested in the apparent location of the
-    # target, we use light time and stellar aberration
-    # corrections. We use the "converged Newtonian" form
-    # of the light time correction because this choice may
-    # increase the accuracy of the occultation times we'll
-    # compute using gfoclt.
-    #
-    srfpt  = 'DSS-14'
-    obsfrm = 'DSS-14_TOPO'
-    target = 'MEX'
-    abcorr = 'CN+S'
-    start  = '2004 MAY 2 TDB'
-    stop   = '2004 MAY 6 TDB'
-    elvlim =  6.0
 
-    #
-    # The elevation limit above has units of degrees; we convert
-    # this value to radians for computation using SPICE routines.
-    # We'll store the equivalent value in radians in revlim.
-    #
-    revlim = spiceypy.rpd() * elvlim
+def _view_period( target, obsfrm, abcorr, srfpt, crdsys, coord, relate,
+                  revlim, adjust, stepsz, maxivl, cnfine, riswin, metakr,
+                  workers=None, prescan=False, cache=None, tiered=None ):
+    """
+    The gfposc elevation search of viewpr and visibl: fill riswin
+    with the times within cnfine when target is above revlim as seen
+    from srfpt, and return it.
+    """
+    maxwin = 2 * maxivl
 
     #
-    # Since SPICE doesn't directly support the AZ/EL coordinate
-    # system, we use the equivalent constraint
+    # Optionally sample the elevation on a coarse grid first.
+    # Stretches that are certainly above the limit go straight
+    # into the result; only the stretches that may cross the
+    # limit are left for gfposc to search.
     #
-    #    latitude > revlim
-    #
-    # in the latitudinal coordinate system, where the reference
-    # frame is topocentric and is centered at the viewing location.
-    #
-    crdsys = 'LATITUDINAL'
-    coord  = 'LATITUDE'
-    relate = '>'
+    if prescan:
+        with stage( 'prescan' ):
+            certain, uncertain = elevation_prescan( target, obsfrm,
+                                                    abcorr, srfpt,
+                                                    relate, revlim,
+                                                    cnfine )
+        cnfine = uncertain.to_cell()
 
     #
-    # The adjustment value only applies to absolute extrema
-    # searches; simply give it an initial value of zero
-    # for this inequality search.
-    #
-    adjust = 0.0
-
+    # With workers > 1 the search is split into time slices
+    # that run in parallel worker processes; with a cache, a
+    # search already done on the same kernels is not repeated.
     #
-    # stepsz is the step size, measured in seconds, used to search
-    # for times bracketing a state transition. Since we don't expect
-    # any events of interest to be shorter than five minutes, and
-    # since the separation between events is well over 5 minutes,
-    # we'll use this value as our step size. Units are seconds.
-    #
-    stepsz = 300.0
-
-    #
-    # Display a banner for the output report:
-    #
-    print( '\n{:s}\n'.format(
-           'Inputs for target visibility search:' )  )
-
-    print( '   Target                       = '
-           '{:s}'.format( target )  )
-    print( '   Observation surface location = '
-           '{:s}'.format( srfpt  )  )
-    print( '   Observer\'s reference frame   = '
-           '{:s}'.format( obsfrm )  )
-    print( '   Elevation limit (degrees)    = '
-           '{:f}'.format( elvlim )  )
-    print( '   Aberration correction        = '
-           '{:s}'.format( abcorr )  )
-    print( '   Step size (seconds)          = '
-           '{:f}'.format( stepsz )  )
-
-    #
-    # Convert the start and stop times to ET.
-    #
-    etbeg = spiceypy.str2et( start )
-    etend = spiceypy.str2et( stop  )
-
-    #
-    # Display the search interval start and stop times
-    # using the format shown below.
-    #
-    #    2004 MAY 06 20:15:00.000 (TDB)
-    #
-    timstr = spiceypy.timout( etbeg, TDBFMT )
-    print( '   Start time                   = '
-           '{:s}'.format(timstr) )
-
-    timstr = spiceypy.timout( etend, TDBFMT )
-    print( '   Stop time                    = '
-           '{:s}'.format(timstr) )
-
-    print( ' ' )
-
-    #
-    # Initialize the "confinement" window with the interval
-    # over which we'll conduct the search.
-    #
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd( etbeg, etend, cnfine )
-
-    #
-    # In the call below, the maximum number of window
-    # intervals gfposc can store internally is set to MAXIVL.
-    # We set the cell size to MAXWIN to achieve this.
-    #
-    riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
-
-    #
-    # Now search for the time period, within our confinement
-    # window, during which the apparent target has elevation
-    # at least equal to the elevation limit.
-    #
-    spiceypy.gfposc( target, obsfrm, abcorr, srfpt,
-                     crdsys, coord,  relate, revlim,
-                     adjust, stepsz, MAXIVL, cnfine, riswin )
-
+    if tiered is None:
+        parallel_search.gfposc( target, obsfrm, abcorr, srfpt,
+                                crdsys, coord,  relate, revlim,
+                                adjust, stepsz, maxivl, cnfine, riswin,
+                                metakr=metakr, workers=workers,
+                                cache=cache )
+    else:
+        #
+        # Find the window with the coarse correction and repeat
+        # the search with abcorr only near its edges, which the
+        # correction moves by a fraction of the light time.
+        #
+        def rise_search( corr, window, step, tol ):
+            result = stypes.SPICEDOUBLE_CELL( maxwin )
+            parallel_search.gfposc( target, obsfrm, corr,   srfpt,
+                                    crdsys, coord,  relate, revlim,
+                                    adjust, step,   maxivl,
+                                    window.to_cell(), result,
+                                    metakr=metakr, workers=workers,
+                                    cache=cache, tol=tol )
+            return result
+
+        margin = aberration_margin( tiered, srfpt, [ target ], cnfine )
+        with stage( 'tiered' ):
+            tiered_search( rise_search, abcorr, tiered, cnfine, stepsz,
+                           margin ).to_cell( cell=riswin )
+
+    if prescan:
+        ( IntervalSet.from_cell( riswin ) | certain ).to_cell( cell=riswin )
+    return riswin
+
+
+def _display_view( report, window, target, observer, tdbfmt ):
+    """
+    Report the intervals of a view period window.
+    """
     #
     # The function wncard returns the number of intervals
     # in a SPICE window.
     #
-    winsiz = spiceypy.wncard( riswin )
+    winsiz = spiceypy.wncard( window )
 
     if winsiz == 0:
 
-        print( 'No events were found.' )
+        report( 'No events were found.' )
 
     else:
 
         #
         # Display the visibility time periods.
         #
-        print( 'Visibility times of {0:s} '
-               'as seen from {1:s}:\n'.format(
-                target, srfpt )                )
+        report( 'Visibility times of {0:s} '
+                'as seen from {1:s}:\n'.format(
+                 target, observer )                )
 
         for  i  in  range(winsiz):
             #
             # Fetch the start and stop times of
             # the ith interval from the search result
-            # window riswin.
+            # window.
             #
-            [intbeg, intend] = spiceypy.wnfetd( riswin, i )
+            [intbeg, intend] = spiceypy.wnfetd( window, i )
 
             #
             # Convert the rise time to a TDB calendar string.
             #
-            timstr = spiceypy.timout( intbeg, TDBFMT )
+            timstr = spiceypy.timout( intbeg, tdbfmt )
 
             #
             # Write the string to standard output.
             #
             if  i  ==  0:
 
-                print( 'Visibility or window start time:'
-                       '  {:s}'.format( timstr )          )
+                report( 'Visibility or window start time:'
+                        '  {:s}'.format( timstr )          )
             else:
 
-                print( 'Visibility start time:          '
-                       '  {:s}'.format( timstr )          )
+                report( 'Visibility start time:          '
+                        '  {:s}'.format( timstr )          )
 
             #
             # Convert the set time to a TDB calendar string.
             #
-            timstr = spiceypy.timout( intend, TDBFMT )
+            timstr = spiceypy.timout( intend, tdbfmt )
 
             #
             # Write the string to standard output.
             #
             if  i  ==  (winsiz-1):
 
-                print( 'Visibility or window stop time: '
-                       '  {:s}'.format( timstr )          )
+                report( 'Visibility or window stop time: '
+                        '  {:s}'.format( timstr )          )
             else:
 
-                print( 'Visibility stop time:           '
-                       '  {:s}'.format( timstr )          )
+                report( 'Visibility stop time:           '
+                        '  {:s}'.format( timstr )          )
 
-            print( ' ' )
+            report( ' ' )
 
-    spiceypy.unload( METAKR )
 
+def _display_visible( report, result, tdbfmt ):
+    """
+    Report the ellipsoid and DSK visibility windows of visibl.
+    """
+    target = result.inputs['target']
+    srfpt  = result.inputs['srfpt']
 
-def visibl():
+    #
+    # The ellipsoid and DSK windows need not have the same
+    # number of intervals (the DSK limb can split or remove
+    # one), so display each of them on its own.
+    #
+    report( 'Visibility start and stop times of '
+            '{0:s} as seen from {1:s}\n'
+            'using both ellipsoidal and DSK '
+            'target shape models:\n'.format(
+                target, srfpt )                 )
+
+    for label, name in ( ('Ell', 'visible_ellipsoid'),
+                         ('DSK', 'visible_dsk') ):
+        window = result[name]
+
+        if len( window ) == 0:
+            report( ' {:s}: No events were found.'.format( label ) )
+
+        for intbeg, intend in window.array:
+            #
+            # Convert the times to TDB calendar strings.
+            # Write the results.
+            #
+            btmstr = spiceypy.timout( intbeg, tdbfmt )
+            etmstr = spiceypy.timout( intend, tdbfmt )
+
+            report( ' {:s}: {:s} : {:s}'.format( label, btmstr,
+                                                 etmstr ) )
+        report( ' ' )
+
+
+def _display_shade( report, eocwin, stats, obssat, ilusrc, tdbfmt ):
+    """
+    Report the penumbra intervals of shade with their umbra and
+    phase durations.
+    """
+    winsiz = spiceypy.wncard( eocwin )
+
+    if winsiz == 0:
+        report( 'No events were found.' )
+    else:
+        #
+        # Display the visibility time periods.
+        #
+        report( 'Penumbra start and stop times of '
+                 '{0:s} as seen from {1:s}\n'
+                 'using ellipsoidal '
+                 'target shape models:\n'.format( obssat, ilusrc ))
+
+        for  i  in  range(winsiz):
+            #
+            # Fetch the start and stop times of
+            # the ith interval from the ellipsoid
+            # search result window evswin.
+            #
+            [intbeg, intend] = spiceypy.wnfetd( eocwin, i )
+
+            #
+            # Convert the rise time to TDB calendar strings.
+            # Write the results.
+            #
+            btmstr = spiceypy.timout( intbeg, tdbfmt )
+            etmstr = spiceypy.timout( intend, tdbfmt )
+
+            report( ' Ell: {:s} : {:s}'.format( btmstr, etmstr ) )
+
+            #
+            # The umbra within this eclipse, if any.
+            #
+            if stats['umbra_duration'][i] > 0.0:
+                btmstr = spiceypy.timout( stats['umbra_begin'][i],
+                                          tdbfmt )
+                etmstr = spiceypy.timout( stats['umbra_end'][i],
+                                          tdbfmt )
+                report( ' Umb: {:s} : {:s}'.format( btmstr,
+                                                    etmstr ) )
+            report( '      penumbra {:9.3f} s, umbra {:9.3f} s, '
+                    'annular {:9.3f} s'.format(
+                        stats['duration'][i],
+                        stats['umbra_duration'][i],
+                        stats['annular_duration'][i] ) )
+
+
+def viewpr( workers=None, prescan=False, cache=None, tiered=None,
+            verbose=True ):
     #
     # Local Parameters
     #
     METAKR = './mexMetaK.tm.txt'
-    TDBFMT = 'YYYY MON DD HR:MN:SC.### TDB ::TDB'
+    TDBFMT = 'YYYY MON DD HR:MN:SC.### (TDB) ::TDB'
     MAXIVL = 1000
     MAXWIN = 2 * MAXIVL
 
     #
-    # Load the meta-kernel.
+    # Only write the report to standard output if asked to.
     #
-    spiceypy.furnsh( METAKR )
+    report = print if verbose else _quiet
 
     #
-    # Assign the inputs for our search.
+    # Load the meta-kernel, or share it if a caller already has.
     #
-    # Since we're interested in the apparent location of the
-    # target, we use light time and stellar aberration
-    # corrections. We use the "converged Newtonian" form
-    # of the light time correction because this choice may
-    # increase the accuracy of the occultation times we'll
-    # compute using gfoclt.
-    #
-    srfpt  = 'DSS-14'
-    obsfrm = 'DSS-14_TOPO'
-    target = 'MEX'
-    abcorr = 'CN+S'
-    start  = '2004 MAY 2 TDB'
-    stop   = '2004 MAY 6 TDB'
-    elvlim =  6.0
+    with KernelSession.open( METAKR ) as kernels:
 
-    #
-    # The elevation limit above has units of degrees; we convert
-    # this value to radians for computation using SPICE routines.
-    # We'll store the equivalent value in radians in revlim.
-    #
-    revlim = spiceypy.rpd() * elvlim
-
-    #
-    # We model the target shape as a point. We either model the
-    # blocking body's shape as an ellipsoid, or we represent
-    # its shape using actual topographic data. No body-fixed
-    # reference frame is required for the target since its
-    # orientation is not used.
-    #
-    back   = target
-    bshape = 'POINT'
-    bframe = ' '
-    front  = 'MARS'
-    fshape = 'ELLIPSOID'
-    fframe = 'IAU_MARS'
+        #
+        # Assign the inputs for our search.
+        #
+        # Since we're interested in the apparent location of the
+        # target, we use light time and stellar aberration
+        # corrections. We use the "converged Newtonian" form
+        # of the light time correction because this choice may
+        # increase the accuracy of the occultation times we'll
+        # compute using gfoclt.
+        #
+        srfpt  = 'DSS-14'
+        obsfrm = 'DSS-14_TOPO'
+        target = 'MEX'
+        abcorr = 'CN+S'
+        start  = '2004 MAY 2 TDB'
+        stop   = '2004 MAY 6 TDB'
+        elvlim =  6.0
 
-    #
-    # The occultation type should be set to 'ANY' for a point
-    # target.
-    #
-    occtyp = 'any'
+        #
+        # The elevation limit above has units of degrees; we convert
+        # this value to radians for computation using SPICE routines.
+        # We'll store the equivalent value in radians in revlim.
+        #
+        revlim = spiceypy.rpd() * elvlim
 
-    #
-    # Since SPICE doesn't directly support the AZ/EL coordinate
-    # system, we use the equivalent constraint
-    #
-    #    latitude > revlim
-    #
-    # in the latitudinal coordinate system, where the reference
-    # frame is topocentric and is centered at the viewing location.
-    #
-    crdsys = 'LATITUDINAL'
-    coord  = 'LATITUDE'
-    relate = '>'
+        #
+        # Since SPICE doesn't directly support the AZ/EL coordinate
+        # system, we use the equivalent constraint
+        #
+        #    latitude > revlim
+        #
+        # in the latitudinal coordinate system, where the reference
+        # frame is topocentric and is centered at the viewing location.
+        #
+        crdsys = 'LATITUDINAL'
+        coord  = 'LATITUDE'
+        relate = '>'
 
-    #
-    # The adjustment value only applies to absolute extrema
-    # searches; simply give it an initial value of zero
-    # for this inequality search.
-    #
-    adjust = 0.0
+        #
+        # The adjustment value only applies to absolute extrema
+        # searches; simply give it an initial value of zero
+        # for this inequality search.
+        #
+        adjust = 0.0
 
-    #
-    # stepsz is the step size, measured in seconds, used to search
-    # for times bracketing a state transition. Since we don't expect
-    # any events of interest to be shorter than five minutes, and
-    # since the separation between events is well over 5 minutes,
-    # we'll use this value as our step size. Units are seconds.
-    #
-    stepsz = 300.0
+        #
+        # stepsz is the step size, measured in seconds, used to search
+        # for times bracketing a state transition. Since we don't expect
+        # any events of interest to be shorter than five minutes, and
+        # since the separation between events is well over 5 minutes,
+        # we'll use this value as our step size. Units are seconds.
+        #
+        stepsz = 300.0
 
-    #
-    # Display a banner for the output report:
-    #
-    print( '\n{:s}\n'.format(
-           'Inputs for target visibility search:' )  )
+        #
+        # Display a banner for the output report:
+        #
+        report( '\n{:s}\n'.format(
+                'Inputs for target visibility search:' )  )
+
+        report( '   Target                       = '
+                '{:s}'.format( target )  )
+        report( '   Observation surface location = '
+                '{:s}'.format( srfpt  )  )
+        report( '   Observer\'s reference frame   = '
+                '{:s}'.format( obsfrm )  )
+        report( '   Elevation limit (degrees)    = '
+                '{:f}'.format( elvlim )  )
+        report( '   Aberration correction        = '
+                '{:s}'.format( abcorr )  )
+        if tiered is not None:
+            report( '   Coarse correction            = '
+                    '{:s}'.format( tiered )  )
+        report( '   Step size (seconds)          = '
+                '{:f}'.format( stepsz )  )
 
-    print( '   Target                       = '
-           '{:s}'.format( target )  )
-    print( '   Observation surface location = '
-           '{:s}'.format( srfpt  )  )
-    print( '   Observer\'s reference frame   = '
-           '{:s}'.format( obsfrm )  )
-    print( '   Blocking body                = '
-           '{:s}'.format( front  )  )
-    print( '   Blocker\'s reference frame    = '
-           '{:s}'.format( fframe )  )
-    print( '   Elevation limit (degrees)    = '
-           '{:f}'.format( elvlim )  )
-    print( '   Aberration correction        = '
-           '{:s}'.format( abcorr )  )
-    print( '   Step size (seconds)          = '
-           '{:f}'.format( stepsz )  )
+        #
+        # Convert the start and stop times to ET.
+        #
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop  )
 
-    #
-    # Convert the start and stop times to ET.
-    #
-    etbeg = spiceypy.str2et( start )
-    etend = spiceypy.str2et( stop  )
+        #
+        # Display the search interval start and stop times
+        # using the format shown below.
+        #
+        #    2004 MAY 06 20:15:00.000 (TDB)
+        #
+        timstr = spiceypy.timout( etbeg, TDBFMT )
+        report( '   Start time                   = '
+                '{:s}'.format(timstr) )
 
-    #
-    # Display the search interval start and stop times
-    # using the format shown below.
-    #
-    #    2004 MAY 06 20:15:00.000 (TDB)
-    #
-    btmstr = spiceypy.timout( etbeg, TDBFMT )
-    print( '   Start time                   = '
-           '{:s}'.format(btmstr) )
+        timstr = spiceypy.timout( etend, TDBFMT )
+        report( '   Stop time                    = '
+                '{:s}'.format(timstr) )
 
-    etmstr = spiceypy.timout( etend, TDBFMT )
-    print( '   Stop time                    = '
-           '{:s}'.format(etmstr) )
+        report( ' ' )
 
-    print( ' ' )
+        #
+        # Initialize the "confinement" window with the interval
+        # over which we'll conduct the search.
+        #
+        cnfine = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd( etbeg, etend, cnfine )
 
-    #
-    # Initialize the "confinement" window with the interval
-    # over which we'll conduct the search.
-    #
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd( etbeg, etend, cnfine )
+        #
+        # In the call below, the maximum number of window
+        # intervals gfposc can store internally is set to MAXIVL.
+        # We set the cell size to MAXWIN to achieve this.
+        #
+        riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
 
-    #
-    # In the call below, the maximum number of window
-    # intervals gfposc can store internally is set to MAXIVL.
-    # We set the cell size to MAXWIN to achieve this.
-    #
-    riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+        #
+        # Now search for the time period, within our confinement
+        # window, during which the apparent target has elevation
+        # at least equal to the elevation limit.
+        #
+        _view_period( target, obsfrm, abcorr, srfpt, crdsys, coord,
+                      relate, revlim, adjust, stepsz, MAXIVL, cnfine,
+                      riswin, METAKR, workers, prescan, cache, tiered )
 
-    #
-    # Now search for the time period, within our confinement
-    # window, during which the apparent target has elevation
-    # at least equal to the elevation limit.
-    #
-    spiceypy.gfposc( target, obsfrm, abcorr, srfpt,
-                     crdsys, coord,  relate, revlim,
-                     adjust, stepsz, MAXIVL, cnfine, riswin )
+        with stage( 'display' ):
+            _display_view( report, riswin, target, srfpt, TDBFMT )
 
-    #
-    # Now find the times when the apparent target is above
-    # the elevation limit and is not occulted by the
-    # blocking body (Mars). We'll find the window of times when
-    # the target is above the elevation limit and *is* occulted,
-    # then subtract that window from the view period window
-    # riswin found above.
-    #
-    # For this occultation search, we can use riswin as
-    # the confinement window because we're not interested in
-    # occultations that occur when the target is below the
-    # elevation limit.
-    #
-    # Find occultations within the view period window.
-    #
-    print( ' Searching using ellipsoid target shape model...' )
+        #
+        # Hand the windows back as a structured result.
+        #
+        result = SearchResult( 'viewpr',
+                               { 'target': target, 'srfpt': srfpt,
+                                 'obsfrm': obsfrm, 'abcorr': abcorr,
+                                 'elvlim': elvlim, 'stepsz': stepsz,
+                                 'start': start, 'stop': stop },
+                               { 'view': riswin } )
 
-    eocwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+    return result
 
-    fshape = 'ELLIPSOID'
 
-    spiceypy.gfoclt( occtyp, front,  fshape,  fframe,
-                     back,   bshape, bframe,  abcorr,
-                     srfpt,  stepsz, riswin,  eocwin )
-    print( ' Done.' )
+def visibl( workers=None, prescan=False, cache=None, dsk_margin=None,
+            tiered=None, verbose=True ):
+    #
+    # Local Parameters
+    #
+    METAKR = './mexMetaK.tm.txt'
+    TDBFMT = 'YYYY MON DD HR:MN:SC.### TDB ::TDB'
+    MAXIVL = 1000
+    MAXWIN = 2 * MAXIVL
 
     #
-    # Subtract the occultation window from the view period
-    # window: this yields the time periods when the target
-    # is visible.
+    # Only write the report to standard output if asked to.
     #
-    evswin = spiceypy.wndifd( riswin, eocwin )
+    report = print if verbose else _quiet
 
     #
-    #  Repeat the search using low-resolution DSK data
-    # for the front body.
+    # Load the meta-kernel, or share it if a caller already has.
     #
-    print( ' Searching using DSK target shape model...' )
+    with KernelSession.open( METAKR ) as kernels:
 
-    docwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+        #
+        # Assign the inputs for our search.
+        #
+        # Since we're interested in the apparent location of the
+        # target, we use light time and stellar aberration
+        # corrections. We use the "converged Newtonian" form
+        # of the light time correction because this choice may
+        # increase the accuracy of the occultation times we'll
+        # compute using gfoclt.
+        #
+        srfpt  = 'DSS-14'
+        obsfrm = 'DSS-14_TOPO'
+        target = 'MEX'
+        abcorr = 'CN+S'
+        start  = '2004 MAY 2 TDB'
+        stop   = '2004 MAY 6 TDB'
+        elvlim =  6.0
 
-    fshape = 'DSK/UNPRIORITIZED'
+        #
+        # The elevation limit above has units of degrees; we convert
+        # this value to radians for computation using SPICE routines.
+        # We'll store the equivalent value in radians in revlim.
+        #
+        revlim = spiceypy.rpd() * elvlim
 
-    spiceypy.gfoclt( occtyp, front,  fshape,  fframe,
-                     back,   bshape, bframe,  abcorr,
-                     srfpt,  stepsz, riswin,  docwin )
-    print( ' Done.\n' )
+        #
+        # We model the target shape as a point. We either model the
+        # blocking body's shape as an ellipsoid, or we represent
+        # its shape using actual topographic data. No body-fixed
+        # reference frame is required for the target since its
+        # orientation is not used.
+        #
+        back   = target
+        bshape = 'POINT'
+        bframe = ' '
+        front  = 'MARS'
+        fshape = 'ELLIPSOID'
+        fframe = 'IAU_MARS'
 
-    dvswin = spiceypy.wndifd( riswin, docwin )
+        #
+        # The occultation type should be set to 'ANY' for a point
+        # target.
+        #
+        occtyp = 'any'
 
-    #
-    # The function wncard returns the number of intervals
-    # in a SPICE window.
-    #
-    winsiz = spiceypy.wncard( evswin )
+        #
+        # Since SPICE doesn't directly support the AZ/EL coordinate
+        # system, we use the equivalent constraint
+        #
+        #    latitude > revlim
+        #
+        # in the latitudinal coordinate system, where the reference
+        # frame is topocentric and is centered at the viewing location.
+        #
+        crdsys = 'LATITUDINAL'
+        coord  = 'LATITUDE'
+        relate = '>'
 
-    if winsiz == 0:
+        #
+        # The adjustment value only applies to absolute extrema
+        # searches; simply give it an initial value of zero
+        # for this inequality search.
+        #
+        adjust = 0.0
 
-        print( 'No events were found.' )
+        #
+        # stepsz is the step size, measured in seconds, used to search
+        # for times bracketing a state transition. Since we don't expect
+        # any events of interest to be shorter than five minutes, and
+        # since the separation between events is well over 5 minutes,
+        # we'll use this value as our step size. Units are seconds.
+        #
+        stepsz = 300.0
 
+        #
+        # Display a banner for the output report:
+        #
+        report( '\n{:s}\n'.format(
+                'Inputs for target visibility search:' )  )
+
+        report( '   Target                       = '
+                '{:s}'.format( target )  )
+        report( '   Observation surface location = '
+                '{:s}'.format( srfpt  )  )
+        report( '   Observer\'s reference frame   = '
+                '{:s}'.format( obsfrm )  )
+        report( '   Blocking body                = '
+                '{:s}'.format( front  )  )
+        report( '   Blocker\'s reference frame    = '
+                '{:s}'.format( fframe )  )
+        report( '   Elevation limit (degrees)    = '
+                '{:f}'.format( elvlim )  )
+        report( '   Aberration correction        = '
+                '{:s}'.format( abcorr )  )
+        if tiered is not None:
+            report( '   Coarse correction            = '
+                    '{:s}'.format( tiered )  )
+        report( '   Step size (seconds)          = '
+                '{:f}'.format( stepsz )  )
 
-    else:
         #
-        # Display the visibility time periods.
+        # Convert the start and stop times to ET.
         #
-        print( 'Visibility start and stop times of '
-               '{0:s} as seen from {1:s}\n'
-               'using both ellipsoidal and DSK '
-               'target shape models:\n'.format(
-                   target, srfpt )                 )
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop  )
 
-        for  i  in  range(winsiz):
-            #
-            # Fetch the start and stop times of
-            # the ith interval from the ellipsoid
-            # search result window evswin.
-            #
-            [intbeg, intend] = spiceypy.wnfetd( evswin, i )
+        #
+        # Display the search interval start and stop times
+        # using the format shown below.
+        #
+        #    2004 MAY 06 20:15:00.000 (TDB)
+        #
+        btmstr = spiceypy.timout( etbeg, TDBFMT )
+        report( '   Start time                   = '
+                '{:s}'.format(btmstr) )
 
-            #
-            # Convert the rise time to TDB calendar strings.
-            # Write the results.
-            #
-            btmstr = spiceypy.timout( intbeg, TDBFMT )
-            etmstr = spiceypy.timout( intend, TDBFMT )
+        etmstr = spiceypy.timout( etend, TDBFMT )
+        report( '   Stop time                    = '
+                '{:s}'.format(etmstr) )
 
-            print( ' Ell: {:s} : {:s}'.format( btmstr, etmstr ) )
+        report( ' ' )
 
-            #
-            # Fetch the start and stop times of
-            # the ith interval from the DSK
-            # search result window dvswin.
-            #
-            [dintbg, dinten] = spiceypy.wnfetd( dvswin, i )
+        #
+        # Initialize the "confinement" window with the interval
+        # over which we'll conduct the search.
+        #
+        cnfine = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd( etbeg, etend, cnfine )
 
-            #
-            # Convert the rise time to TDB calendar strings.
-            # Write the results.
-            #
-            btmstr = spiceypy.timout( dintbg, TDBFMT )
-            etmstr = spiceypy.timout( dinten, TDBFMT )
+        #
+        # In the call below, the maximum number of window
+        # intervals gfposc can store internally is set to MAXIVL.
+        # We set the cell size to MAXWIN to achieve this.
+        #
+        riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
 
-            print( ' DSK: {:s} : {:s}\n'.format( btmstr, etmstr ) )
         #
-        # End of result display loop.
+        # Now search for the time period, within our confinement
+        # window, during which the apparent target has elevation
+        # at least equal to the elevation limit.
         #
+        _view_period( target, obsfrm, abcorr, srfpt, crdsys, coord,
+                      relate, revlim, adjust, stepsz, MAXIVL, cnfine,
+                      riswin, METAKR, workers, prescan, cache, tiered )
 
-    spiceypy.unload( METAKR )
+        #
+        # Now find the times when the apparent target is above
+        # the elevation limit and is not occulted by the
+        # blocking body (Mars). We'll find the window of times when
+        # the target is above the elevation limit and *is* occulted,
+        # then subtract that window from the view period window
+        # riswin found above.
+        #
+        # For this occultation search, we can use riswin as
+        # the confinement window because we're not interested in
+        # occultations that occur when the target is below the
+        # elevation limit.
+        #
+        # Find occultations within the view period window.
+        #
+        report( ' Searching using ellipsoid target shape model...' )
 
+        eocwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
 
-def shade():
-    #
-    # Local Parameters
-    #
-    METAKR = './mexMetaK.tm.txt'
-    TDBFMT = 'YYYY MON DD HR:MN:SC.### TDB ::TDB'
-    MAXIVL = 1000
-    MAXWIN = 2 * MAXIVL
+        fshape = 'ELLIPSOID'
 
-    #
-    # Load the meta-kernel.
-    #
-    spiceypy.furnsh( METAKR )
-    
-    #
-    # input
-    #
-    front  = 'MARS'
-    fshape = 'ELLIPSOID'
-    fframe = 'IAU_MARS'
-    ilusrc = 'SUN'
-    back   = ilusrc
-    bshape = 'ELLIPSOID'
-    bframe = 'IAU_SUN'
-    abcorr = 'CN+S'
-    obssat = 'MEX'
-    stepsz = 300.0
-    umbra  = 'FULL'
-    penumb = 'ANY'
-    
-    start  = '2004 MAY 2 TDB'
-    stop   = '2004 MAY 6 TDB'
-    
-    #
-    # Convert the start and stop times to ET.
-    #
-    etbeg = spiceypy.str2et( start )
-    etend = spiceypy.str2et( stop  )
-    btmstr = spiceypy.timout( etbeg, TDBFMT )
-    print( '   Start time                   = '
-           '{:s}'.format(btmstr) )
-    etmstr = spiceypy.timout( etend, TDBFMT )
-    print( '   Stop time                    = '
-           '{:s}'.format(etmstr) )
-    print( ' ' )
-    
-    #
-    # Penumbra or Umbra
-    #
-    print( 'Searching using ellipsoid target shape model...' )
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd( etbeg, etend, cnfine )
-    eocwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
-    spiceypy.gfoclt( penumb, front,  fshape,  fframe,
-                     back,   bshape, bframe,  abcorr,
-                     obssat, stepsz, cnfine,  eocwin )
-    print( '\n{:s}\n'.format('Done.') )
-    winsiz = spiceypy.wncard( eocwin )
+        with stage( 'ellipsoid' ):
+            parallel_search.gfoclt( occtyp, front,  fshape,  fframe,
+                                    back,   bshape, bframe,  abcorr,
+                                    srfpt,  stepsz, riswin,  eocwin,
+                                    metakr=METAKR, workers=workers,
+                                    cache=cache )
+        report( ' Done.' )
 
-    if winsiz == 0:
-        print( 'No events were found.' )
-    else:
         #
-        # Display the visibility time periods.
+        # Subtract the occultation window from the view period
+        # window: this yields the time periods when the target
+        # is visible.
         #
-        print( 'Penumbra start and stop times of '
-                '{0:s} as seen from {1:s}\n'
-                'using ellipsoidal '
-                'target shape models:\n'.format( obssat, ilusrc ))
+        with stage( 'wndifd' ):
+            evswin = spiceypy.wndifd( riswin, eocwin )
 
-        for  i  in  range(winsiz):
-            #
-            # Fetch the start and stop times of
-            # the ith interval from the ellipsoid
-            # search result window evswin.
-            #
-            [intbeg, intend] = spiceypy.wnfetd( eocwin, i )
+        #
+        #  Repeat the search using low-resolution DSK data
+        # for the front body.
+        #
+        report( ' Searching using DSK target shape model...' )
+
+        docwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+
+        fshape = 'DSK/UNPRIORITIZED'
+
+        if dsk_margin is None:
+
+            with stage( 'dsk' ):
+                parallel_search.gfoclt( occtyp, front,  fshape,  fframe,
+                                        back,   bshape, bframe,  abcorr,
+                                        srfpt,  stepsz, riswin,  docwin,
+                                        metakr=METAKR, workers=workers,
+                                        cache=cache )
+        else:
+            #
+            # The DSK occultation edges can only lie near the
+            # ellipsoid ones, so search the DSK shape only within
+            # dsk_margin seconds of the edges of eocwin and keep the
+            # ellipsoid result everywhere else. The margin is doubled
+            # while a DSK edge lies outside it, and the whole view
+            # period is searched if that does not settle it.
+            #
+            def dsk_search( nbhd, step ):
+                occwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+                parallel_search.gfoclt( occtyp, front,  fshape,  fframe,
+                                        back,   bshape, bframe,  abcorr,
+                                        srfpt,  step,   nbhd.to_cell(),
+                                        occwin,
+                                        metakr=METAKR, workers=workers,
+                                        cache=cache )
+                return occwin
+
+            with stage( 'dsk' ):
+                refine_edges( eocwin, dsk_margin, dsk_search, stepsz,
+                              riswin ).to_cell( cell=docwin )
+        report( ' Done.\n' )
+
+        with stage( 'wndifd' ):
+            dvswin = spiceypy.wndifd( riswin, docwin )
 
-            #
-            # Convert the rise time to TDB calendar strings.
-            # Write the results.
-            #
-            btmstr = spiceypy.timout( intbeg, TDBFMT )
-            etmstr = spiceypy.timout( intend, TDBFMT )
+        #
+        # Hand the windows back as a structured result.
+        #
+        result = SearchResult( 'visibl',
+                               { 'target': target, 'srfpt': srfpt,
+                                 'obsfrm': obsfrm, 'abcorr': abcorr,
+                                 'elvlim': elvlim, 'stepsz': stepsz,
+                                 'front': front, 'fframe': fframe,
+                                 'start': start, 'stop': stop },
+                               { 'view': riswin,
+                                 'visible_ellipsoid': evswin,
+                                 'visible_dsk': dvswin } )
+
+        with stage( 'display' ):
+            _display_visible( report, result, TDBFMT )
 
-            print( ' Ell: {:s} : {:s}'.format( btmstr, etmstr ) )
-    
-    print( '\n{:s}\n'.format('Done.') )
-    spiceypy.unload( METAKR )
+    return result
 
 
-def geometry_find():
+def shade( workers=None, cache=None, verbose=True ):
     #
     # Local Parameters
     #
     METAKR = './mexMetaK.tm.txt'
-    TDBFMT = 'YYYY MON DD HR:MN:SC.### (TDB) ::TDB'
+    TDBFMT = 'YYYY MON DD HR:MN:SC.### TDB ::TDB'
+    MAXIVL = 1000
+    MAXWIN = 2 * MAXIVL
 
     #
-    # Load the meta-kernel.
+    # Only write the report to standard output if asked to.
     #
-    spiceypy.furnsh( METAKR )
+    report = print if verbose else _quiet
 
     #
-    # Inputs
+    # Load the meta-kernel, or share it if a caller already has.
     #
-    target = 'MEX'
-    frame  = 'IAU_MARS'
-    abcorr = 'NONE'
-    obsrvr = 'MARS'
-    crdsys = 'LATITUDINAL'
-    coord  = 'LATITUDE'
-    relate = '<'
-    lati   = 0.000000001
-    refval = spiceypy.rpd() * lati
-    adjust = 0.0
-    step   = 300
-    MAXIVL = 1000
-    MAXWIN = 2 * MAXIVL
-
-    start  = '2004 MAY 2 TDB'
-    stop   = '2004 MAY 6 TDB'
-    etbeg = spiceypy.str2et( start )
-    etend = spiceypy.str2et( stop  )
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd( etbeg, etend, cnfine )
-    riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+    with KernelSession.open( METAKR ) as kernels:
 
-    spiceypy.gfposc( target, frame,  abcorr, obsrvr,
-                     crdsys, coord,  relate, refval,
-                     adjust, step,   MAXIVL, cnfine, riswin )
-    winsiz = spiceypy.wncard( riswin )
+        #
+        # input
+        #
+        front  = 'MARS'
+        fshape = 'ELLIPSOID'
+        fframe = 'IAU_MARS'
+        ilusrc = 'SUN'
+        back   = ilusrc
+        bshape = 'ELLIPSOID'
+        bframe = 'IAU_SUN'
+        abcorr = 'CN+S'
+        obssat = 'MEX'
+        stepsz = 300.0
+        umbra  = 'FULL'
+        penumb = 'ANY'
+        annulr = 'ANNULAR'
+
+        start  = '2004 MAY 2 TDB'
+        stop   = '2004 MAY 6 TDB'
 
-    if winsiz == 0:
+        #
+        # Convert the start and stop times to ET.
+        #
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop  )
+        btmstr = spiceypy.timout( etbeg, TDBFMT )
+        report( '   Start time                   = '
+                '{:s}'.format(btmstr) )
+        etmstr = spiceypy.timout( etend, TDBFMT )
+        report( '   Stop time                    = '
+                '{:s}'.format(etmstr) )
+        report( ' ' )
 
-        print( 'No events were found.' )
+        #
+        # Penumbra: any part of the Sun hidden by Mars.
+        #
+        report( 'Searching using ellipsoid target shape model...' )
+        cnfine = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd( etbeg, etend, cnfine )
+        eocwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+        with stage( 'penumbra' ):
+            parallel_search.gfoclt( penumb, front,  fshape,  fframe,
+                                    back,   bshape, bframe,  abcorr,
+                                    obssat, stepsz, cnfine,  eocwin,
+                                    metakr=METAKR, workers=workers,
+                                    cache=cache )
 
-    else:
+        #
+        # Umbra and annular phases can only occur while some of the
+        # Sun is hidden, so search for them within the penumbra
+        # window rather than over the whole span again. An annular
+        # phase also needs Mars to look smaller than the Sun, which
+        # it never does from MEX, so that search is only run when
+        # the apparent sizes allow it.
+        #
+        umbwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+        annwin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+        if spiceypy.wncard( eocwin ) > 0:
+            with stage( 'umbra' ):
+                parallel_search.gfoclt( umbra,  front,  fshape,  fframe,
+                                        back,   bshape, bframe,  abcorr,
+                                        obssat, stepsz, eocwin,  umbwin,
+                                        metakr=METAKR, workers=workers,
+                                        cache=cache )
+        if annular_possible( eocwin, obssat, front, back, abcorr, stepsz ):
+            with stage( 'annular' ):
+                parallel_search.gfoclt( annulr, front,  fshape,  fframe,
+                                        back,   bshape, bframe,  abcorr,
+                                        obssat, stepsz, eocwin,  annwin,
+                                        metakr=METAKR, workers=workers,
+                                        cache=cache )
+        report( '\n{:s}\n'.format('Done.') )
 
         #
-        # Display the visibility time periods.
+        # Entry, exit and duration of each phase of each eclipse.
         #
-        print( 'Visibility times of {0:s} '
-               'as seen from {1:s}:\n'.format(target, obsrvr) )
+        stats = eclipse_statistics( eocwin, umbwin, annwin )
 
-        for  i  in  range(winsiz):
-            #
-            # Fetch the start and stop times of
-            # the ith interval from the search result
-            # window riswin.
-            #
-            [intbeg, intend] = spiceypy.wnfetd( riswin, i )
+        with stage( 'display' ):
+            _display_shade( report, eocwin, stats, obssat, ilusrc, TDBFMT )
 
-            #
-            # Convert the rise time to a TDB calendar string.
-            #
-            timstr = spiceypy.timout( intbeg, TDBFMT )
+        report( '\n{:s}\n'.format('Done.') )
 
-            #
-            # Write the string to standard output.
-            #
-            if  i  ==  0:
+        #
+        # Hand the windows back as a structured result.
+        #
+        result = SearchResult( 'shade',
+                               { 'obssat': obssat, 'front': front,
+                                 'ilusrc': ilusrc, 'abcorr': abcorr,
+                                 'stepsz': stepsz,
+                                 'start': start, 'stop': stop },
+                               { 'penumbra': eocwin, 'umbra': umbwin,
+                                 'annular': annwin } )
+        result.statistics = stats
 
-                print( 'Visibility or window start time:'
-                       '  {:s}'.format( timstr )          )
-            else:
+    return result
 
-                print( 'Visibility start time:          '
-                       '  {:s}'.format( timstr )          )
 
-            #
-            # Convert the set time to a TDB calendar string.
-            #
-            timstr = spiceypy.timout( intend, TDBFMT )
+def geometry_find( verbose=True, batched=False ):
+    #
+    # Local Parameters
+    #
+    METAKR = './mexMetaK.tm.txt'
+    TDBFMT = 'YYYY MON DD HR:MN:SC.### (TDB) ::TDB'
 
-            #
-            # Write the string to standard output.
-            #
-            if  i  ==  (winsiz-1):
+    #
+    # Only write the report to standard output if asked to.
+    #
+    report = print if verbose else _quiet
 
-                print( 'Visibility or window stop time: '
-                       '  {:s}'.format( timstr )          )
-            else:
+    #
+    # Load the meta-kernel, or share it if a caller already has.
+    #
+    with KernelSession.open( METAKR ) as kernels:
 
-                print( 'Visibility stop time:           '
-                       '  {:s}'.format( timstr )          )
+        #
+        # Inputs
+        #
+        target = 'MEX'
+        frame  = 'IAU_MARS'
+        abcorr = 'NONE'
+        obsrvr = 'MARS'
+        crdsys = 'LATITUDINAL'
+        coord  = 'LATITUDE'
+        relate = '<'
+        lati   = 0.000000001
+        refval = spiceypy.rpd() * lati
+        adjust = 0.0
+        step   = 300
+        MAXIVL = 1000
+        MAXWIN = 2 * MAXIVL
+
+        start  = '2004 MAY 2 TDB'
+        stop   = '2004 MAY 6 TDB'
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop  )
+        cnfine = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd( etbeg, etend, cnfine )
+        riswin = stypes.SPICEDOUBLE_CELL( MAXWIN )
+
+        if batched:
+            #
+            # Sample once and refine all crossings together instead of
+            # a GF scan; the same window to within the GF tolerance.
+            #
+            with stage( 'crossing' ):
+                crossing_search( [( coord.lower(), relate, refval )],
+                                 cnfine, step, target, frame, abcorr,
+                                 obsrvr )[0].to_cell( cell=riswin )
+        else:
+            parallel_search.gfposc( target, frame,  abcorr, obsrvr,
+                                    crdsys, coord,  relate, refval,
+                                    adjust, step,   MAXIVL, cnfine, riswin )
+
+        with stage( 'display' ):
+            _display_view( report, riswin, target, obsrvr, TDBFMT )
 
-            print( ' ' )
+        #
+        # Hand the windows back as a structured result.
+        #
+        result = SearchResult( 'geometry_find',
+                               { 'target': target, 'obsrvr': obsrvr,
+                                 'frame': frame, 'abcorr': abcorr,
+                                 'coord': coord, 'relate': relate,
+                                 'refval': refval, 'step': step,
+                                 'start': start, 'stop': stop },
+                               { coord.lower(): riswin } )
 
-    spiceypy.unload( METAKR )
+    return result
 
 
 if __name__ == '__main__':
-    # DSS-14から見たMEX可視
-    viewpr()
-    # DSS-14から見た火星による掩蔽を考慮したMEX可視
-    visibl()
-    # 日陰
-    shade()
-    # geometry finder
-    geometry_find()
\ No newline at end of file
+    # メタカーネルは一度だけロードして各関数で共有
+    with KernelSession.open( './mexMetaK.tm.txt' ) as kernels:
+        print( kernels )
+        # DSS-14から見たMEX可視
+        viewpr()
+        # DSS-14から見た火星による掩蔽を考慮したMEX可視
+        visibl()
+        # 日陰
+        shade()
+        # geometry finder
+        geometry_find()
\ No newline at end of file
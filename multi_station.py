@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Station x target view period matrix.
+
+viewpr/visibl answer the question for DSS-14 and MEX only. Here every
+(station, target) pair gets the same elevation search, optionally
+followed by the occultation filter of visibl, with all searches of a
+stage submitted to one pool of worker processes that keep the kernels
+loaded:
+
+    vpm = view_period_matrix( ['DSS-14', 'DSS-43', 'DSS-63'], ['MEX'],
+                              '2004 MAY 2 TDB', '2004 MAY 6 TDB',
+                              occult=True, workers=4 )
+    vpm['DSS-43', 'MEX']            # IntervalSet of visible times
+    vpm.at( ets )[:, 0].any( axis=0 )   # MEX seen by any station
+
+The occultation of a target by the blocking body is shared between
+stations: it is searched once per target as seen from the Earth's
+center, and each station then only searches the neighbourhood of
+those occultations. Seen from anywhere on the Earth, the occultation
+edges of a Mars orbiter move by well under a second, so the default
+margin of 60 s leaves the station results unchanged.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet, membership
+from kernel_session import KernelSession
+from parallel_search import run_search, worker_pool
+
+METAKR = './mexMetaK.tm.txt'
+
+
+class ViewPeriodMatrix(object):
+    """
+    Windows indexed by station and target. rise holds the view
+    periods above the elevation limit, visible the view periods with
+    occultations removed (the same as rise if occult was not set).
+    """
+
+    def __init__(self, stations, targets):
+        self.stations = list( stations )
+        self.targets  = list( targets )
+        shape = ( len( self.stations ), len( self.targets ) )
+        self.rise    = np.empty( shape, dtype=object )
+        self.visible = np.empty( shape, dtype=object )
+
+    def index(self, station, target):
+        return self.stations.index( station ), self.targets.index( target )
+
+    def __getitem__(self, key):
+        return self.visible[self.index( *key )]
+
+    def pairs(self):
+        for i, station in enumerate( self.stations ):
+            for j, target in enumerate( self.targets ):
+                yield i, j, station, target
+
+    def at(self, ets, which='visible'):
+        """
+        (stations, targets, len( ets )) booleans: whether each target
+        is in view of each station at each ET. which='rise' ignores
+        occultations.
+        """
+        windows = getattr( self, which )
+        mask = membership( windows.ravel(), ets )
+        return mask.reshape( windows.shape + mask.shape[1:] )
+
+
+def view_period_matrix(stations, targets, start, stop, metakr=METAKR,
+                       elvlim=6.0, abcorr='CN+S', stepsz=300.0,
+                       occult=False, front='MARS', fshape='ELLIPSOID',
+                       fframe='IAU_MARS', margin=60.0, frames=None,
+                       maxivl=1000, workers=None):
+    """
+    View periods of every target from every station between start
+    and stop. Each station's topocentric frame is <station>_TOPO
+    unless given in the frames dict.
+    """
+    if frames is None:
+        frames = {}
+    size = 2 * maxivl
+    vpm = ViewPeriodMatrix( stations, targets )
+
+    with KernelSession.open( metakr ):
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop  )
+        revlim = spiceypy.rpd() * elvlim
+    cnfine = np.array( [[etbeg, etend]] )
+
+    with worker_pool( metakr, workers ) as pool:
+        #
+        # Elevation searches, one per station and target.
+        #
+        futures = {}
+        for i, j, station, target in vpm.pairs():
+            obsfrm = frames.get( station, '{:s}_TOPO'.format( station ) )
+            args = ( target, obsfrm, abcorr, station,
+                     'LATITUDINAL', 'LATITUDE', '>', revlim,
+                     0.0, stepsz, maxivl )
+            futures[i, j] = pool.submit( run_search, 'gfposc', args,
+                                         size, cnfine )
+        for ( i, j ), future in futures.items():
+            vpm.rise[i, j] = IntervalSet( future.result() )
+
+        if not occult:
+            vpm.visible[:] = vpm.rise
+            return vpm
+
+        #
+        # Occultations seen from the geocenter, one search per target
+        # over the union of that target's view periods.
+        #
+        futures = {}
+        for j, target in enumerate( vpm.targets ):
+            union = IntervalSet()
+            for i in range( len( vpm.stations ) ):
+                union = union | vpm.rise[i, j]
+            if len( union ) == 0:
+                continue
+            args = ( 'ANY', front, fshape, fframe,
+                     target, 'POINT', ' ', abcorr,
+                     'EARTH', stepsz )
+            futures[j] = pool.submit( run_search, 'gfoclt', args, size,
+                                      union.expand( margin, margin ).array )
+        shared = {}
+        finest = 0.5 * margin
+        for j, future in futures.items():
+            occwin = IntervalSet( future.result() )
+            if len( occwin ):
+                finest = min( finest, 0.5 * np.min( occwin.durations ) )
+            shared[j] = occwin.expand( margin, margin )
+
+        #
+        # The neighbourhoods are short, so step through them finely
+        # enough to land inside the shortest shared occultation.
+        #
+        finstp = max( min( stepsz, finest ), 1.0 )
+
+        #
+        # Per station, search only near the shared occultations.
+        #
+        futures = {}
+        for i, j, station, target in vpm.pairs():
+            confine = vpm.rise[i, j] & shared.get( j, IntervalSet() )
+            if len( confine ) == 0:
+                continue
+            args = ( 'ANY', front, fshape, fframe,
+                     target, 'POINT', ' ', abcorr,
+                     station, finstp )
+            futures[i, j] = pool.submit( run_search, 'gfoclt', args,
+                                         size, confine.array )
+        for i, j, station, target in vpm.pairs():
+            if ( i, j ) in futures:
+                occwin = IntervalSet( futures[i, j].result() )
+                vpm.visible[i, j] = vpm.rise[i, j] - occwin
+            else:
+                vpm.visible[i, j] = vpm.rise[i, j]
+
+    return vpm
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed, blitted 3D animation of the MEX orbit.
+
+    animate( 'animation.gif', '2004 MAY 2 TDB', '2004 MAY 3 TDB', 2000,
+             windows=[ ('eclipse', shade( verbose=False )['penumbra'],
+                        'dimgray'),
+                       ('visible', visibl( verbose=False )['visible_dsk'],
+                        'tab:green') ] )
+
+SPICE is called once per body for all frame times (vectorized
+spkpos), and the UTC labels are converted in one et2datetime64 call.
+Each frame's colour is that of the first window containing its ET
+(one binary search per window for all frames), so the trail is
+shaded by eclipse and visibility.
+
+Mars, the full orbit and the axes are drawn once and kept as the
+background; a frame restores it and draws only the animated artists
+(MEX, its trail, the Sun direction and the labels) with blitting.
+
+Frames go through a bounded queue to an encoder that runs alongside
+the renderer: an ffmpeg process fed by a writer thread when ffmpeg is
+installed (any format it writes, e.g. .mp4), otherwise a Pillow
+process writing a GIF. Pillow keeps the palette frames in memory
+until the end, so use ffmpeg for very long animations.
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+import spiceypy
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+from et_convert import et2datetime64
+from interval_set import membership
+from kernel_session import KernelSession
+from profiling import stage
+
+METAKR = './mexMetaK.tm.txt'
+
+DEFAULT_COLOR = 'tab:blue'
+
+
+def precompute(ets, target='MEX', center='MARS', frame='J2000',
+               abcorr='NONE'):
+    """
+    Positions of target and of the Sun relative to center at every
+    ET, one spkpos call each, plus the UTC labels and the radii of
+    center. Kernels must be loaded.
+    """
+    ets = np.asarray( ets, dtype=float )
+    target_pos, _ = spiceypy.spkpos( target, ets, frame, abcorr, center )
+    sun_pos, _ = spiceypy.spkpos( 'SUN', ets, frame, abcorr, center )
+    _, radii = spiceypy.bodvrd( center, 'RADII', 3 )
+    utc = np.datetime_as_string( et2datetime64( ets, 's' ), unit='s' )
+    return { 'ets': ets,
+             'target': np.asarray( target_pos ).reshape( -1, 3 ),
+             'sun': np.asarray( sun_pos ).reshape( -1, 3 ),
+             'radii': np.asarray( radii ),
+             'utc': utc,
+             'names': ( target, center ) }
+
+
+def frame_colors(ets, windows, default=DEFAULT_COLOR):
+    """
+    Colour and label of each frame: those of the first of windows,
+    a list of (label, window, colour), that contains its ET.
+    """
+    colors = np.full( len( ets ), default, dtype=object )
+    labels = np.full( len( ets ), '', dtype=object )
+    if not windows:
+        return colors, labels
+    inside = membership( [w for _, w, _ in windows], ets )
+    for k in range( len( windows ) - 1, -1, -1 ):
+        colors[inside[k]] = windows[k][2]
+        labels[inside[k]] = windows[k][0]
+    return colors, labels
+
+
+class OrbitRenderer(object):
+
+    def __init__(self, frames, colors, labels, size=6.0, dpi=80,
+                 trail=200):
+        self.frames = frames
+        self.colors = colors
+        self.labels = labels
+        self.trail = trail
+
+        fig = Figure( figsize=( size, size ), dpi=dpi )
+        self.canvas = FigureCanvasAgg( fig )
+        ax = fig.add_subplot( 111, projection='3d' )
+        self.figure = fig
+        self.ax = ax
+
+        #
+        # Static background: the central body, the whole orbit and
+        # fixed axes limits, drawn once.
+        #
+        pos = frames['target']
+        radii = frames['radii']
+        u, v = np.mgrid[0:2 * np.pi:24j, 0:np.pi:12j]
+        ax.plot_surface( radii[0] * np.cos( u ) * np.sin( v ),
+                         radii[1] * np.sin( u ) * np.sin( v ),
+                         radii[2] * np.cos( v ), color='tab:red',
+                         alpha=0.4, linewidth=0 )
+        ax.plot( pos[:, 0], pos[:, 1], pos[:, 2], color='lightgray',
+                 linewidth=0.5 )
+        reach = max( np.max( np.abs( pos ) ), radii[0] ) * 1.05
+        self.reach = reach
+        ax.set_xlim( -reach, reach )
+        ax.set_ylim( -reach, reach )
+        ax.set_zlim( -reach, reach )
+        ax.set_box_aspect( ( 1, 1, 1 ) )
+        ax.set_xlabel( 'X (km)' )
+        ax.set_ylabel( 'Y (km)' )
+        ax.set_zlabel( 'Z (km)' )
+        ax.set_title( '{:s} around {:s}'.format( *frames['names'] ) )
+
+        #
+        # Animated artists, drawn per frame.
+        #
+        self.path = Line3DCollection( [], linewidths=1.5, animated=True )
+        ax.add_collection3d( self.path, autolim=False )
+        self.point, = ax.plot( [], [], [], 'o', animated=True )
+        self.sun, = ax.plot( [], [], [], color='gold', linewidth=2,
+                             animated=True )
+        self.text = ax.text2D( 0.0, 1.0, '', transform=ax.transAxes,
+                               verticalalignment='top', animated=True )
+        self.artists = [ self.path, self.sun, self.point, self.text ]
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox( fig.bbox )
+
+    @property
+    def shape(self):
+        width, height = self.canvas.get_width_height()
+        return height, width
+
+    def render(self, i):
+        """
+        Frame i as an (height, width, 4) uint8 RGBA array.
+        """
+        frames = self.frames
+        pos = frames['target']
+        first = max( i - self.trail, 0 )
+
+        segments = np.stack( ( pos[first:i], pos[first + 1:i + 1] ),
+                             axis=1 )
+        self.path.set_segments( segments )
+        self.path.set_color( list( self.colors[first + 1:i + 1] ) )
+        self.point.set_data_3d( pos[i:i + 1, 0], pos[i:i + 1, 1],
+                                pos[i:i + 1, 2] )
+        self.point.set_color( self.colors[i] )
+        sun = frames['sun'][i]
+        sun = 0.9 * self.reach * sun / np.linalg.norm( sun )
+        self.sun.set_data_3d( [0.0, sun[0]], [0.0, sun[1]], [0.0, sun[2]] )
+        self.text.set_text( '{:s} UTC\n{:s}'.format( frames['utc'][i],
+                                                     self.labels[i] ) )
+
+        self.canvas.restore_region( self.background )
+        for artist in self.artists:
+            if hasattr( artist, 'do_3d_projection' ):
+                artist.do_3d_projection()
+            self.ax.draw_artist( artist )
+        return np.asarray( self.canvas.buffer_rgba() ).copy()
+
+
+def _pillow_writer(frames, path, fps):
+    """
+    Encoder process without ffmpeg: quantize every frame to the
+    palette of the first and write a GIF.
+    """
+    from PIL import Image
+
+    first = frames.get()
+    if first is None:
+        return
+    head = Image.fromarray( first ).convert( 'RGB' ).quantize( 255 )
+
+    def rest():
+        while True:
+            frame = frames.get()
+            if frame is None:
+                return
+            yield Image.fromarray( frame ).convert( 'RGB' ).quantize(
+                      palette=head, dither=Image.Dither.NONE )
+
+    head.save( path, save_all=True, append_images=rest(),
+               duration=int( round( 1000.0 / fps ) ), loop=0 )
+
+
+class FrameEncoder(object):
+    """
+    Background encoder of RGBA frames of one size:
+
+        with FrameEncoder( 'orbit.mp4', shape, fps=25 ) as encoder:
+            encoder.put( frame )
+    """
+
+    def __init__(self, path, shape, fps=25, backlog=64):
+        self.path = path
+        self.shape = shape
+        self.error = None
+        ffmpeg = shutil.which( 'ffmpeg' )
+        if ffmpeg is not None:
+            height, width = shape
+            self.process = subprocess.Popen(
+                [ ffmpeg, '-y', '-loglevel', 'error',
+                  '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                  '-s', '{:d}x{:d}'.format( width, height ),
+                  '-r', str( fps ), '-i', '-',
+                  '-pix_fmt', 'yuv420p' if not path.endswith( '.gif' )
+                  else 'rgb8', path ], stdin=subprocess.PIPE )
+            self.queue = queue.Queue( backlog )
+            self.worker = threading.Thread( target=self._feed )
+            self.worker.start()
+        elif os.path.splitext( path )[1].lower() == '.gif':
+            context = multiprocessing.get_context( 'spawn' )
+            self.process = None
+            self.queue = context.Queue( backlog )
+            self.worker = context.Process( target=_pillow_writer,
+                                           args=( self.queue, path, fps ) )
+            self.worker.start()
+        else:
+            raise ValueError( 'writing {:s} needs ffmpeg'.format( path ) )
+
+    def _feed(self):
+        frame = None
+        try:
+            while True:
+                frame = self.queue.get()
+                if frame is None:
+                    break
+                self.process.stdin.write( frame.tobytes() )
+            self.process.stdin.close()
+        except OSError as exc:
+            #
+            # ffmpeg exited early (BrokenPipeError). Keep taking
+            # frames until close so that put and close never block
+            # on a full queue; both raise the error.
+            #
+            self.error = exc
+            while frame is not None:
+                frame = self.queue.get()
+
+    def put(self, frame):
+        if self.error is not None:
+            raise self.error
+        if frame.shape[:2] != tuple( self.shape ):
+            raise ValueError( 'frame size changed' )
+        self.queue.put( frame )
+
+    def close(self):
+        self.queue.put( None )
+        self.worker.join()
+        failed = self.process is not None and self.process.wait() != 0
+        if self.error is not None:
+            raise self.error
+        if failed:
+            raise RuntimeError( 'ffmpeg failed writing {:s}'.format(
+                self.path ) )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def animate(path, start, stop, nframes, windows=(), metakr=METAKR,
+            fps=25, trail=200, size=6.0, dpi=80, target='MEX',
+            center='MARS', frame='J2000'):
+    """
+    Write an animation of target around center between start and
+    stop (time strings) with nframes frames, shading the trail by
+    windows, a list of (label, window, colour).
+    """
+    windows = list( windows )
+    with KernelSession.open( metakr ):
+        etbeg = spiceypy.str2et( start )
+        etend = spiceypy.str2et( stop )
+        ets = np.linspace( etbeg, etend, nframes )
+        with stage( 'precompute' ):
+            frames = precompute( ets, target, center, frame )
+    colors, labels = frame_colors( ets, windows )
+
+    renderer = OrbitRenderer( frames, colors, labels, size, dpi, trail )
+    with FrameEncoder( path, renderer.shape, fps ) as encoder:
+        for i in range( nframes ):
+            with stage( 'render' ):
+                image = renderer.render( i )
+            encoder.put( image )
+    return path
+
+
+if __name__ == '__main__':
+    from mex_visible import shade, visibl
+    # メタカーネルは一度だけロードして探索とアニメーションで共有
+    with KernelSession.open( METAKR ):
+        # 日陰と可視の窓で軌道を色分け
+        windows = [ ( 'eclipse', shade( verbose=False )['penumbra'],
+                      'dimgray' ),
+                    ( 'visible', visibl( verbose=False )['visible_dsk'],
+                      'tab:green' ) ]
+        animate( 'animation.gif', '2004 MAY 2 TDB', '2004 MAY 3 TDB', 600,
+                 windows )
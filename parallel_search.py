@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Time-sliced parallel geometry finder searches.
+
+gfposc and gfoclt take the same arguments as their spiceypy
+counterparts plus
+
+    metakr   meta-kernel each worker process loads for itself
+    workers  number of worker processes (None or 1: plain serial call)
+    overlap  seconds each slice extends past its neighbours
+             (default: two search steps)
+    cache    optional result_cache.ResultCache to look results up in
+    tol      GF convergence tolerance in seconds (None: the default,
+             1e-6 s); set with gfstol for this search only
+
+Each search is timed as a profiling stage named after the routine.
+
+Without a result cell, gfposc makes one of 2 * nintvls endpoints and
+gfoclt, which has no nintvls, one of MAXWIN endpoints per slice, as
+every slice is searched into a cell the size of the result.
+
+The worker processes are kept between searches, one pool per
+meta-kernel and number of workers (shared_pool), so each worker loads
+the kernels once rather than once per search. Call close_pools()
+after changing the kernels a meta-kernel names; the pools are shut
+down at exit.
+
+The confinement window is cut into slices of equal measure. Every
+slice is searched over its core plus the overlap, so that no event
+near a cut is located against an artificial confinement edge, and
+the result is clipped back to the core. Concatenating the clipped
+pieces merges intervals that run across a cut, so the stitched
+window matches the serial search to within the GF convergence
+tolerance.
+"""
+
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+import profiling
+from interval_set import IntervalSet, array2cell
+from kernel_session import KernelSession
+
+#
+# Endpoints per slice of a gfoclt result cell made here.
+#
+MAXWIN = 2000
+
+#
+# Process pools kept between searches, by (meta-kernel, workers).
+#
+_POOLS = {}
+
+
+def split_window(cnfine, nslice, overlap):
+    """
+    Cut a window into nslice pieces of equal measure. Returns a list
+    of (core, search) (N,2) arrays where search is the part of cnfine
+    within overlap seconds of core.
+    """
+    win = IntervalSet.from_cell( cnfine )
+    if len( win ) == 0:
+        return []
+    cum = np.concatenate( ([0.0], np.cumsum( win.durations )) )
+    marks = np.linspace( 0.0, cum[-1], nslice + 1 )[1:-1]
+    i = np.searchsorted( cum, marks, side='right' ) - 1
+    i = np.minimum( i, len( win ) - 1 )
+    cuts = win.begins[i] + ( marks - cum[i] )
+    edges = np.concatenate( ([win.array[0, 0]], cuts, [win.array[-1, 1]]) )
+
+    slices = []
+    for lo, hi in zip( edges[:-1], edges[1:] ):
+        if hi <= lo:
+            continue
+        core   = win & IntervalSet( [[lo, hi]] )
+        search = win & IntervalSet( [[lo - overlap, hi + overlap]] )
+        if len( core ):
+            slices.append( (core.array, search.array) )
+    return slices
+
+
+def _call(name, args, cnfine, result, tol=None):
+    #
+    # Count evaluations if the active profile asks for it; worker
+    # processes never have one.
+    #
+    if profiling.counting():
+        return profiling.counted_search( name, args, cnfine, result,
+                                         tol or profiling.CNVTOL )
+    if tol is None:
+        return getattr( spiceypy, name )( *( args + (cnfine, result) ) )
+    spiceypy.gfstol( tol )
+    try:
+        return getattr( spiceypy, name )( *( args + (cnfine, result) ) )
+    finally:
+        spiceypy.gfstol( profiling.CNVTOL )
+
+
+def _init_worker(metakr):
+    #
+    # Held open for the lifetime of the worker process.
+    #
+    KernelSession.open( metakr )
+
+
+class InProcess(object):
+    """
+    Executor stand-in that runs each job immediately in this process,
+    with metakr loaded for the duration of the with block.
+    """
+
+    def __init__(self, metakr):
+        self.metakr = metakr
+
+    def __enter__(self):
+        self.kernels = KernelSession.open( self.metakr )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.kernels.close()
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result( fn( *args ) )
+        except Exception as exc:
+            future.set_exception( exc )
+        return future
+
+
+def worker_pool(metakr, workers, inprocess=True):
+    """
+    Process pool whose workers each load metakr once at start-up, or
+    an InProcess executor if workers is None or 1 and inprocess is
+    set.
+
+    spawn rather than fork: each worker opens the kernel files itself
+    instead of sharing the parent's DAF file offsets.
+    """
+    if workers is None or workers <= 1:
+        if inprocess:
+            return InProcess( metakr )
+        workers = 1
+    context = multiprocessing.get_context( 'spawn' )
+    return ProcessPoolExecutor( max_workers=workers, mp_context=context,
+                                initializer=_init_worker,
+                                initargs=(os.path.abspath( metakr ),) )
+
+
+def shared_pool(metakr, workers):
+    """
+    The process pool of workers workers for metakr kept for all
+    searches, started on first use.
+    """
+    key = ( os.path.abspath( metakr ), workers )
+    pool = _POOLS.get( key )
+    if pool is None:
+        pool = worker_pool( metakr, workers, inprocess=False )
+        _POOLS[key] = pool
+    return pool
+
+
+def close_pools():
+    """
+    Shut down the kept pools; the next search starts new ones.
+    """
+    while _POOLS:
+        _, pool = _POOLS.popitem()
+        pool.shutdown()
+
+
+atexit.register( close_pools )
+
+
+def run_search(name, args, size, search, core=None, tol=None):
+    """
+    spiceypy.<name>( *args, cnfine, result ) with cnfine given as an
+    (N,2) array; returns the result as an (N,2) array, clipped to
+    core if given. Runs in-process or in a worker_pool worker.
+    """
+    cnfine = array2cell( search )
+    result = stypes.SPICEDOUBLE_CELL( size )
+    _call( name, args, cnfine, result, tol )
+    result = IntervalSet.from_cell( result )
+    if core is not None:
+        result = result & IntervalSet( core )
+    return result.array
+
+
+def search(name, args, cnfine, result, metakr, workers, step,
+           overlap=None, nslice=None, tol=None):
+    """
+    Run spiceypy.<name>( *args, cnfine, result ) over time slices of
+    cnfine in a pool of worker processes and stitch the results into
+    result.
+    """
+    if overlap is None:
+        overlap = 2.0 * step
+    if nslice is None:
+        nslice = workers
+    size = result.size
+
+    slices = split_window( cnfine, nslice, overlap )
+
+    pool = shared_pool( metakr, workers )
+    try:
+        futures = [pool.submit( run_search, name, args, size, srch, core,
+                                tol )
+                   for core, srch in slices]
+        pieces = [future.result() for future in futures]
+    except BrokenProcessPool:
+        #
+        # A worker died; start a new pool next time.
+        #
+        _POOLS.pop( ( os.path.abspath( metakr ), workers ), None )
+        raise
+
+    pieces.append( np.empty( (0, 2) ) )
+    return IntervalSet( np.concatenate( pieces ) ).to_cell( cell=result )
+
+
+def gfposc(target, inframe, abcorr, obsrvr, crdsys, coord, relate,
+           refval, adjust, step, nintvls, cnfine, result=None,
+           metakr=None, workers=None, overlap=None, cache=None,
+           tol=None):
+    if result is None:
+        result = stypes.SPICEDOUBLE_CELL( 2 * nintvls )
+    args = ( target, inframe, abcorr, obsrvr, crdsys, coord, relate,
+             refval, adjust, step, nintvls )
+    return _run( 'gfposc', args, cnfine, result, metakr, workers, step,
+                 overlap, cache, tol )
+
+
+def gfoclt(occtyp, front, fshape, fframe, back, bshape, bframe, abcorr,
+           obsrvr, step, cnfine, result=None,
+           metakr=None, workers=None, overlap=None, cache=None,
+           tol=None):
+    if result is None:
+        result = stypes.SPICEDOUBLE_CELL( MAXWIN * max( workers or 1, 1 ) )
+    args = ( occtyp, front, fshape, fframe, back, bshape, bframe, abcorr,
+             obsrvr, step )
+    return _run( 'gfoclt', args, cnfine, result, metakr, workers, step,
+                 overlap, cache, tol )
+
+
+def _run(name, args, cnfine, result, metakr, workers, step, overlap,
+         cache, tol=None):
+    def run():
+        if workers is None or workers <= 1:
+            return _call( name, args, cnfine, result, tol )
+        return search( name, args, cnfine, result, metakr, workers, step,
+                       overlap, tol=tol )
+
+    with profiling.stage( name ):
+        if cache is None:
+            return run()
+        #
+        # A coarser tolerance gives a different result, so it is part
+        # of the key.
+        #
+        key = args if tol is None else args + ( tol, )
+        return cache.search( name, key, cnfine, result, run )
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Memoized job graph of searches and window operations.
+
+viewpr and visibl both search the DSS-14 elevation window, visibl
+feeds it to its occultation searches and spice_window combines
+windows computed elsewhere. Here every search and window operation
+is a node keyed by a hash of what it does and of the keys of its
+inputs, so a sub-search that several jobs need is one node and runs
+once:
+
+    pipe = Pipeline( METAKR, workers=4 )
+    span = pipe.span( '2004 MAY 2 TDB', '2004 MAY 6 TDB' )
+    pipe.add( 'view',    pipe.view_period( span ) )
+    pipe.add( 'visible', pipe.visible( span ) )       # shares 'view'
+    pipe.add( 'both',    pipe.visible( span, station='DSS-43' ) &
+                         pipe.visible( span ) )
+    windows = pipe.run()                              # name -> IntervalSet
+
+run schedules the whole graph at once: searches go to one pool of
+worker processes (parallel_search.worker_pool) as soon as their
+confinement window is known, so independent searches overlap, and
+window operations run here when their inputs are done. With a
+result_cache.ResultCache, searches found there are not run at all.
+
+A batch of jobs can be given as a JSON file (see load_config):
+
+    python pipeline.py jobs.json
+"""
+
+import hashlib
+import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+from kernel_session import KernelSession
+from parallel_search import run_search, worker_pool
+from profiling import stage
+
+METAKR = './mexMetaK.tm.txt'
+
+MAXIVL = 1000
+
+#
+# Window operations: the IntervalSet method each calls, its number of
+# window inputs and its scalar arguments in order.
+#
+OPERATIONS = { 'union':      ( 'union',      2, () ),
+               'intersect':  ( 'intersect',  2, () ),
+               'difference': ( 'difference', 2, () ),
+               'complement': ( 'complement', 1, ( 'left', 'right' ) ),
+               'expand':     ( 'expand',     1, ( 'left', 'right' ) ),
+               'contract':   ( 'contract',   1, ( 'left', 'right' ) ),
+               'filter':     ( 'filter',     1, ( 'small', ) ),
+               'fill':       ( 'fill',       1, ( 'small', ) ) }
+
+
+class Node(object):
+    """
+    One search or window operation of a Pipeline. Nodes are made by
+    the Pipeline methods; & | - combine them like IntervalSets.
+    """
+
+    def __init__(self, pipeline, kind, params, inputs):
+        self.pipeline = pipeline
+        self.kind = kind
+        self.params = params
+        self.inputs = inputs
+        sha = hashlib.sha256()
+        sha.update( json.dumps( [kind, params,
+                                 [n.key for n in inputs]] ).encode() )
+        self.key = sha.hexdigest()
+
+    def __repr__(self):
+        return 'Node({:s} {:s})'.format( self.kind, self.key[:12] )
+
+    def __and__(self, other):
+        return self.pipeline.operation( 'intersect', self, other )
+
+    def __or__(self, other):
+        return self.pipeline.operation( 'union', self, other )
+
+    def __sub__(self, other):
+        return self.pipeline.operation( 'difference', self, other )
+
+
+class Pipeline(object):
+
+    def __init__(self, metakr=METAKR, workers=None, cache=None):
+        self.metakr = metakr
+        self.workers = workers
+        self.cache = cache
+        self.nodes = {}
+        self.jobs = {}
+        self.results = {}
+        self.counts = { 'searches': 0, 'cached': 0, 'operations': 0 }
+
+    def _node(self, kind, params, inputs=()):
+        node = Node( self, kind, params, list( inputs ) )
+        return self.nodes.setdefault( node.key, node )
+
+    #
+    # Nodes.
+    #
+    def span(self, start, stop):
+        """
+        The window [start, stop] of two time strings.
+        """
+        return self._node( 'span', [start, stop] )
+
+    def window(self, window):
+        """
+        A fixed window (cell, IntervalSet or (N,2) array of ETs).
+        """
+        array = IntervalSet.from_cell( window ).array
+        return self._node( 'window', array.tolist() )
+
+    def search(self, name, args, confine, maxivl=MAXIVL):
+        """
+        spiceypy.<name>( *args, cnfine, result ) for gfposc or gfoclt,
+        confined to the window of node confine.
+        """
+        return self._node( 'search', [name, list( args ), maxivl],
+                           [confine] )
+
+    def operation(self, op, *inputs, **params):
+        """
+        The IntervalSet method op on the windows of the input nodes;
+        params are its scalar arguments by name (left, right, small).
+        """
+        if op not in OPERATIONS:
+            raise ValueError( 'unknown window operation {:s}'.format( op ) )
+        _, count, names = OPERATIONS[op]
+        if len( inputs ) != count or set( params ) != set( names ):
+            raise ValueError( '{:s} takes {:d} windows and the arguments '
+                              '{:s}'.format( op, count, ', '.join( names ) ) )
+        return self._node( 'operation', [op, [params[n] for n in names]],
+                           inputs )
+
+    def view_period(self, confine, target='MEX', station='DSS-14',
+                    frame=None, abcorr='CN+S', elvlim=6.0, stepsz=300.0):
+        """
+        The viewpr search: target above elvlim degrees at station.
+        """
+        if frame is None:
+            frame = '{:s}_TOPO'.format( station )
+        return self.search( 'gfposc',
+                            ( target, frame, abcorr, station,
+                              'LATITUDINAL', 'LATITUDE', '>',
+                              spiceypy.rpd() * elvlim, 0.0, stepsz,
+                              MAXIVL ),
+                            confine )
+
+    def occultation(self, confine, target='MEX', observer='DSS-14',
+                    front='MARS', fshape='ELLIPSOID', fframe='IAU_MARS',
+                    abcorr='CN+S', stepsz=300.0, back=None, bshape='POINT',
+                    bframe=' ', occtyp='ANY'):
+        """
+        The gfoclt search of visibl (target behind front as seen from
+        observer) or, with back='SUN', of shade.
+        """
+        if back is None:
+            back = target
+        return self.search( 'gfoclt',
+                            ( occtyp, front, fshape, fframe, back, bshape,
+                              bframe, abcorr, observer, stepsz ),
+                            confine )
+
+    def visible(self, confine, target='MEX', station='DSS-14', frame=None,
+                abcorr='CN+S', elvlim=6.0, stepsz=300.0, front='MARS',
+                fshape='ELLIPSOID', fframe='IAU_MARS'):
+        """
+        The visibl window: view periods less occultations by front.
+        """
+        rise = self.view_period( confine, target, station, frame, abcorr,
+                                 elvlim, stepsz )
+        occult = self.occultation( rise, target, station, front, fshape,
+                                   fframe, abcorr, stepsz )
+        return rise - occult
+
+    def add(self, name, node):
+        self.jobs[name] = node
+        return node
+
+    #
+    # Scheduling.
+    #
+    def _needed(self):
+        """
+        Keys of the nodes the jobs depend on, inputs first.
+        """
+        order = []
+        seen = set()
+
+        def visit(node):
+            if node.key in seen:
+                return
+            seen.add( node.key )
+            for child in node.inputs:
+                visit( child )
+            order.append( node.key )
+        for node in self.jobs.values():
+            visit( node )
+        return order
+
+    def _evaluate(self, node, pool):
+        """
+        The window of node, or a Future of it for searches run in the
+        pool.
+        """
+        if node.kind == 'span':
+            start, stop = node.params
+            return IntervalSet( [[spiceypy.str2et( start ),
+                                  spiceypy.str2et( stop )]] )
+        if node.kind == 'window':
+            return IntervalSet( np.array( node.params ).reshape( -1, 2 ) )
+        inputs = [self.results[child.key] for child in node.inputs]
+        if node.kind == 'operation':
+            op, params = node.params
+            method = OPERATIONS[op][0]
+            self.counts['operations'] += 1
+            with stage( op ):
+                return getattr( inputs[0], method )( *( inputs[1:] +
+                                                        params ) )
+
+        name, args, maxivl = node.params
+        confine = inputs[0]
+        if len( confine ) == 0:
+            return IntervalSet()
+        if self.cache is not None:
+            key = self.cache.key( name, args, confine.array )
+            array = self.cache.get( key )
+            if array is not None:
+                self.counts['cached'] += 1
+                return IntervalSet( array )
+        self.counts['searches'] += 1
+        return pool.submit( run_search, name, tuple( args ), 2 * maxivl,
+                            confine.array )
+
+    def run(self):
+        """
+        Evaluate every node the jobs need, each once. Returns a dict
+        of job name to IntervalSet.
+        """
+        order = self._needed()
+        waiting = { key: set( c.key for c in self.nodes[key].inputs )
+                    for key in order if key not in self.results }
+        running = {}
+
+        with KernelSession.open( self.metakr ), \
+             worker_pool( self.metakr, self.workers ) as pool, \
+             stage( 'pipeline' ):
+            while waiting or running:
+                ready = [key for key, deps in waiting.items()
+                         if not deps - set( self.results )]
+                for key in ready:
+                    del waiting[key]
+                    value = self._evaluate( self.nodes[key], pool )
+                    if isinstance( value, IntervalSet ):
+                        self.results[key] = value
+                    else:
+                        running[value] = key
+                if ready:
+                    continue
+                if not running:
+                    raise RuntimeError( 'job graph has a cycle' )
+                done, _ = wait( list( running ), return_when=FIRST_COMPLETED )
+                for future in done:
+                    key = running.pop( future )
+                    window = IntervalSet( future.result() )
+                    node = self.nodes[key]
+                    if self.cache is not None:
+                        name, args, _ = node.params
+                        confine = self.results[node.inputs[0].key]
+                        self.cache.put( self.cache.key( name, args,
+                                                        confine.array ),
+                                        window.array )
+                    self.results[key] = window
+
+        return { name: self.results[node.key]
+                 for name, node in self.jobs.items() }
+
+
+def load_config(path, cache=None):
+    """
+    Pipeline from a JSON file such as
+
+        { "metakr":  "./mexMetaK.tm.txt",
+          "workers": 4,
+          "nodes": {
+            "span":   { "span": ["2004 MAY 2 TDB", "2004 MAY 6 TDB"] },
+            "view":   { "view_period": { "confine": "span" } },
+            "vis14":  { "visible": { "confine": "span" } },
+            "vis43":  { "visible": { "confine": "span",
+                                     "station": "DSS-43" } },
+            "both":   { "intersect": ["vis14", "vis43"] },
+            "eclipse": { "occultation": { "confine": "span",
+                                          "observer": "MEX",
+                                          "back": "SUN",
+                                          "bshape": "ELLIPSOID",
+                                          "bframe": "IAU_SUN" } } },
+          "jobs": ["view", "both", "eclipse"] }
+
+    Node entries are span, window, search ({"name", "args",
+    "confine"}), view_period, occultation, visible (keyword
+    arguments of the Pipeline methods, with confine naming a node),
+    or a window operation: {"intersect": [a, b]}, or {"expand": [a],
+    "left": 60.0, "right": 60.0} with scalar arguments by name.
+    """
+    with open( path ) as f:
+        config = json.load( f )
+    pipe = Pipeline( config.get( 'metakr', METAKR ),
+                     config.get( 'workers' ), cache )
+    specs = config['nodes']
+    built = {}
+    pending = set()
+
+    def build(name):
+        if name in built:
+            return built[name]
+        if name not in specs:
+            raise ValueError( 'no node named {:s}'.format( name ) )
+        if name in pending:
+            raise ValueError( 'node {:s} depends on itself'.format( name ) )
+        pending.add( name )
+        spec = dict( specs[name] )
+        if 'span' in spec:
+            node = pipe.span( *spec['span'] )
+        elif 'window' in spec:
+            node = pipe.window( np.array( spec['window'] ) )
+        elif 'search' in spec:
+            kwargs = dict( spec['search'] )
+            node = pipe.search( kwargs['name'], kwargs['args'],
+                                build( kwargs['confine'] ),
+                                kwargs.get( 'maxivl', MAXIVL ) )
+        else:
+            for kind in ( 'view_period', 'occultation', 'visible' ):
+                if kind in spec:
+                    kwargs = dict( spec[kind] )
+                    kwargs['confine'] = build( kwargs['confine'] )
+                    node = getattr( pipe, kind )( **kwargs )
+                    break
+            else:
+                ops = [op for op in OPERATIONS if op in spec]
+                if len( ops ) != 1:
+                    raise ValueError( 'cannot tell what node {:s} '
+                                      'is'.format( name ) )
+                op = ops[0]
+                inputs = [build( n ) for n in spec.pop( op )]
+                node = pipe.operation( op, *inputs, **spec )
+        pending.discard( name )
+        built[name] = node
+        return node
+
+    jobs = config.get( 'jobs', list( specs ) )
+    for name in jobs:
+        pipe.add( name, build( name ) )
+    return pipe
+
+
+if __name__ == '__main__':
+    # 設定ファイルのジョブをまとめて一つのグラフとして実行
+    pipe = load_config( sys.argv[1] )
+    for name, window in pipe.run().items():
+        print( '{:s}: {:d} intervals, {:.3f} s'.format(
+            name, len( window ), window.measure() ) )
+    print( pipe.counts )
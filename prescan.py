@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized elevation pre-scan for gfposc.
+
+The topocentric elevation of the target is sampled on a coarse grid
+with one spkpos call. Between two samples h seconds apart the
+elevation cannot move faster than a bound `rate`, so on that segment
+
+    max elevation <= ( e0 + e1 + rate * h ) / 2
+    min elevation >= ( e0 + e1 - rate * h ) / 2
+
+Segments whose bounds straddle the limit are returned as the
+confinement window for gfposc; segments that are certainly on the
+requested side of the limit go straight into the result, and the
+rest are dropped.
+
+The default bound is twice the fastest elevation change seen between
+samples, and never less than the Earth's rotation rate, which
+dominates for a deep space target seen from a ground station.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+
+#
+# Earth's rotation rate, radians per second.
+#
+EARTH_RATE = 7.292115e-5
+
+
+def sample_grid(cnfine, step):
+    """
+    Sample times covering each interval of cnfine at most step
+    seconds apart, endpoints included, and the index of the interval
+    each sample belongs to.
+    """
+    win = IntervalSet.from_cell( cnfine )
+    nseg = np.maximum( np.ceil( win.durations / step ), 1 ).astype( int )
+    group = np.repeat( np.arange( len( win ) ), nseg + 1 )
+    first = np.concatenate( ([0], np.cumsum( nseg + 1 )[:-1]) )
+    k = np.arange( len( group ) ) - np.repeat( first, nseg + 1 )
+    frac = k / np.repeat( nseg, nseg + 1 )
+    ets = win.begins[group] + frac * win.durations[group]
+    return ets, group
+
+
+def elevation(target, obsfrm, abcorr, obsrvr, ets):
+    """
+    Latitude of the target in the observer's topocentric frame
+    (i.e. its elevation) at each of ets, radians.
+    """
+    pos, _ = spiceypy.spkpos( target, ets, obsfrm, abcorr, obsrvr )
+    pos = np.asarray( pos ).reshape( -1, 3 )
+    return np.arctan2( pos[:, 2], np.hypot( pos[:, 0], pos[:, 1] ) )
+
+
+def elevation_prescan(target, obsfrm, abcorr, obsrvr, relate, refval,
+                      cnfine, step=1800.0, rate=None):
+    """
+    Split cnfine for the search "elevation <relate> refval" (relate
+    '>' or '<'). Returns (certain, uncertain) IntervalSets: certain
+    holds for sure, uncertain still needs gfposc.
+    """
+    ets, group = sample_grid( cnfine, step )
+    elv = elevation( target, obsfrm, abcorr, obsrvr, ets )
+
+    same = group[1:] == group[:-1]
+    h = np.diff( ets )[same]
+    e0 = elv[:-1][same]
+    e1 = elv[1:][same]
+    t0 = ets[:-1][same]
+    t1 = ets[1:][same]
+
+    if rate is None:
+        rate = max( 2.0 * np.max( np.abs( e1 - e0 ) / h, initial=0.0 ),
+                    EARTH_RATE )
+    hi = 0.5 * ( e0 + e1 + rate * h )
+    lo = 0.5 * ( e0 + e1 - rate * h )
+
+    if relate == '>':
+        sure  = lo > refval
+        maybe = ~sure & ( hi > refval )
+    elif relate == '<':
+        sure  = hi < refval
+        maybe = ~sure & ( lo < refval )
+    else:
+        raise ValueError( 'relate must be > or <' )
+
+    certain   = IntervalSet( np.column_stack( (t0[sure],  t1[sure]) ) )
+    uncertain = IntervalSet( np.column_stack( (t0[maybe], t1[maybe]) ) )
+    return certain, uncertain
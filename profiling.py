@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in per-stage timers and geometry finder evaluation counts.
+
+    with Profile( 'visibl' ) as prof:
+        visibl( verbose=False )
+    print( prof )
+    prof.write( 'visibl_profile.json' )
+
+Code marks its stages with
+
+    with stage( 'wndifd' ):
+        evswin = spiceypy.wndifd( riswin, eocwin )
+
+which costs a function call and a list test when no Profile is
+active. While one is, every stage records its number of calls, wall
+time (perf_counter) and CPU time of this process (process_time, so
+not the CPU of worker processes). Nested stages are named by their
+path, e.g. 'dsk/gfoclt'.
+
+With counters=True, searches run in this process by parallel_search
+go through gfevnt/gfocce with step and refinement callbacks that
+count before calling the default gfstep/gfrefn:
+
+    steps        samples of the coarse search
+    refinements  root-finding iterations
+
+each of which is one evaluation of the geometric quantity (state
+lookups with light time iterations). The Python callbacks slow the
+search down, so leave counters off when timing.
+
+sample=p profiles a random fraction p of runs and the rest run with
+no Profile active. With output=path each profiled run appends its
+report to a JSON Lines file, so
+
+    with Profile( 'visibl', sample=0.01, output='profile.jsonl' ):
+        visibl( verbose=False )
+
+can be left on in production.
+"""
+
+import json
+import random
+import time
+
+import numpy as np
+import spiceypy
+from spiceypy.utils import callbacks
+
+#
+# Active profiles, innermost last.
+#
+_active = []
+
+#
+# gfposc parameter names as passed on to gfevnt.
+#
+_POSC_PARAMS = [ 'TARGET', 'OBSERVER', 'ABCORR', 'COORDINATE SYSTEM',
+                 'COORDINATE', 'REFERENCE FRAME', 'VECTOR DEFINITION',
+                 'METHOD', 'DREF', 'DVEC' ]
+
+CNVTOL = 1.0e-6
+
+
+class _Null(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL = _Null()
+
+
+class _Stage(object):
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        prof = self.profile
+        prof._path.append( self.name )
+        self.path = '/'.join( prof._path )
+        prof._entry( self.path )
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        prof = self.profile
+        entry = prof._entry( self.path )
+        entry['calls'] += 1
+        entry['wall'] += time.perf_counter() - self.wall
+        entry['cpu'] += time.process_time() - self.cpu
+        prof._path.pop()
+        return False
+
+
+class Profile(object):
+
+    def __init__(self, name, counters=False, sample=1.0, output=None):
+        self.name = name
+        self.counters = counters
+        self.sample = sample
+        self.output = output
+        self.sampled = False
+        self.stages = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._path = []
+
+    def __enter__(self):
+        self.sampled = self.sample >= 1.0 or random.random() < self.sample
+        if self.sampled:
+            self.started = time.strftime( '%Y-%m-%dT%H:%M:%S' )
+            self._wall = time.perf_counter()
+            self._cpu = time.process_time()
+            _active.append( self )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self.sampled:
+            return False
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        _active.remove( self )
+        if self.output is not None:
+            with open( self.output, 'a' ) as f:
+                f.write( json.dumps( self.report() ) + '\n' )
+        return False
+
+    def _entry(self, path):
+        if path not in self.stages:
+            self.stages[path] = { 'calls': 0, 'wall': 0.0, 'cpu': 0.0 }
+        return self.stages[path]
+
+    def stage(self, name):
+        return _Stage( self, name )
+
+    def count(self, counter, n=1):
+        """
+        Add n to a counter of the innermost open stage.
+        """
+        entry = self._entry( '/'.join( self._path ) )
+        entry[counter] = entry.get( counter, 0 ) + n
+
+    def report(self):
+        stages = []
+        for path, entry in self.stages.items():
+            row = { 'stage': path }
+            row.update( entry )
+            stages.append( row )
+        return { 'name': self.name, 'started': getattr( self, 'started',
+                                                        None ),
+                 'wall': self.wall, 'cpu': self.cpu, 'stages': stages }
+
+    def write(self, path):
+        with open( path, 'w' ) as f:
+            json.dump( self.report(), f, indent=1 )
+
+    def __str__(self):
+        lines = [ '{:s}: {:.6f} s wall, {:.6f} s CPU'.format(
+                      self.name, self.wall, self.cpu ),
+                  '   {:32s} {:>6s} {:>11s} {:>11s} {:>8s} {:>8s}'.format(
+                      'stage', 'calls', 'wall (s)', 'CPU (s)',
+                      'steps', 'refine' ) ]
+        for path, entry in self.stages.items():
+            lines.append( '   {:32s} {:6d} {:11.6f} {:11.6f} {:>8s} {:>8s}'
+                          .format( path, entry['calls'], entry['wall'],
+                                   entry['cpu'],
+                                   str( entry.get( 'steps', '' ) ),
+                                   str( entry.get( 'refinements', '' ) ) ) )
+        return '\n'.join( lines )
+
+
+def active():
+    """
+    The innermost active Profile, or None.
+    """
+    return _active[-1] if _active else None
+
+
+def stage(name):
+    """
+    Context manager timing a stage of the active Profile, if any.
+    """
+    if not _active:
+        return _NULL
+    return _active[-1].stage( name )
+
+
+def counting():
+    return bool( _active ) and _active[-1].counters
+
+
+def counted_search(name, args, cnfine, result, tol=CNVTOL):
+    """
+    spiceypy.<name>( *args, cnfine, result ) for gfposc or gfoclt,
+    run through gfevnt/gfocce with counting step and refinement
+    callbacks. Counts go to the innermost open stage of the active
+    Profile.
+    """
+    prof = active()
+    counts = { 'steps': 0, 'refinements': 0 }
+
+    @callbacks.SpiceUDSTEP
+    def udstep(et):
+        counts['steps'] += 1
+        return spiceypy.gfstep( et )
+
+    @callbacks.SpiceUDREFN
+    def udrefn(t1, t2, s1, s2):
+        counts['refinements'] += 1
+        return spiceypy.gfrefn( t1, t2, s1, s2 )
+
+    udrepi = callbacks.UDREPI( lambda window, begmss, endmss: None )
+    udrepu = callbacks.UDREPU( lambda ivbeg, ivend, et: None )
+    udrepf = callbacks.UDREPF( lambda: None )
+    udbail = callbacks.UDBAIL( lambda: 0 )
+
+    if name == 'gfposc':
+        ( target, inframe, abcorr, obsrvr, crdsys, coord, relate,
+          refval, adjust, step, nintvls ) = args
+        spiceypy.gfsstp( step )
+        qcpars = [ target, obsrvr, abcorr, crdsys, coord, inframe,
+                   'POSITION', ' ', ' ', ' ' ]
+        spiceypy.gfevnt( udstep, udrefn, 'COORDINATE', len( qcpars ), 80,
+                         _POSC_PARAMS, qcpars, np.zeros( 10 ),
+                         np.zeros( 10, int ), np.zeros( 10, int ),
+                         relate, refval, tol,    adjust, 0,
+                         udrepi, udrepu, udrepf, nintvls, 0, udbail,
+                         cnfine, result )
+    elif name == 'gfoclt':
+        ( occtyp, front, fshape, fframe, back, bshape, bframe, abcorr,
+          obsrvr, step ) = args
+        spiceypy.gfsstp( step )
+        spiceypy.gfocce( occtyp, front, fshape, fframe, back, bshape,
+                         bframe, abcorr, obsrvr, tol,    udstep, udrefn,
+                         0, udrepi, udrepu, udrepf, 0, udbail,
+                         cnfine, result )
+    else:
+        raise ValueError( 'cannot count evaluations of {:s}'.format( name ) )
+
+    if prof is not None:
+        prof.count( 'searches' )
+        prof.count( 'steps', counts['steps'] )
+        prof.count( 'refinements', counts['refinements'] )
+    return result
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Warm local query service for view period, visibility, occultation and
+shade windows.
+
+    python query_service.py --port 8765 --workers 4
+    python query_service.py --unix /tmp/mex.sock
+
+keeps the meta-kernel loaded in this process (time conversion) and in
+a pool of worker processes (searches), and answers HTTP requests
+
+    GET /visible?start=2004 MAY 2 TDB&stop=2004 MAY 6 TDB&srfpt=DSS-43
+    POST /shade   {"start": "2004 MAY 2 TDB", "stop": ..., "occtyp": "FULL"}
+
+with JSON: the intervals as ET pairs and UTC strings. The kinds are
+view, visible, occultation and shade; their parameters are those of
+viewpr/visibl/shade (target, srfpt, obsfrm, abcorr, elvlim, stepsz,
+front, fshape, fframe; obssat, occtyp), with start and stop as time
+strings or ETs. GET /stats reports the counters.
+
+Requests are coalesced per kind and parameter set. The part of a
+request already searched is answered from memory; the rest joins the
+batch collected over the next `delay` seconds, or waits for a search
+already running over it, so concurrent identical or overlapping
+requests cost one search over the union of their spans.
+
+What is kept in memory is bounded by max_intervals, the number of
+intervals held over all parameter sets (about 32 bytes each): past
+it, the least recently asked parameter sets with no search pending
+are dropped and searched again when next asked. Everything runs on
+the local machine with the standard library:
+
+    query( 'visible', start='2004 MAY 2 TDB', stop='2004 MAY 3 TDB',
+           port=8765 )
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+import spiceypy
+from spiceypy.utils.exceptions import SpiceyError
+
+from et_convert import LeapSecondTable, et2datetime64
+from incremental import (occultation_search, shade_search,
+                         view_period_search, visible_search)
+from interval_set import IntervalSet
+from kernel_session import KernelSession
+from parallel_search import worker_pool
+
+METAKR = './mexMetaK.tm.txt'
+
+#
+# Parameters of each kind of query and their defaults, as in
+# viewpr/visibl/shade.
+#
+STATION = { 'target': 'MEX', 'srfpt': 'DSS-14', 'obsfrm': 'DSS-14_TOPO',
+            'abcorr': 'CN+S', 'elvlim': 6.0, 'stepsz': 300.0 }
+BODY = { 'front': 'MARS', 'fshape': 'ELLIPSOID', 'fframe': 'IAU_MARS' }
+
+KINDS = {
+    'view':        ( view_period_search, dict( STATION ) ),
+    'visible':     ( visible_search, dict( STATION, **BODY ) ),
+    'occultation': ( occultation_search,
+                     dict( { 'target': 'MEX', 'srfpt': 'DSS-14',
+                             'abcorr': 'CN+S', 'stepsz': 300.0 },
+                           **BODY ) ),
+    'shade':       ( shade_search,
+                     dict( { 'obssat': 'MEX', 'occtyp': 'ANY',
+                             'abcorr': 'CN+S', 'stepsz': 300.0 },
+                           **BODY ) ) }
+
+
+def _compute(kind, params, cnfine):
+    """
+    Worker process: the kind of search over an (N,2) confinement
+    window.
+    """
+    build, _ = KINDS[kind]
+    return build( **params )( IntervalSet( cnfine ) ).array
+
+
+class QueryError(Exception):
+    pass
+
+
+class _Entry(object):
+    """
+    What is known for one kind and parameter set: the window found
+    over the covered part of time, and the searches pending or
+    running as (window, future).
+    """
+
+    def __init__(self):
+        self.covered = IntervalSet()
+        self.found = IntervalSet()
+        self.tasks = []
+        self.batch = None
+
+    def size(self):
+        return len( self.covered ) + len( self.found )
+
+
+class QueryService(object):
+
+    def __init__(self, metakr=METAKR, workers=None, delay=0.02,
+                 max_intervals=1 << 20):
+        self.metakr = metakr
+        self.delay = delay
+        self.max_intervals = max_intervals
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.kernels = KernelSession.open( metakr )
+        self.table = LeapSecondTable()
+        self.pool = worker_pool( metakr, workers, inprocess=False )
+        self.entries = OrderedDict()
+        self.counts = { 'requests': 0, 'searches': 0, 'cached': 0,
+                        'coalesced': 0, 'evicted': 0 }
+
+    def close(self):
+        self.pool.shutdown()
+        self.kernels.close()
+
+    def parse(self, kind, query):
+        """
+        Search parameters and the requested span of a query dict.
+        """
+        if kind not in KINDS:
+            raise QueryError( 'unknown query {:s}'.format( kind ) )
+        query = dict( query )
+        try:
+            span = [ query.pop( 'start' ), query.pop( 'stop' ) ]
+        except KeyError:
+            raise QueryError( 'start and stop are required' )
+        try:
+            span = [ float( t ) if isinstance( t, ( int, float ) ) else
+                     spiceypy.str2et( t ) for t in span ]
+        except SpiceyError as exc:
+            raise QueryError( str( exc ) )
+        if span[1] < span[0]:
+            raise QueryError( 'stop is before start' )
+
+        _, defaults = KINDS[kind]
+        unknown = set( query ) - set( defaults )
+        if unknown:
+            raise QueryError( 'unknown parameters {:s}'.format(
+                ', '.join( sorted( unknown ) ) ) )
+        params = dict( defaults )
+        for name, value in query.items():
+            params[name] = type( defaults[name] )( value )
+        if kind in ( 'view', 'visible' ) and 'obsfrm' not in query:
+            params['obsfrm'] = '{:s}_TOPO'.format( params['srfpt'] )
+        return params, IntervalSet( [span] )
+
+    async def answer(self, kind, query):
+        """
+        The window of a query within its span.
+        """
+        params, span = self.parse( kind, query )
+        key = json.dumps( [kind, sorted( params.items() )] )
+        entry = self.entries.setdefault( key, _Entry() )
+        self.entries.move_to_end( key )
+        self.counts['requests'] += 1
+
+        #
+        # Wait for searches already pending or running over the span;
+        # add what nobody covers to the open batch.
+        #
+        waits = []
+        need = span - entry.covered
+        for window, future in entry.tasks:
+            if len( window & span ):
+                waits.append( future )
+                need = need - window
+        need = need.filter( 0.0 )
+        if len( need ):
+            if entry.batch is None:
+                entry.batch = ( need, asyncio.get_running_loop()
+                                              .create_future() )
+                entry.tasks.append( entry.batch )
+                asyncio.get_running_loop().call_later(
+                    self.delay, self._flush, kind, params, key )
+            else:
+                window, future = entry.batch
+                entry.tasks.remove( entry.batch )
+                entry.batch = ( window | need, future )
+                entry.tasks.append( entry.batch )
+                self.counts['coalesced'] += 1
+            if entry.batch[1] not in waits:
+                waits.append( entry.batch[1] )
+        elif waits:
+            self.counts['coalesced'] += 1
+        else:
+            self.counts['cached'] += 1
+
+        if waits:
+            await asyncio.gather( *waits )
+        return entry.found & span
+
+    def _flush(self, kind, params, key):
+        entry = self.entries[key]
+        window, future = entry.batch
+        entry.batch = None
+        self.counts['searches'] += 1
+        asyncio.ensure_future( self._search( kind, params, entry,
+                                             window, future ) )
+
+    async def _search(self, kind, params, entry, window, future):
+        try:
+            array = await asyncio.wrap_future( self.pool.submit(
+                _compute, kind, params, window.array ) )
+        except Exception as exc:
+            future.set_exception( exc )
+        else:
+            #
+            # Pieces searched separately meet at a shared endpoint,
+            # so the union joins an interval that runs across.
+            #
+            entry.found = entry.found | IntervalSet( array )
+            entry.covered = entry.covered | window
+            future.set_result( None )
+        finally:
+            entry.tasks.remove( ( window, future ) )
+            self.evict()
+
+    def evict(self):
+        """
+        Drop the least recently asked entries with no search pending
+        or running until at most max_intervals intervals are kept.
+        """
+        total = sum( entry.size() for entry in self.entries.values() )
+        for key in list( self.entries ):
+            if total <= self.max_intervals:
+                break
+            entry = self.entries[key]
+            if entry.tasks:
+                continue
+            total -= entry.size()
+            del self.entries[key]
+            self.counts['evicted'] += 1
+
+    def response(self, kind, window):
+        array = window.array
+        utc = np.datetime_as_string( et2datetime64( array.reshape( -1 ),
+                                                    'ms', self.table ),
+                                     unit='ms' ).reshape( -1, 2 )
+        return { 'kind': kind, 'intervals': array.tolist(),
+                 'utc': utc.tolist(), 'measure': window.measure() }
+
+    #
+    # HTTP.
+    #
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            method, target, _ = request.decode( 'latin-1' ).split( ' ', 2 )
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in ( b'\r\n', b'\n', b'' ):
+                    break
+                name, _, value = line.decode( 'latin-1' ).partition( ':' )
+                if name.strip().lower() == 'content-length':
+                    length = int( value )
+            body = await reader.readexactly( length ) if length else b''
+
+            url = urlsplit( target )
+            kind = url.path.strip( '/' )
+            if kind == 'stats':
+                status, reply = 200, dict( self.counts )
+            else:
+                query = dict( parse_qsl( url.query ) )
+                if method == 'POST' and body:
+                    query.update( json.loads( body.decode() ) )
+                try:
+                    window = await self.answer( kind, query )
+                    status, reply = 200, self.response( kind, window )
+                except QueryError as exc:
+                    status, reply = 400, { 'error': str( exc ) }
+                except Exception as exc:
+                    status, reply = 500, { 'error': str( exc ) }
+        except ( ValueError, asyncio.IncompleteReadError ) as exc:
+            status, reply = 400, { 'error': str( exc ) }
+
+        data = json.dumps( reply ).encode()
+        writer.write( 'HTTP/1.1 {:d} {:s}\r\n'
+                      'Content-Type: application/json\r\n'
+                      'Content-Length: {:d}\r\n'
+                      'Connection: close\r\n\r\n'.format(
+                          status, 'OK' if status == 200 else 'Error',
+                          len( data ) ).encode() + data )
+        await writer.drain()
+        writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            server = await asyncio.start_unix_server( self.handle, path )
+        else:
+            server = await asyncio.start_server( self.handle, host, port )
+        async with server:
+            await server.serve_forever()
+
+
+class _UnixConnection(http.client.HTTPConnection):
+
+    def __init__(self, path):
+        http.client.HTTPConnection.__init__( self, 'localhost' )
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self.sock.connect( self.path )
+
+
+def query(kind, host='127.0.0.1', port=8765, path=None, **params):
+    """
+    Ask a running service; returns the decoded JSON reply.
+    """
+    if path is not None:
+        conn = _UnixConnection( path )
+    else:
+        conn = http.client.HTTPConnection( host, port )
+    try:
+        conn.request( 'GET', '/{:s}?{:s}'.format( kind,
+                                                  urlencode( params ) ) )
+        reply = conn.getresponse()
+        data = json.loads( reply.read().decode() )
+    finally:
+        conn.close()
+    if reply.status != 200:
+        raise QueryError( data.get( 'error', 'HTTP {:d}'.format(
+            reply.status ) ) )
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[1] )
+    parser.add_argument( '--metakr', default=METAKR )
+    parser.add_argument( '--workers', type=int, default=None )
+    parser.add_argument( '--host', default='127.0.0.1' )
+    parser.add_argument( '--port', type=int, default=8765 )
+    parser.add_argument( '--unix', default=None,
+                         help='listen on this Unix socket instead' )
+    parser.add_argument( '--delay', type=float, default=0.02,
+                         help='seconds to collect a batch' )
+    parser.add_argument( '--max-intervals', type=int, default=1 << 20,
+                         help='intervals kept in memory' )
+    opts = parser.parse_args( argv )
+
+    service = QueryService( opts.metakr, opts.workers, opts.delay,
+                            opts.max_intervals )
+    try:
+        asyncio.run( service.serve( opts.host, opts.port, opts.unix ) )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
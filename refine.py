@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Refine a cheap window near its edges with an expensive search.
+
+When an expensive search (DSK shape, full aberration correction) can
+only move the edges of a cheap one (ellipsoid shape, geometric
+states) by less than margin seconds, the expensive result is
+
+    ( coarse - N ) | fine( N )
+
+where N is the union of [edge - margin, edge + margin] over all edges
+of the coarse window and fine( N ) is the expensive search confined
+to N. Away from the edges the coarse answer is kept as is.
+
+Each neighbourhood is searched with a step of at most half the
+shortest coarse interval or gap next to its edges, so that two edges
+sharing it are not stepped over; neighbourhoods around isolated edges
+take a single step across.
+
+If at the boundary of a neighbourhood the two windows disagree, an
+edge moved further than the margin, so the refinement is repeated
+with twice the margin, and after a few tries the expensive search
+runs over the whole window. Intervals the cheap search misses
+altogether (shorter than the step) are missed, as by a full search.
+
+tiered_search applies this to aberration corrections: the window is
+found with a cheap correction (NONE or LT) and refined with the full
+one (CN+S). Without light time an event is seen up to one light time
+late or early; LT and CN+S differ by a small fraction of it. The
+margin is that fraction of the largest light time over the span
+(aberration_margin), and the cheap search converges only to a quarter
+of the margin. What is saved are the CN+S evaluations of the steps
+between edges; each edge still takes about two dozen CN+S
+evaluations to converge. That pays for the elevation search of
+viewpr and visibl (tiered=), whose steps dominate, but not for the
+occultation searches, whose cost is mostly in the edges.
+"""
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+from profiling import stage
+
+#
+# Bound on how far an event can move between each cheap correction
+# and CN+S, as a fraction of the one-way light time.
+#
+LIGHT_TIME_FRACTION = { 'NONE': 1.25, 'LT': 0.01, 'LT+S': 0.01,
+                        'CN': 0.01 }
+
+MIN_MARGIN = 2.0
+
+
+def edge_neighbourhoods(window, margin):
+    """
+    Union of [edge - margin, edge + margin] over all interval
+    endpoints of window.
+    """
+    edges = IntervalSet.from_cell( window ).array.reshape( -1 )
+    return IntervalSet( np.column_stack( (edges - margin, edges + margin) ) )
+
+
+def neighbourhood_steps(coarse, nbhd, step):
+    """
+    Step for each interval of nbhd: not above step, nor above half
+    the shortest interval or gap of coarse next to an edge inside it.
+    """
+    edges = IntervalSet.from_cell( coarse ).array.reshape( -1 )
+    spans = np.diff( edges )
+    spans = np.where( spans > 0, spans, np.inf )
+    bounds = IntervalSet.from_cell( nbhd ).array
+    first = np.searchsorted( edges, bounds[:, 0], side='left' )
+    last = np.searchsorted( edges, bounds[:, 1], side='right' )
+    steps = np.full( len( bounds ), float( step ) )
+    for k in range( len( bounds ) ):
+        #
+        # The spans before the first and after the last edge inside
+        # the neighbourhood, and all those in between.
+        #
+        near = spans[max( first[k] - 1, 0 ):last[k]]
+        if len( near ):
+            steps[k] = min( step, 0.5 * np.min( near ) )
+    return np.maximum( steps, 1.0 )
+
+
+def _refine(coarse, margin, search, step, confine):
+    """
+    One refinement of coarse within margin of its edges: the
+    refined window, the neighbourhoods and the window found in them.
+    Neighbourhoods are searched together in groups whose steps are
+    step / 2**k.
+    """
+    nbhd = edge_neighbourhoods( coarse, margin )
+    if confine is not None:
+        nbhd = nbhd & confine
+    if len( nbhd ) == 0:
+        return coarse, nbhd, IntervalSet()
+    step = min( step, 2.0 * margin )
+    level = np.ceil( np.log2( step / neighbourhood_steps( coarse, nbhd,
+                                                          step ) ) )
+    fine = IntervalSet()
+    for k in np.unique( level ):
+        group = IntervalSet._wrap( nbhd.array[level == k] )
+        fine = fine | IntervalSet.from_cell(
+            search( group, step / 2.0 ** k ) )
+    fine = fine & nbhd
+    return ( coarse - nbhd ) | fine, nbhd, fine
+
+
+def _agree(coarse, fine, nbhd, confine):
+    """
+    Whether coarse and fine agree at every neighbourhood boundary
+    that is not a boundary of confine, i.e. no edge moved further
+    than the margin.
+    """
+    points = nbhd.array.reshape( -1 )
+    if confine is not None:
+        points = points[~np.isin( points, confine.array )]
+    return np.array_equal( coarse.contains( points ),
+                           fine.contains( points ) )
+
+
+def refine_edges(coarse, margin, search, step, confine=None, tries=3):
+    """
+    Refine coarse with search( cnfine, step ), which must return a
+    SPICE window or IntervalSet, run only within margin seconds of
+    the coarse edges (and within confine, if given). While an edge
+    moved further than the margin, the margin is doubled; after
+    tries the search runs over confine (or the span of coarse).
+    """
+    coarse = IntervalSet.from_cell( coarse )
+    if confine is not None:
+        confine = IntervalSet.from_cell( confine )
+    for _ in range( tries ):
+        window, nbhd, fine = _refine( coarse, margin, search, step,
+                                      confine )
+        if _agree( coarse, fine, nbhd, confine ):
+            return window
+        margin *= 2.0
+    if confine is None:
+        confine = IntervalSet( [[coarse.array[0, 0] - margin,
+                                 coarse.array[-1, 1] + margin]] )
+    with stage( 'full' ):
+        return IntervalSet.from_cell( search( confine, step ) )
+
+
+def light_time(observer, bodies, window, step=3600.0):
+    """
+    Largest one-way light time (s) from observer to any of bodies
+    over window, sampled every step seconds. Kernels must be loaded.
+    """
+    ets = [ np.append( np.arange( b, e, step ), e )
+            for b, e in IntervalSet.from_cell( window ) ]
+    if not ets:
+        return 0.0
+    ets = np.concatenate( ets )
+    return max( float( np.max( spiceypy.spkpos( body, ets, 'J2000', 'LT',
+                                                observer )[1] ) )
+                for body in bodies )
+
+
+def aberration_margin(coarse, observer, bodies, window):
+    """
+    Margin for refining a window found with the coarse correction
+    with CN+S.
+    """
+    coarse = coarse.strip().upper()
+    if coarse not in LIGHT_TIME_FRACTION:
+        raise ValueError( 'no margin for the {:s} correction'.format(
+            coarse ) )
+    lt = light_time( observer, bodies, window )
+    return max( LIGHT_TIME_FRACTION[coarse] * lt, MIN_MARGIN )
+
+
+def tiered_search(search, abcorr, coarse, cnfine, step, margin, tries=3):
+    """
+    The window search( abcorr, cnfine, step, None ) finds, computed
+    as search( coarse, cnfine, step, tol ) refined with abcorr within
+    margin of its edges. search must accept an IntervalSet
+    confinement window and a GF convergence tolerance (None for the
+    default) and return a SPICE window or IntervalSet.
+
+    The coarse edges only have to fall well inside the margin, so
+    the coarse search converges to a quarter of it.
+    """
+    confine = IntervalSet.from_cell( cnfine )
+    with stage( 'coarse' ):
+        cheap = IntervalSet.from_cell( search( coarse, confine, step,
+                                               0.25 * margin ) )
+
+    def expensive(nbhd, step):
+        with stage( 'edges' ):
+            return search( abcorr, nbhd, step, None )
+
+    return refine_edges( cheap, margin, expensive, step, confine, tries )
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of geometry finder results.
+
+Each result window is stored as an .npy file named after a hash of
+
+    - every loaded kernel, in load order: file name plus size and
+      modification time (or a SHA-1 of the contents with
+      checksum=True)
+    - the search routine and all of its inputs, including the
+      confinement window
+
+so a changed, added or removed kernel gives a different key and old
+entries are never returned. The directory is kept under max_bytes by
+evicting the least recently used files; a hit refreshes the file's
+modification time.
+
+    cache = ResultCache( './gf_cache' )
+    viewpr( cache=cache )
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import spiceypy
+
+from interval_set import IntervalSet
+
+#
+# Kernel checksums by (path, size, mtime), so that each kernel file is
+# read once per process.
+#
+_CHECKSUMS = {}
+
+
+def kernel_fingerprint(checksum=False):
+    """
+    Identity of the loaded kernel set as a list of
+    (file, size, mtime or checksum) in load order.
+    """
+    prints = []
+    for i in range( spiceypy.ktotal( 'ALL' ) ):
+        file, _, _, _ = spiceypy.kdata( i, 'ALL' )
+        st = os.stat( file )
+        if checksum:
+            key = ( os.path.abspath( file ), st.st_size, st.st_mtime_ns )
+            if key not in _CHECKSUMS:
+                sha = hashlib.sha1()
+                with open( file, 'rb' ) as f:
+                    for block in iter( lambda: f.read( 1 << 20 ), b'' ):
+                        sha.update( block )
+                _CHECKSUMS[key] = sha.hexdigest()
+            prints.append( ( os.path.abspath( file ), _CHECKSUMS[key] ) )
+        else:
+            prints.append( ( os.path.abspath( file ), st.st_size,
+                             st.st_mtime_ns ) )
+    return prints
+
+
+class ResultCache(object):
+
+    def __init__(self, directory='./gf_cache', max_bytes=256 << 20,
+                 checksum=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.checksum = checksum
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir( directory ):
+            os.makedirs( directory )
+
+    def key(self, name, args, cnfine):
+        """
+        Hash of the loaded kernels, the routine name, its scalar
+        arguments and the confinement window.
+        """
+        sha = hashlib.sha256()
+        sha.update( json.dumps( [kernel_fingerprint( self.checksum ),
+                                 name, list( args )] ).encode() )
+        sha.update( np.ascontiguousarray(
+                        IntervalSet.from_cell( cnfine ).array ).tobytes() )
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join( self.directory, key + '.npy' )
+
+    def get(self, key):
+        path = self._path( key )
+        try:
+            array = np.load( path )
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime( path, None )
+        self.hits += 1
+        return array
+
+    def put(self, key, array):
+        #
+        # Write to a temporary file and rename so that readers in
+        # other processes never see a partial file.
+        #
+        fd, tmp = tempfile.mkstemp( dir=self.directory, suffix='.tmp' )
+        with os.fdopen( fd, 'wb' ) as f:
+            np.save( f, np.asarray( array, dtype=np.float64 ) )
+        os.replace( tmp, self._path( key ) )
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir( self.directory ):
+            if not name.endswith( '.npy' ):
+                continue
+            path = os.path.join( self.directory, name )
+            try:
+                st = os.stat( path )
+            except OSError:
+                continue
+            entries.append( ( st.st_mtime, st.st_size, path ) )
+        total = sum( size for _, size, _ in entries )
+        for _, size, path in sorted( entries ):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove( path )
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir( self.directory ):
+            if name.endswith( '.npy' ):
+                os.remove( os.path.join( self.directory, name ) )
+
+    def search(self, name, args, cnfine, result, run):
+        """
+        Fill result from the cache, or call run() to fill it and
+        store what it found.
+        """
+        key = self.key( name, args, cnfine )
+        array = self.get( key )
+        if array is not None:
+            return IntervalSet.from_cell( array ).to_cell( cell=result )
+        run()
+        self.put( key, IntervalSet.from_cell( result ).array )
+        return result
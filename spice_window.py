@@ -1,118 +1,86 @@
 # -*- coding: utf-8 -*-
 
-import datetime as dt
-import numpy as np
 import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 
 import spiceypy
 import spiceypy.utils.support_types as stypes
 
+from et_convert import window2datetime
+from interval_set import IntervalSet
+from kernel_session import KernelSession
+from timeline_plot import Timeline
+
 METAKR = './mexMetaK.tm.txt'
 START  = '2004 MAY 1 TDB'
 STOP   = '2004 MAY 6 TDB'
 TIMEFMT = "YYYY-MM-DDTHR:MN:SC.###::UTC"
 
 def intersect(win1, win2):
-    spiceypy.furnsh(METAKR)
-    etbeg = spiceypy.str2et(START)
-    etend = spiceypy.str2et(STOP)
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    # insert
-    spiceypy.wninsd(etbeg, etend, cnfine)
-    # intersect 同時可視
-    win_int = spiceypy.wnintd(win1, win2)
-    # 同時可視ウインドウの数
-    winsiz = spiceypy.wncard(win_int)
-
-    isbeg = []
-    isend = []
-    for i in range(winsiz):
-        # fetch an interval
-        [intbeg, intend] = spiceypy.wnfetd(win_int, i)
-        btmstr = spiceypy.timout(intbeg, TIMEFMT)
-        etmstr = spiceypy.timout(intend, TIMEFMT)
-        dtbeg = dt.datetime.strptime(btmstr, "%Y-%m-%dT%H:%M:%S.%f")
-        dtend = dt.datetime.strptime(etmstr, "%Y-%m-%dT%H:%M:%S.%f")
-        isbeg.append(dtbeg)
-        isend.append(dtend)
-    spiceypy.unload(METAKR)
+    with KernelSession.open(METAKR) as kernels:
+        etbeg = spiceypy.str2et(START)
+        etend = spiceypy.str2et(STOP)
+        # insert
+        cnfine = IntervalSet([[etbeg, etend]])
+        # intersect 同時可視
+        win_int = IntervalSet.from_cell(win1) & IntervalSet.from_cell(win2)
+        # 全区間をまとめてdatetimeに変換(TIMEFMTのtimout出力と一致)
+        isbeg, isend = window2datetime(win_int)
+        isbeg = isbeg.tolist()
+        isend = isend.tolist()
     return isbeg, isend
 
 
 def invisible(win1, win2):
-    spiceypy.furnsh(METAKR)
-    etbeg = spiceypy.str2et(START)
-    etend = spiceypy.str2et(STOP)
-    cnfine = stypes.SPICEDOUBLE_CELL(2)
-    # insert
-    spiceypy.wninsd(etbeg, etend, cnfine)
-    # union 結合(どちらかが見えてるとき)
-    win_uni = spiceypy.wnunid(win1, win2)
-    # cnfineとdiff
-    win_invisi = spiceypy.wndifd(cnfine, win_uni)
-    # 不可視ウインドウの数
-    winsiz = spiceypy.wncard(win_invisi)
-
-    ivbeg = []
-    ivend = []
-    for i in range(winsiz):
-        # fetch an interval
-        [intbeg, intend] = spiceypy.wnfetd(win_invisi, i)
-        btmstr = spiceypy.timout(intbeg, TIMEFMT)
-        etmstr = spiceypy.timout(intend, TIMEFMT)
-        dtbeg = dt.datetime.strptime(btmstr, "%Y-%m-%dT%H:%M:%S.%f")
-        dtend = dt.datetime.strptime(etmstr, "%Y-%m-%dT%H:%M:%S.%f")
-        ivbeg.append(dtbeg)
-        ivend.append(dtend)
-    spiceypy.unload(METAKR)
+    with KernelSession.open(METAKR) as kernels:
+        etbeg = spiceypy.str2et(START)
+        etend = spiceypy.str2et(STOP)
+        # insert
+        cnfine = IntervalSet([[etbeg, etend]])
+        # union 結合(どちらかが見えてるとき)
+        win_uni = IntervalSet.from_cell(win1) | IntervalSet.from_cell(win2)
+        # cnfineとdiff
+        win_invisi = cnfine - win_uni
+        # 全区間をまとめてdatetimeに変換(TIMEFMTのtimout出力と一致)
+        ivbeg, ivend = window2datetime(win_invisi)
+        ivbeg = ivbeg.tolist()
+        ivend = ivend.tolist()
     return ivbeg, ivend
 
 
-def plot(isbeg, isend, ivbeg, ivend):
-    fig = plt.figure()
-    ax1 = fig.add_subplot(111)
+def plot(isbeg, isend, ivbeg, ivend, path=None):
+    # 区間ごとのplotではなく、カテゴリごとに1つのコレクションで描画
+    if path is None:
+        fig = plt.figure()
+        ax1 = fig.add_subplot(111)
+        timeline = Timeline(ax1)
+    else:
+        # 画面なしでファイルに出力
+        timeline = Timeline()
 
-    for i in range(len(isbeg)):
-        list_time = []
-        list_visi = []
-        list_time.append(isbeg[i])
-        list_visi.append("simultaneous")
-        list_time.append(isend[i])
-        list_visi.append("simultaneous")
-        ax1.plot(list_time, list_visi, c="b", marker=".")
+    timeline.add_dates("simultaneous", isbeg, isend, color="b")
+    timeline.add_dates("invisible", ivbeg, ivend, color="b")
 
-    if len(ivbeg) == 0:
-        # 不可視がない場合
-        list_time = []
-        list_visi = []
-        # beg, endをプロット
+    if path is None:
+        timeline.update()
+        plt.show()
     else:
-        for i in range(len(ivbeg)):
-            list_time = []
-            list_visi = []
-            list_time.append(ivbeg[i])
-            list_visi.append("invisible")
-            list_time.append(ivend[i])
-            list_visi.append("invisible")
-            ax1.plot(list_time, list_visi, c="b", marker=".")
-
-    plt.show()
+        timeline.save(path)
     return None
 
 
 if __name__ == '__main__':
-    spiceypy.furnsh(METAKR)
-    etbeg1 = spiceypy.str2et('2004 MAY 2 TDB')
-    etend1 = spiceypy.str2et('2004 MAY 4 TDB')
-    win1 = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd(etbeg1, etend1, win1)
-    etbeg2 = spiceypy.str2et('2004 MAY 3 TDB')
-    etend2 = spiceypy.str2et('2004 MAY 5 TDB')
-    win2 = stypes.SPICEDOUBLE_CELL(2)
-    spiceypy.wninsd(etbeg2, etend2, win2)
-    spiceypy.unload(METAKR)
-
-    isbeg, isend = intersect(win1, win2)
-    ivbeg, ivend = invisible(win1, win2)
+    # メタカーネルは一度だけロードしてintersect/invisibleと共有
+    with KernelSession.open(METAKR) as kernels:
+        print(kernels)
+        etbeg1 = spiceypy.str2et('2004 MAY 2 TDB')
+        etend1 = spiceypy.str2et('2004 MAY 4 TDB')
+        win1 = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd(etbeg1, etend1, win1)
+        etbeg2 = spiceypy.str2et('2004 MAY 3 TDB')
+        etend2 = spiceypy.str2et('2004 MAY 5 TDB')
+        win2 = stypes.SPICEDOUBLE_CELL(2)
+        spiceypy.wninsd(etbeg2, etend2, win2)
+
+        isbeg, isend = intersect(win1, win2)
+        ivbeg, ivend = invisible(win1, win2)
     plot(isbeg, isend, ivbeg, ivend)
\ No newline at end of file
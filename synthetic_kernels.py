@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic SPICE kernels for testing and benchmarking without NAIF data.
+
+generate( directory ) writes, offline,
+
+    synth.tls        leapseconds (DELTET constants, leap seconds to 2017)
+    synth.tpc        IAU style rotation and radii for the Sun, Earth, Mars
+    synth_dss.tf     DSS-14, DSS-43 and DSS-63 with topocentric frames
+    synth.bsp        two-body ephemerides of the Mars and Earth system
+                     barycenters about the Sun and of MEX about Mars
+    synth_mars.bds   triangulated Mars ellipsoid (type 2 DSK)
+    mexMetaK.tm.txt  meta-kernel loading all of the above
+
+so that mex_visible can be run from the directory:
+
+    python synthetic_kernels.py ./kernels
+    cd kernels && python ../mex_visible.py
+
+The MEX orbit is polar-like (300 km by 10100 km) and its plane
+contains the Sun direction at the start time, so it is eclipsed by
+Mars on every revolution, and it is occulted by Mars as seen from the
+Earth on most. The orbits are conics, not real ephemerides; they only
+give the geometry finder realistic event densities.
+"""
+
+import os
+import sys
+
+import numpy as np
+import spiceypy
+
+from kernel_session import write_metakernel
+
+METAKR = 'mexMetaK.tm.txt'
+
+#
+# Station name: (NAIF ID, geodetic latitude, east longitude (degrees)).
+#
+STATIONS = {
+    'DSS-14': ( 399014,  35.4259, -116.8895 ),
+    'DSS-43': ( 399043, -35.4024,  148.9813 ),
+    'DSS-63': ( 399063,  40.4315,   -4.2480 ),
+}
+
+GM_SUN  = 1.32712440018e11
+GM_MARS = 42828.37
+AU      = 1.495978707e8
+
+MARS_RADII  = ( 3396.19, 3396.19, 3376.20 )
+EARTH_RADII = ( 6378.1366, 6378.1366, 6356.7519 )
+
+LSK = r"""KPL/LSK
+
+\begindata
+
+DELTET/DELTA_T_A       =   32.184
+DELTET/K               =    1.657D-3
+DELTET/EB              =    1.671D-2
+DELTET/M               = (  6.239996D0   1.99096871D-7 )
+
+DELTET/DELTA_AT        = ( 10,   @1972-JAN-1
+                           11,   @1972-JUL-1
+                           12,   @1973-JAN-1
+                           13,   @1974-JAN-1
+                           14,   @1975-JAN-1
+                           15,   @1976-JAN-1
+                           16,   @1977-JAN-1
+                           17,   @1978-JAN-1
+                           18,   @1979-JAN-1
+                           19,   @1980-JAN-1
+                           20,   @1981-JUL-1
+                           21,   @1982-JUL-1
+                           22,   @1983-JUL-1
+                           23,   @1985-JUL-1
+                           24,   @1988-JAN-1
+                           25,   @1990-JAN-1
+                           26,   @1991-JAN-1
+                           27,   @1992-JUL-1
+                           28,   @1993-JUL-1
+                           29,   @1994-JUL-1
+                           30,   @1996-JAN-1
+                           31,   @1997-JUL-1
+                           32,   @1999-JAN-1
+                           33,   @2006-JAN-1
+                           34,   @2009-JAN-1
+                           35,   @2012-JUL-1
+                           36,   @2015-JUL-1
+                           37,   @2017-JAN-1 )
+
+\begintext
+"""
+
+PCK = r"""KPL/PCK
+
+\begindata
+
+BODY10_POLE_RA   = ( 286.13  0.  0. )
+BODY10_POLE_DEC  = (  63.87  0.  0. )
+BODY10_PM        = (  84.176 14.18440  0. )
+BODY10_RADII     = ( 696000. 696000. 696000. )
+
+BODY399_POLE_RA  = (   0.    -0.641   0. )
+BODY399_POLE_DEC = (  90.    -0.557   0. )
+BODY399_PM       = ( 190.147 360.9856235  0. )
+BODY399_RADII    = ( 6378.1366 6378.1366 6356.7519 )
+
+BODY499_POLE_RA  = ( 317.68143 -0.1061  0. )
+BODY499_POLE_DEC = (  52.88650 -0.0609  0. )
+BODY499_PM       = ( 176.630  350.89198226  0. )
+BODY499_RADII    = ( 3396.19 3396.19 3376.20 )
+
+\begintext
+"""
+
+STATION_FK = r"""
+NAIF_BODY_NAME += '{name:s}'
+NAIF_BODY_CODE += {code:d}
+
+FRAME_{name:s}_TOPO        = {frame:d}
+FRAME_{frame:d}_NAME       = '{name:s}_TOPO'
+FRAME_{frame:d}_CLASS      = 4
+FRAME_{frame:d}_CLASS_ID   = {frame:d}
+FRAME_{frame:d}_CENTER     = {code:d}
+OBJECT_{code:d}_FRAME      = '{name:s}_TOPO'
+TKFRAME_{frame:d}_RELATIVE = 'IAU_EARTH'
+TKFRAME_{frame:d}_SPEC     = 'ANGLES'
+TKFRAME_{frame:d}_UNITS    = 'DEGREES'
+TKFRAME_{frame:d}_AXES     = ( 3, 2, 3 )
+TKFRAME_{frame:d}_ANGLES   = ( {mlon:.4f}, {mcolat:.4f}, 180.0 )
+"""
+
+
+def _write(directory, name, text):
+    path = os.path.join( directory, name )
+    with open( path, 'w' ) as f:
+        f.write( text )
+    return path
+
+
+def write_lsk(directory):
+    return _write( directory, 'synth.tls', LSK )
+
+
+def write_pck(directory):
+    return _write( directory, 'synth.tpc', PCK )
+
+
+def write_fk(directory, stations=STATIONS):
+    #
+    # Topocentric frames as in the NAIF DSN frame kernel: +Z up,
+    # +X north, rotated from IAU_EARTH by (-lon, -colat, 180) about
+    # the (3, 2, 3) axes.
+    #
+    text = 'KPL/FK\n\n\\begindata\n'
+    for name in sorted( stations ):
+        code, lat, lon = stations[name]
+        text += STATION_FK.format( name=name, code=code,
+                                   frame=1000000 + code,
+                                   mlon=-lon, mcolat=-( 90.0 - lat ) )
+    text += '\n\\begintext\n'
+    return _write( directory, 'synth_dss.tf', text )
+
+
+def mex_elements(et0):
+    """
+    Conic elements of the MEX orbit about Mars: 300 km by 10100 km,
+    in a plane containing the Sun direction and the J2000 pole at et0.
+    """
+    mars = spiceypy.conics( mars_elements( et0 ), et0 )
+    sun = spiceypy.vhat( -np.asarray( mars[:3] ) )
+    normal = spiceypy.vhat( spiceypy.vcrss( sun, [0.0, 0.0, 1.0] ) )
+    inplane = spiceypy.vcrss( normal, sun )
+
+    #
+    # Periapsis 120 degrees from the Sun direction, so that the shadow
+    # is crossed at a true anomaly of 60 degrees, low in the orbit.
+    #
+    w = np.radians( 120.0 )
+    peri = ( np.cos( w ) * np.asarray( sun ) +
+             np.sin( w ) * np.asarray( inplane ) )
+    rp = MARS_RADII[0] + 300.0
+    ra = MARS_RADII[0] + 10100.0
+    a = 0.5 * ( rp + ra )
+    vp = np.sqrt( GM_MARS * ( 2.0 / rp - 1.0 / a ) )
+    state = np.concatenate( ( rp * peri,
+                              vp * np.asarray( spiceypy.vcrss( normal,
+                                                               peri ) ) ) )
+    return spiceypy.oscelt( state, et0, GM_MARS )
+
+
+def mars_elements(et0):
+    return [ 1.5237 * AU * ( 1 - 0.0934 ), 0.0934, np.radians( 24.7 ),
+             np.radians( 3.4 ), np.radians( 286.5 ), np.radians( 20.0 ),
+             et0, GM_SUN ]
+
+
+def earth_elements(et0):
+    return [ AU * ( 1 - 0.0167 ), 0.0167, np.radians( 23.44 ), 0.0,
+             np.radians( 102.9 ), np.radians( 120.0 ), et0, GM_SUN ]
+
+
+def write_spk(directory, et0, et1, stations=STATIONS, mex_step=60.0):
+    path = os.path.join( directory, 'synth.bsp' )
+    if os.path.exists( path ):
+        os.remove( path )
+    handle = spiceypy.spkopn( path, 'SYNTHETIC', 0 )
+
+    def conic_segment(body, center, elts, step, segid):
+        #
+        # Type 13 (Hermite, unequal steps) sampled from the conic, with
+        # a few samples of padding outside [et0, et1].
+        #
+        ets = np.arange( et0 - 8 * step, et1 + 9 * step, step )
+        states = np.array( [spiceypy.conics( elts, et ) for et in ets] )
+        spiceypy.spkw13( handle, body, center, 'J2000', ets[0], ets[-1],
+                         segid, 7, len( ets ), states, ets )
+
+    def fixed_segment(body, center, frame, pos, segid):
+        first = et0 - 1.0e6
+        last  = et1 + 1.0e6
+        states = np.array( [list( pos ) + [0.0, 0.0, 0.0]] * 2 )
+        spiceypy.spkw08( handle, body, center, frame, first, last, segid,
+                         1, 2, states, first, last - first )
+
+    conic_segment( 4, 10, mars_elements( et0 ), 43200.0, 'MARS BARYCENTER' )
+    conic_segment( 3, 10, earth_elements( et0 ), 43200.0,
+                   'EARTH BARYCENTER' )
+    fixed_segment( 10, 0, 'J2000', [0.0, 0.0, 0.0], 'SUN' )
+    fixed_segment( 499, 4, 'J2000', [0.0, 0.0, 0.0], 'MARS' )
+    fixed_segment( 399, 3, 'J2000', [0.0, 0.0, 0.0], 'EARTH' )
+
+    re, _, rp = EARTH_RADII
+    for name in sorted( stations ):
+        code, lat, lon = stations[name]
+        pos = spiceypy.georec( np.radians( lon ), np.radians( lat ), 1.0,
+                               re, ( re - rp ) / re )
+        fixed_segment( code, 399, 'IAU_EARTH', pos, name )
+
+    conic_segment( -41, 499, mex_elements( et0 ), mex_step, 'MEX' )
+    spiceypy.spkcls( handle )
+    return path
+
+
+def write_dsk(directory, et0, et1, nlat=45, nlon=90):
+    """
+    Mars ellipsoid tessellated on a nlat x nlon latitude/longitude grid.
+    """
+    path = os.path.join( directory, 'synth_mars.bds' )
+    if os.path.exists( path ):
+        os.remove( path )
+    a, b, c = MARS_RADII
+
+    lats = np.linspace( -np.pi / 2, np.pi / 2, nlat + 1 )[1:-1]
+    lons = np.linspace( -np.pi, np.pi, nlon, endpoint=False )
+    la, lo = np.meshgrid( lats, lons, indexing='ij' )
+    ring = np.stack( ( a * np.cos( la ) * np.cos( lo ),
+                       b * np.cos( la ) * np.sin( lo ),
+                       c * np.sin( la ) ), axis=-1 ).reshape( -1, 3 )
+    verts = np.vstack( ( [[0.0, 0.0, -c]], ring, [[0.0, 0.0, c]] ) )
+    top = len( verts )
+
+    #
+    # Every vertex lies on the ellipsoid, so its radius is bounded by
+    # the smallest and largest axes.
+    #
+    radii = np.linalg.norm( verts, axis=1 )
+    if radii.min() < min( MARS_RADII ) * ( 1.0 - 1.0e-12 ) or \
+       radii.max() > max( MARS_RADII ) * ( 1.0 + 1.0e-12 ):
+        raise ValueError( 'DSK vertices off the Mars ellipsoid' )
+
+    #
+    # Plates use 1-based vertex indices: the south pole is 1, ring
+    # vertex (i, j) is 2 + i*nlon + j and the north pole is the last.
+    #
+    j = np.arange( nlon )
+    jn = ( j + 1 ) % nlon
+    plates = [ np.column_stack( ( np.ones( nlon, int ), 2 + jn, 2 + j ) ) ]
+    for i in range( nlat - 2 ):
+        v00 = 2 + i * nlon + j
+        v01 = 2 + i * nlon + jn
+        v11 = 2 + ( i + 1 ) * nlon + jn
+        v10 = 2 + ( i + 1 ) * nlon + j
+        plates.append( np.column_stack( ( v00, v01, v11 ) ) )
+        plates.append( np.column_stack( ( v00, v11, v10 ) ) )
+    last = 2 + ( nlat - 2 ) * nlon
+    plates.append( np.column_stack( ( last + j, last + jn,
+                                      np.full( nlon, top ) ) ) )
+    plates = np.vstack( plates )
+
+    #
+    # Points inside a flat plate lie closer to the centre than its
+    # vertices, so the lower radius bound is the least distance of a
+    # plate plane from the centre.
+    #
+    corner = [ verts[plates[:, k] - 1] for k in range( 3 ) ]
+    normal = np.cross( corner[1] - corner[0], corner[2] - corner[0] )
+    inner = np.abs( np.sum( normal * corner[0], axis=1 ) ) / \
+            np.linalg.norm( normal, axis=1 )
+
+    spaixd, spaixi = spiceypy.dskmi2( verts, plates, 5.0, 4, 1000000,
+                                      1000000, 1000000, True, 5000000 )
+    handle = spiceypy.dskopn( path, 'SYNTHETIC', 0 )
+    spiceypy.dskw02( handle, 499, 499001, 2, 'IAU_MARS', 1, np.zeros( 10 ),
+                     -np.pi, np.pi, -np.pi / 2, np.pi / 2,
+                     inner.min() - 1.0, radii.max() + 1.0,
+                     et0 - 1.0e6, et1 + 1.0e6, verts, plates, spaixd, spaixi )
+    spiceypy.dskcls( handle, True )
+    return path
+
+
+def generate(directory, start='2004 APR 1 TDB', stop='2004 JUN 1 TDB',
+             stations=STATIONS, dsk=True, mex_step=60.0):
+    """
+    Write the synthetic kernels covering [start, stop] to directory
+    and return the path of the meta-kernel.
+    """
+    if not os.path.isdir( directory ):
+        os.makedirs( directory )
+
+    #
+    # Only the leapseconds are needed to build the others; they are
+    # loaded into the kernel pool just for the duration of this call.
+    #
+    lsk = write_lsk( directory )
+    spiceypy.furnsh( lsk )
+    try:
+        et0 = spiceypy.str2et( start )
+        et1 = spiceypy.str2et( stop )
+        kernels = [ lsk,
+                    write_pck( directory ),
+                    write_fk( directory, stations ),
+                    write_spk( directory, et0, et1, stations, mex_step ) ]
+        if dsk:
+            kernels.append( write_dsk( directory, et0, et1 ) )
+    finally:
+        spiceypy.unload( lsk )
+    return write_metakernel( directory, kernels, METAKR )
+
+
+if __name__ == '__main__':
+    # 引数: 出力ディレクトリ [開始時刻 終了時刻]
+    print( generate( *sys.argv[1:] ) if len( sys.argv ) > 1
+           else generate( '.' ) )
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: the modules live at the top of the repository, and
+the tests that need SPICE run on synthetic kernels written once per
+session.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert( 0, os.path.dirname( os.path.dirname(
+    os.path.abspath( __file__ ) ) ) )
+
+from kernel_session import KernelSession
+from synthetic_kernels import generate
+
+#
+# Covers the 2004 MAY 2 - MAY 6 span the examples search.
+#
+START = '2004 MAY 1 TDB'
+STOP  = '2004 MAY 8 TDB'
+
+
+@pytest.fixture( scope='session' )
+def metakr(tmp_path_factory):
+    """
+    Path of the synthetic meta-kernel.
+    """
+    return generate( str( tmp_path_factory.mktemp( 'kernels' ) ),
+                     START, STOP )
+
+
+@pytest.fixture
+def kernels(metakr):
+    """
+    The synthetic kernels, loaded for one test.
+    """
+    with KernelSession.open( metakr ) as session:
+        yield session
+
+
+@pytest.fixture
+def kernel_dir(metakr, monkeypatch):
+    """
+    Run in the kernel directory, where the examples look for
+    ./mexMetaK.tm.txt.
+    """
+    monkeypatch.chdir( os.path.dirname( metakr ) )
+    return os.path.dirname( metakr )
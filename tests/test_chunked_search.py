@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked searches against one search of the whole span, starting from
+a capacity too small for a chunk so that SPICE(WINDOWEXCESS) makes
+them grow the cell and retry.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+
+from chunked_search import chunked_search, collect, search_chunk
+from interval_set import IntervalSet
+from parallel_search import run_search
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+GFPOSC = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14', 'LATITUDINAL',
+           'LATITUDE', '>', np.radians( 6.0 ), 0.0, 300.0 )
+GFOCLT = ( 'ANY', 'MARS', 'ELLIPSOID', 'IAU_MARS', 'MEX', 'POINT', ' ',
+           'CN', 'DSS-14', 120.0 )
+
+
+@pytest.fixture
+def cnfine(kernels):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    et1 = spiceypy.str2et( '2004 MAY 6 TDB' )
+    return IntervalSet( [[et0, et1]] )
+
+
+def full_search(name, args, cnfine):
+    if name == 'gfposc':
+        args = args + (1000,)
+    return IntervalSet( run_search( name, args, 2000, cnfine.array ) )
+
+
+@pytest.mark.parametrize( 'name, args', [ ('gfposc', GFPOSC),
+                                          ('gfoclt', GFOCLT) ] )
+def test_chunk_grows_capacity(cnfine, name, args):
+    expect = full_search( name, args, cnfine )
+    assert len( expect ) > 2
+    found, capacity = search_chunk( name, args, cnfine.array, 1 )
+    assert capacity >= len( expect )
+    np.testing.assert_allclose( found, expect.array, rtol=0.0, atol=TOL )
+
+
+@pytest.mark.parametrize( 'name, args', [ ('gfposc', GFPOSC),
+                                          ('gfoclt', GFOCLT) ] )
+@pytest.mark.parametrize( 'chunk, target', [ (4 * 86400.0, 250),
+                                             (20000.0, 2) ] )
+def test_tiny_capacity_matches_full_search(cnfine, name, args, chunk,
+                                           target):
+    expect = full_search( name, args, cnfine )
+    batches = list( chunked_search( name, args, cnfine.to_cell(),
+                                    chunk=chunk, target=target,
+                                    capacity=1 ) )
+    window = collect( batches )
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+    #
+    # Batches come in time order and hold complete intervals.
+    #
+    stacked = np.concatenate( batches )
+    assert np.all( np.diff( stacked[:, 0] ) > 0.0 )
+    assert len( stacked ) == len( expect )
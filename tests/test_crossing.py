@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Batched crossing searches against gfposc on the same conditions.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+from crossing import crossing_search
+from interval_set import IntervalSet
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+STEP = 300.0
+
+#
+# (quantity, relate, refval) and the gfposc arguments of the same
+# condition before refval.
+#
+QUERIES = [
+    ( ('latitude', '>', np.radians( 30.0 )),
+      ('MEX', 'IAU_MARS', 'NONE', 'MARS', 'LATITUDINAL', 'LATITUDE') ),
+    ( ('latitude', '<', np.radians( -10.0 )),
+      ('MEX', 'IAU_MARS', 'NONE', 'MARS', 'LATITUDINAL', 'LATITUDE') ),
+    ( ('longitude', '<', np.radians( 45.0 )),
+      ('MEX', 'IAU_MARS', 'NONE', 'MARS', 'LATITUDINAL', 'LONGITUDE') ),
+    ( ('longitude', '>', np.radians( -120.0 )),
+      ('MEX', 'IAU_MARS', 'NONE', 'MARS', 'LATITUDINAL', 'LONGITUDE') ),
+    ( ('altitude', '<', 1000.0),
+      ('MEX', 'IAU_MARS', 'NONE', 'MARS', 'GEODETIC', 'ALTITUDE') ),
+    ( ('elevation', '>', np.radians( 6.0 )),
+      ('MEX', 'DSS-14_TOPO', 'NONE', 'DSS-14', 'LATITUDINAL',
+       'LATITUDE') ),
+]
+
+
+@pytest.fixture
+def cnfine(kernels):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    et1 = spiceypy.str2et( '2004 MAY 4 TDB' )
+    #
+    # Two intervals, so that the grid has a gap.
+    #
+    return IntervalSet( [[et0, et0 + 60000.0],
+                         [et0 + 70000.0, et1]] ).to_cell()
+
+
+def gfposc(query, args, cnfine):
+    _, relate, refval = query
+    result = stypes.SPICEDOUBLE_CELL( 2000 )
+    spiceypy.gfposc( *( args + ( relate, refval, 0.0, STEP, 1000,
+                                 cnfine, result ) ) )
+    return IntervalSet.from_cell( result )
+
+
+def assert_close(window, expect):
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+@pytest.mark.parametrize( 'query, args', QUERIES )
+def test_query_matches_gfposc(cnfine, query, args):
+    expect = gfposc( query, args, cnfine )
+    assert len( expect ) > 0
+    window, = crossing_search( [query], cnfine, step=STEP )
+    assert_close( window, expect )
+
+
+def test_batch_matches_single_queries(cnfine):
+    windows = crossing_search( [query for query, _ in QUERIES], cnfine,
+                               step=STEP )
+    for window, ( query, args ) in zip( windows, QUERIES ):
+        assert_close( window, gfposc( query, args, cnfine ) )
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Chebyshev tables against spkezr, their span and their error bound.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+
+from ephemeris_table import EphemerisTable, build_table
+
+KEY = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14' )
+
+
+@pytest.fixture
+def span(kernels):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    return et0, et0 + 1.3 * 86400.0 + 17.0
+
+
+def test_segments_tile_span(tmp_path, span):
+    et0, et1 = span
+    table = build_table( str( tmp_path ), [KEY], et0, et1, tol=1.0e-2 )
+    entry = table.tables[KEY]
+    assert entry['seglen'] <= 3600.0
+    assert entry['start'] + entry['nseg'] * entry['seglen'] == \
+           pytest.approx( et1, abs=1.0e-6 )
+
+    ets = np.linspace( et0, et1, 501 )
+    states, _ = spiceypy.spkezr( KEY[0], ets, KEY[1], KEY[2], KEY[3] )
+    error = np.linalg.norm( table.position( KEY, ets ) -
+                            np.asarray( states )[:, :3], axis=1 )
+    assert error.max() <= 1.0e-2
+    assert table.error() == table.error( KEY )
+    assert EphemerisTable( str( tmp_path ) ).error() == table.error()
+
+
+def test_unreachable_tol_raises(tmp_path, span):
+    et0, et1 = span
+    with pytest.raises( ValueError ):
+        build_table( str( tmp_path ), [KEY], et0, et1, seglen=600.0,
+                     tol=1.0e-12, min_seglen=300.0 )
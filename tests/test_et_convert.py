@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized ET -> UTC conversion against timout on the synthetic LSK.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+
+from et_convert import LeapSecondTable, et2datetime, et2datetime64, \
+                       window2datetime
+from interval_set import IntervalSet
+
+TIMEFMT = 'YYYY-MM-DDTHR:MN:SC.###::UTC'
+
+
+def timout(ets):
+    return np.array( [ spiceypy.timout( et, TIMEFMT ) for et in ets ] )
+
+
+def iso(ets, table):
+    return np.datetime_as_string( et2datetime64( ets, 'ms', table ),
+                                  unit='ms' )
+
+
+@pytest.fixture
+def table(kernels):
+    return LeapSecondTable()
+
+
+def test_ordinary_epochs_match_timout(table):
+    rng = np.random.default_rng( 1 )
+    et0 = spiceypy.str2et( '1972 JAN 2 UTC' )
+    et1 = spiceypy.str2et( '2030 JAN 1 UTC' )
+    ets = rng.uniform( et0, et1, 5000 )
+    ets = np.concatenate( ( ets, np.round( ets ), np.round( ets ) - 1e-4 ) )
+    np.testing.assert_array_equal( iso( ets, table ), timout( ets ) )
+
+
+@pytest.mark.parametrize( 'utc', [ '1900 JAN 01 00:00:00.250',
+                                   '1960 JUN 15 12:34:56.789',
+                                   '1971 DEC 31 23:59:59.500' ] )
+def test_epochs_before_the_table_match_timout(table, utc):
+    et = spiceypy.str2et( utc + ' UTC' )
+    assert iso( [et], table )[0] == spiceypy.timout( et, TIMEFMT )
+
+
+@pytest.mark.parametrize( 'utc', [ '1971 DEC 31 23:59:60.500',
+                                   '1972 JUN 30 23:59:60.000',
+                                   '2016 DEC 31 23:59:60.250' ] )
+def test_leap_second_held_at_end_of_day(table, utc):
+    et = spiceypy.str2et( utc + ' UTC' )
+    assert spiceypy.timout( et, TIMEFMT )[11:19] == '23:59:60'
+    assert iso( [et], table )[0] == \
+           spiceypy.timout( et, TIMEFMT )[:11] + '23:59:59.999'
+    after = spiceypy.str2et( utc[:11] + ' 23:59:60.999 UTC' ) + 0.002
+    assert iso( [after], table )[0] == spiceypy.timout( after, TIMEFMT )
+
+
+def test_window_and_datetime(table):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    window = IntervalSet( [[et0, et0 + 100.5], [et0 + 500.0, et0 + 900.25]] )
+    begins, ends = window2datetime( window, table=table )
+    assert [ b.strftime( '%Y-%m-%dT%H:%M:%S.%f' )[:23]
+             for b in begins ] == \
+           [ t[:23] for t in timout( window.begins ) ]
+    assert ends[1] == et2datetime( [window.ends[1]], table=table )[0]
+    empty = window2datetime( IntervalSet(), table=table )
+    assert len( empty[0] ) == 0 and len( empty[1] ) == 0
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+The SearchResult writers read back: every interval of every window
+once, its ETs and its UTC times as timout gives them, in batches
+smaller than a window, and with empty windows.
+"""
+
+import csv
+import json
+
+import numpy as np
+import pytest
+import spiceypy
+
+from export import COLUMNS, SearchResult, write_arrow, write_csv, \
+                   write_jsonl, write_parquet
+from interval_set import IntervalSet
+
+TIMEFMT = 'YYYY-MM-DDTHR:MN:SC.###::UTC'
+
+
+@pytest.fixture
+def result(kernels):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    windows = { 'view':    IntervalSet( et0 + np.array(
+                               [[0.0, 100.25], [500.0, 900.5],
+                                [1000.0, 1000.0], [3600.125, 7200.0],
+                                [86400.0, 90000.75]] ) ),
+                'empty':   IntervalSet(),
+                'visible': IntervalSet( et0 + np.array(
+                               [[10.0, 20.0], [40000.0, 45000.0]] ) ) }
+    return SearchResult( 'test', {'target': 'MEX'},
+                         { k: w.to_cell() for k, w in windows.items() } )
+
+
+def expected_rows(result):
+    rows = []
+    for label, window in result.windows.items():
+        for begin, end in window:
+            rows.append( ( label, begin, end, end - begin,
+                           spiceypy.timout( begin, TIMEFMT ),
+                           spiceypy.timout( end, TIMEFMT ) ) )
+    return rows
+
+
+def assert_rows(rows, result):
+    expect = expected_rows( result )
+    assert len( rows ) == len( expect )
+    for row, want in zip( rows, expect ):
+        assert row[0] == want[0]
+        np.testing.assert_allclose( [float( x ) for x in row[1:4]],
+                                    want[1:4], rtol=0.0, atol=1.0e-6 )
+        assert row[4][:23] == want[4]
+        assert row[5][:23] == want[5]
+
+
+def test_csv(result, tmp_path):
+    path = str( tmp_path / 'result.csv' )
+    write_csv( result, path, batch=2 )
+    with open( path, newline='' ) as f:
+        rows = list( csv.reader( f ) )
+    assert rows[0] == COLUMNS
+    assert_rows( rows[1:], result )
+
+
+def test_jsonl(result, tmp_path):
+    path = str( tmp_path / 'result.jsonl' )
+    write_jsonl( result, path, batch=2 )
+    with open( path ) as f:
+        rows = [ json.loads( line ) for line in f ]
+    assert all( list( row ) == COLUMNS for row in rows )
+    assert_rows( [[row[name] for name in COLUMNS] for row in rows],
+                 result )
+
+
+def arrow_rows(table):
+    columns = table.to_pydict()
+    for name in ( 'begin_utc', 'end_utc' ):
+        columns[name] = [ t.strftime( '%Y-%m-%dT%H:%M:%S.%f' )
+                          for t in columns[name] ]
+    return list( zip( *[columns[name] for name in COLUMNS] ) )
+
+
+def test_parquet(result, tmp_path):
+    pq = pytest.importorskip( 'pyarrow.parquet' )
+    path = str( tmp_path / 'result.parquet' )
+    write_parquet( result, path, batch=2 )
+    table = pq.read_table( path )
+    assert table.column_names == COLUMNS
+    assert_rows( arrow_rows( table ), result )
+
+
+def test_arrow(result, tmp_path):
+    pa = pytest.importorskip( 'pyarrow' )
+    path = str( tmp_path / 'result.arrow' )
+    write_arrow( result, path, batch=2 )
+    with pa.memory_map( path ) as source:
+        table = pa.ipc.open_file( source ).read_all()
+    assert table.column_names == COLUMNS
+    assert_rows( arrow_rows( table ), result )
+
+
+@pytest.mark.parametrize( 'write, suffix', [ (write_csv, 'csv'),
+                                             (write_jsonl, 'jsonl'),
+                                             (write_parquet, 'parquet'),
+                                             (write_arrow, 'arrow') ] )
+def test_empty_result(kernels, tmp_path, write, suffix):
+    if suffix in ( 'parquet', 'arrow' ):
+        pytest.importorskip( 'pyarrow' )
+    result = SearchResult( 'test', {}, {'view': IntervalSet().to_cell()} )
+    path = str( tmp_path / ( 'result.' + suffix ) )
+    write( result, path )
+    if suffix == 'csv':
+        with open( path, newline='' ) as f:
+            assert list( csv.reader( f ) ) == [COLUMNS]
+    elif suffix == 'jsonl':
+        with open( path ) as f:
+            assert f.read() == ''
+    elif suffix == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table( path )
+        assert table.column_names == COLUMNS and table.num_rows == 0
+    else:
+        import pyarrow as pa
+        with pa.memory_map( path ) as source:
+            table = pa.ipc.open_file( source ).read_all()
+        assert table.column_names == COLUMNS and table.num_rows == 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+RollingWindow extended step by step against one search from scratch,
+and saved and loaded between steps.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+
+from incremental import RollingWindow, shade_search, view_period_search, \
+                        visible_search
+from interval_set import IntervalSet
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+
+def assert_close(window, expect):
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+@pytest.fixture
+def span(kernels):
+    return ( spiceypy.str2et( '2004 MAY 2 TDB' ),
+             spiceypy.str2et( '2004 MAY 6 TDB' ) )
+
+
+def stops(expect, start, stop):
+    """
+    Horizons inside intervals of expect as well as in the gaps.
+    """
+    inside = ( expect.begins + expect.ends ) / 2.0
+    return np.concatenate( ( inside[::3], np.linspace( start, stop, 5 )[1:] ) )
+
+
+@pytest.mark.parametrize( 'build', [ view_period_search, visible_search,
+                                     shade_search ] )
+def test_extend_matches_search_from_scratch(span, build):
+    start, stop = span
+    search = build()
+    expect = search( IntervalSet( [[start, stop]] ) )
+    assert len( expect ) > 0
+
+    horizon = RollingWindow( search, start )
+    for ets in sorted( stops( expect, start, stop ) ):
+        window = horizon.extend( ets )
+        assert_close( window, expect & IntervalSet( [[start, ets]] ) )
+    assert_close( horizon.window, expect )
+
+
+def test_save_load_round_trip(span, tmp_path):
+    start, stop = span
+    middle = ( start + stop ) / 2.0
+    path = str( tmp_path / 'view.npz' )
+
+    horizon = RollingWindow( view_period_search(), start )
+    horizon.extend( middle )
+    horizon.save( path )
+
+    loaded = RollingWindow.load( path, view_period_search() )
+    assert loaded.window == horizon.window
+    assert ( loaded.start, loaded.valid_until, loaded.overlap ) == \
+           ( horizon.start, horizon.valid_until, horizon.overlap )
+    assert_close( loaded.extend( stop ), horizon.extend( stop ) )
+
+    with pytest.raises( ValueError ):
+        RollingWindow.load( path, view_period_search( elvlim=10.0 ) )
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+IntervalSet against the SPICE window routines it stands in for, on
+random windows with touching intervals and singletons.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+from interval_set import IntervalSet, locate_all, membership
+
+SEEDS = range( 20 )
+
+
+def random_cell(rng, count=12, span=100):
+    """
+    SPICE window of count random intervals with integer endpoints, so
+    that intervals touch and singletons occur.
+    """
+    cell = stypes.SPICEDOUBLE_CELL( 2 * count + 2 )
+    for _ in range( count ):
+        left = float( rng.integers( 0, span ) )
+        right = left + float( rng.integers( 0, 8 ) ) * \
+                       float( rng.random() < 0.8 )
+        spiceypy.wninsd( left, right, cell )
+    return cell
+
+
+def copy_cell(cell):
+    return IntervalSet.from_cell( cell ).to_cell(
+        size=max( 2 * spiceypy.wncard( cell ), 2 ) + 200 )
+
+
+def assert_same(result, cell):
+    np.testing.assert_array_equal( result.array,
+                                   IntervalSet.from_cell( cell ).array )
+
+
+@pytest.fixture( params=SEEDS )
+def pair(request):
+    rng = np.random.default_rng( request.param )
+    return random_cell( rng ), random_cell( rng )
+
+
+def test_cell_round_trip(pair):
+    a, _ = pair
+    win = IntervalSet.from_cell( a )
+    assert len( win ) == spiceypy.wncard( a )
+    assert win.measure() == pytest.approx( spiceypy.wnsumd( a )[0] )
+    assert_same( IntervalSet.from_cell( win.to_cell() ), a )
+
+
+def test_normalize_matches_wninsd(pair):
+    a, _ = pair
+    rng = np.random.default_rng( 0 )
+    shuffled = IntervalSet.from_cell( a ).array.copy()
+    rng.shuffle( shuffled )
+    assert_same( IntervalSet( shuffled ), a )
+
+
+def test_union(pair):
+    a, b = pair
+    assert_same( IntervalSet.from_cell( a ) | IntervalSet.from_cell( b ),
+                 spiceypy.wnunid( a, b ) )
+
+
+def test_intersect(pair):
+    a, b = pair
+    assert_same( IntervalSet.from_cell( a ) & IntervalSet.from_cell( b ),
+                 spiceypy.wnintd( a, b ) )
+
+
+def test_difference(pair):
+    a, b = pair
+    assert_same( IntervalSet.from_cell( a ) - IntervalSet.from_cell( b ),
+                 spiceypy.wndifd( a, b ) )
+    assert_same( IntervalSet.from_cell( b ) - IntervalSet.from_cell( a ),
+                 spiceypy.wndifd( b, a ) )
+
+
+@pytest.mark.parametrize( 'left, right', [ (-5.0, 110.0), (10.0, 60.0),
+                                           (30.0, 30.5) ] )
+def test_complement(pair, left, right):
+    #
+    # wncomd leaves a gap holding all of [left, right] unclipped at
+    # right, so its result is clipped here.
+    #
+    a, _ = pair
+    expect = IntervalSet.from_cell( spiceypy.wncomd( left, right, a ) ) \
+             & IntervalSet( [[left, right]] )
+    assert_same( IntervalSet.from_cell( a ).complement( left, right ),
+                 expect.to_cell() )
+
+
+def test_complement_inside_gap():
+    win = IntervalSet( [[1.0, 3.0], [40.0, 50.0]] )
+    assert win.complement( 10.0, 20.0 ).array.tolist() == [[10.0, 20.0]]
+    assert win.complement( 10.0, 10.0 ).array.tolist() == [[10.0, 10.0]]
+    assert len( win.complement( 2.0, 2.0 ) ) == 0
+    assert win.complement( 0.0, 45.0 ).array.tolist() == [[0.0, 1.0],
+                                                           [3.0, 40.0]]
+
+
+@pytest.mark.parametrize( 'left, right', [ (0.0, 0.0), (1.0, 2.5),
+                                           (-1.0, 0.5), (3.0, -1.0),
+                                           (-2.0, -2.0) ] )
+def test_expand_contract(pair, left, right):
+    a, _ = pair
+    win = IntervalSet.from_cell( a )
+    assert_same( win.expand( left, right ),
+                 spiceypy.wnexpd( left, right, copy_cell( a ) ) )
+    assert_same( win.contract( left, right ),
+                 spiceypy.wncond( left, right, copy_cell( a ) ) )
+
+
+@pytest.mark.parametrize( 'small', [ 0.0, 1.0, 3.5 ] )
+def test_filter_fill(pair, small):
+    a, _ = pair
+    win = IntervalSet.from_cell( a )
+    assert_same( win.filter( small ),
+                 spiceypy.wnfltd( small, copy_cell( a ) ) )
+    assert_same( win.fill( small ),
+                 spiceypy.wnfild( small, copy_cell( a ) ) )
+
+
+def test_contains_and_locate(pair):
+    a, b = pair
+    points = np.arange( -2.0, 112.0, 0.25 )
+    expect = [ spiceypy.wnelmd( p, a ) for p in points ]
+    win = IntervalSet.from_cell( a )
+    np.testing.assert_array_equal( win.contains( points ), expect )
+
+    index = win.locate( points )
+    np.testing.assert_array_equal( index >= 0, expect )
+    inside = index >= 0
+    assert np.all( win.begins[index[inside]] <= points[inside] )
+    assert np.all( points[inside] <= win.ends[index[inside]] )
+
+    mask = membership( [a, b], points )
+    np.testing.assert_array_equal( mask[1], [ spiceypy.wnelmd( p, b )
+                                              for p in points ] )
+    np.testing.assert_array_equal( locate_all( [a, b], points )[0],
+                                   index )
+
+
+def test_rejects_reversed_interval():
+    with pytest.raises( ValueError ):
+        IntervalSet( [[2.0, 1.0]] )
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+The station x target matrix, with the occultations shared between
+stations, against the visibl search of each station on its own.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+
+from incremental import view_period_search, visible_search
+from interval_set import IntervalSet
+from multi_station import view_period_matrix
+from synthetic_kernels import STATIONS
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+START = '2004 MAY 2 TDB'
+STOP  = '2004 MAY 5 TDB'
+
+
+def assert_close(window, expect):
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+@pytest.fixture( scope='module' )
+def vpm(metakr):
+    return view_period_matrix( sorted( STATIONS ), ['MEX'], START, STOP,
+                               metakr=metakr, occult=True )
+
+
+@pytest.mark.parametrize( 'station', sorted( STATIONS ) )
+def test_matches_per_station_search(vpm, kernels, station):
+    cnfine = IntervalSet( [[spiceypy.str2et( START ),
+                            spiceypy.str2et( STOP )]] )
+    frame = '{:s}_TOPO'.format( station )
+    rise = view_period_search( srfpt=station, obsfrm=frame )( cnfine )
+    visible = visible_search( srfpt=station, obsfrm=frame )( cnfine )
+    assert visible.measure() < rise.measure()
+    i, j = vpm.index( station, 'MEX' )
+    assert_close( vpm.rise[i, j], rise )
+    assert_close( vpm[station, 'MEX'], visible )
+
+
+def test_at_matches_windows(vpm, kernels):
+    ets = np.linspace( spiceypy.str2et( START ), spiceypy.str2et( STOP ),
+                       5000 )
+    mask = vpm.at( ets )
+    assert mask.shape == ( len( STATIONS ), 1, len( ets ) )
+    for i, station in enumerate( vpm.stations ):
+        np.testing.assert_array_equal(
+            mask[i, 0], vpm[station, 'MEX'].contains( ets ) )
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+FrameEncoder when ffmpeg exits before taking every frame.
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from orbit_animation import FrameEncoder
+
+
+@pytest.fixture
+def failing_ffmpeg(tmp_path, monkeypatch):
+    """
+    An ffmpeg on PATH that exits at once without reading its input.
+    """
+    if sys.platform.startswith( 'win' ):
+        pytest.skip( 'needs a shell script' )
+    path = tmp_path / 'ffmpeg'
+    path.write_text( '#!/bin/sh\nexit 1\n' )
+    path.chmod( 0o755 )
+    monkeypatch.setenv( 'PATH', str( tmp_path ) + os.pathsep +
+                        os.environ.get( 'PATH', '' ) )
+
+
+def test_early_exit_raises_instead_of_blocking(failing_ffmpeg, tmp_path):
+    frame = np.zeros( (200, 200, 4), dtype=np.uint8 )
+    raised = []
+
+    def encode():
+        try:
+            with FrameEncoder( str( tmp_path / 'orbit.mp4' ), (200, 200),
+                               backlog=2 ) as encoder:
+                for _ in range( 100 ):
+                    encoder.put( frame )
+        except OSError as exc:
+            raised.append( exc )
+
+    thread = threading.Thread( target=encode, daemon=True )
+    thread.start()
+    thread.join( 30.0 )
+    assert not thread.is_alive()
+    assert len( raised ) == 1
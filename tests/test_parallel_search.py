@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Time-sliced searches in worker processes against the serial search,
+with slices cut inside the intervals found.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+import parallel_search
+from interval_set import IntervalSet
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+GFPOSC = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14', 'LATITUDINAL',
+           'LATITUDE', '>', np.radians( 6.0 ), 0.0, 300.0, 1000 )
+GFOCLT = ( 'ANY', 'MARS', 'ELLIPSOID', 'IAU_MARS', 'MEX', 'POINT', ' ',
+           'CN', 'DSS-14', 120.0 )
+
+
+@pytest.fixture
+def cnfine(kernels):
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    et1 = spiceypy.str2et( '2004 MAY 6 TDB' )
+    return IntervalSet( [[et0, et1]] ).to_cell()
+
+
+@pytest.fixture( scope='module', autouse=True )
+def pools():
+    yield
+    parallel_search.close_pools()
+
+
+def serial(name, args, cnfine):
+    result = stypes.SPICEDOUBLE_CELL( 4000 )
+    getattr( spiceypy, name )( *( args + (cnfine, result) ) )
+    return IntervalSet.from_cell( result )
+
+
+def cuts(cnfine, nslice):
+    cores = parallel_search.split_window( cnfine, nslice, 0.0 )
+    return np.array( [core[-1, 1] for core, _ in cores[:-1]] )
+
+
+@pytest.mark.parametrize( 'name, args, step', [ ('gfposc', GFPOSC, 300.0),
+                                                ('gfoclt', GFOCLT, 120.0) ] )
+def test_stitched_matches_serial(metakr, cnfine, name, args, step):
+    expect = serial( name, args, cnfine )
+    assert len( expect ) > 0
+    #
+    # The fewest slices with a cut inside an interval, so that the
+    # stitching is exercised.
+    #
+    nslice = next( n for n in range( 2, 200 )
+                   if np.any( expect.contains( cuts( cnfine, n ) ) ) )
+
+    result = stypes.SPICEDOUBLE_CELL( 4000 )
+    parallel_search.search( name, args, cnfine, result, metakr, 2, step,
+                            nslice=nslice )
+    result = IntervalSet.from_cell( result )
+    assert len( result ) == len( expect )
+    np.testing.assert_allclose( result.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+def test_gfoclt_default_cell_holds_every_slice(metakr, cnfine):
+    result = parallel_search.gfoclt( *( GFOCLT + (cnfine,) ),
+                                     metakr=metakr, workers=2 )
+    assert result.size == 2 * parallel_search.MAXWIN
+    expect = serial( 'gfoclt', GFOCLT, cnfine )
+    np.testing.assert_allclose( IntervalSet.from_cell( result ).array,
+                                expect.array, rtol=0.0, atol=TOL )
+    assert parallel_search.gfoclt( *( GFOCLT + (cnfine,) ) ).size == \
+           parallel_search.MAXWIN
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline node sharing: a search that several jobs need runs once,
+and the windows match the searches run on their own.
+"""
+
+import json
+
+import numpy as np
+import pytest
+import spiceypy
+
+import pipeline
+from incremental import view_period_search, visible_search
+from interval_set import IntervalSet
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+START = '2004 MAY 2 TDB'
+STOP  = '2004 MAY 5 TDB'
+
+
+def assert_close(window, expect):
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    (name, args) of every search the pipeline runs.
+    """
+    calls = []
+    run_search = pipeline.run_search
+
+    def counted(name, args, size, search, core=None, tol=None):
+        calls.append( ( name, args ) )
+        return run_search( name, args, size, search, core, tol )
+    monkeypatch.setattr( pipeline, 'run_search', counted )
+    return calls
+
+
+def build(metakr):
+    pipe = pipeline.Pipeline( metakr )
+    span = pipe.span( START, STOP )
+    pipe.add( 'view',    pipe.view_period( span ) )
+    pipe.add( 'visible', pipe.visible( span ) )
+    pipe.add( 'both',    pipe.visible( span, station='DSS-43' ) &
+                         pipe.visible( span ) )
+    return pipe
+
+
+def test_shared_nodes_run_once(metakr, calls):
+    pipe = build( metakr )
+    #
+    # span, two view periods, two occultations, two differences and
+    # the intersection.
+    #
+    assert len( pipe.nodes ) == 8
+    assert pipe.visible( pipe.span( START, STOP ) ) is pipe.jobs['visible']
+
+    windows = pipe.run()
+    assert len( calls ) == 4
+    assert len( set( map( repr, calls ) ) ) == 4
+    assert pipe.counts == { 'searches': 4, 'cached': 0, 'operations': 3 }
+
+    #
+    # Nothing is run again for the same jobs.
+    #
+    again = pipe.run()
+    assert len( calls ) == 4
+    assert all( again[name] is windows[name] for name in windows )
+
+
+def test_windows_match_searches(metakr, kernels, calls):
+    windows = build( metakr ).run()
+    cnfine = IntervalSet( [[spiceypy.str2et( START ),
+                            spiceypy.str2et( STOP )]] )
+    vis14 = visible_search()( cnfine )
+    vis43 = visible_search( srfpt='DSS-43', obsfrm='DSS-43_TOPO' )( cnfine )
+    assert_close( windows['view'], view_period_search()( cnfine ) )
+    assert_close( windows['visible'], vis14 )
+    assert_close( windows['both'], vis14 & vis43 )
+    assert len( windows['both'] ) > 0
+
+
+def test_config_shares_nodes(metakr, calls, tmp_path):
+    config = { 'metakr': metakr,
+               'nodes': { 'span':  { 'span': [START, STOP] },
+                          'view':  { 'view_period': { 'confine': 'span' } },
+                          'vis':   { 'visible': { 'confine': 'span' } },
+                          'wide':  { 'expand': ['view'], 'left': 60.0,
+                                     'right': 60.0 } },
+               'jobs': ['view', 'vis', 'wide'] }
+    path = str( tmp_path / 'jobs.json' )
+    with open( path, 'w' ) as f:
+        json.dump( config, f )
+    windows = pipeline.load_config( path ).run()
+    assert len( calls ) == 2
+    assert_close( windows['wide'], windows['view'].expand( 60.0, 60.0 ) )
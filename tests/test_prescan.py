@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+The elevation pre-scan against the unscreened gfposc search.
+"""
+
+import numpy as np
+import pytest
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+from interval_set import IntervalSet
+from mex_visible import viewpr
+from prescan import elevation, elevation_prescan
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+SEARCH = ( 'MEX', 'DSS-14_TOPO', 'CN+S', 'DSS-14' )
+
+
+def assert_close(window, expect):
+    window = IntervalSet.from_cell( window )
+    expect = IntervalSet.from_cell( expect )
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+def gfposc(relate, refval, cnfine):
+    result = stypes.SPICEDOUBLE_CELL( 2000 )
+    spiceypy.gfposc( *( SEARCH +
+                        ( 'LATITUDINAL', 'LATITUDE', relate, refval, 0.0,
+                          300.0, 1000, cnfine.to_cell(), result ) ) )
+    return IntervalSet.from_cell( result )
+
+
+@pytest.mark.parametrize( 'relate, elvlim', [ ('>', 6.0), ('<', 6.0),
+                                              ('>', 40.0) ] )
+def test_screened_search_matches_gfposc(kernels, relate, elvlim):
+    refval = np.radians( elvlim )
+    cnfine = IntervalSet( [[spiceypy.str2et( '2004 MAY 2 TDB' ),
+                            spiceypy.str2et( '2004 MAY 6 TDB' )]] )
+    certain, uncertain = elevation_prescan( *( SEARCH + ( relate, refval,
+                                                          cnfine ) ) )
+    assert 0.0 < uncertain.measure() < cnfine.measure()
+
+    #
+    # The condition holds everywhere in certain.
+    #
+    ets = np.linspace( cnfine.begins[0], cnfine.ends[0], 20000 )
+    ets = ets[certain.contains( ets )]
+    value = elevation( *( SEARCH + ( ets, ) ) )
+    assert np.all( value > refval if relate == '>' else value < refval )
+
+    screened = certain | gfposc( relate, refval, uncertain )
+    assert_close( screened.to_cell(),
+                  gfposc( relate, refval, cnfine ).to_cell() )
+
+
+def test_prescan_view_period_matches_full_search(kernel_dir):
+    full = viewpr( verbose=False )
+    screened = viewpr( prescan=True, verbose=False )
+    assert len( full['view'] ) > 0
+    assert_close( screened['view'], full['view'] )
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+QueryService request coalescing and its max_intervals bound, called
+directly rather than over HTTP.
+"""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+import spiceypy
+
+from incremental import view_period_search, visible_search
+from interval_set import IntervalSet
+from query_service import QueryError, QueryService, _Entry
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+DAY = 86400.0
+
+
+def assert_close(window, expect):
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=TOL )
+
+
+@pytest.fixture( scope='module' )
+def service(metakr):
+    service = QueryService( metakr, workers=1 )
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def fresh(service):
+    """
+    The service with nothing kept and the counters at zero.
+    """
+    service.entries.clear()
+    for name in service.counts:
+        service.counts[name] = 0
+    service.max_intervals = 1 << 20
+    return service
+
+
+@pytest.fixture
+def et0(kernels):
+    return spiceypy.str2et( '2004 MAY 2 TDB' )
+
+
+def ask(service, *requests):
+    async def gather():
+        return await asyncio.gather( *[ service.answer( kind, query )
+                                        for kind, query in requests ] )
+    return asyncio.run( gather() )
+
+
+def test_concurrent_requests_share_one_search(fresh, et0):
+    spans = [ (et0, et0 + DAY), (et0 + 0.5 * DAY, et0 + 2.0 * DAY),
+              (et0 + 0.25 * DAY, et0 + 0.75 * DAY), (et0, et0 + DAY) ]
+    windows = ask( fresh, *[ ('visible', {'start': a, 'stop': b})
+                             for a, b in spans ] )
+    assert fresh.counts['searches'] == 1
+    assert fresh.counts['coalesced'] == 3
+    search = visible_search()
+    for window, ( a, b ) in zip( windows, spans ):
+        assert_close( window, search( IntervalSet( [[a, b]] ) ) )
+
+    #
+    # Covered already: no search. Reaching past it: one search of
+    # the tail only.
+    #
+    ask( fresh, ('visible', {'start': et0 + 0.1 * DAY,
+                             'stop': et0 + 1.9 * DAY}) )
+    assert fresh.counts['searches'] == 1
+    assert fresh.counts['cached'] == 1
+    window, = ask( fresh, ('visible', {'start': et0,
+                                       'stop': et0 + 3.0 * DAY}) )
+    assert fresh.counts['searches'] == 2
+    entry, = fresh.entries.values()
+    assert entry.covered.array.tolist() == [[et0, et0 + 3.0 * DAY]]
+    assert_close( window, search( IntervalSet( [[et0, et0 + 3.0 * DAY]] ) ) )
+
+
+def test_different_parameters_are_separate(fresh, et0):
+    span = {'start': et0, 'stop': et0 + DAY}
+    view, view43 = ask( fresh, ('view', span),
+                        ('view', dict( span, srfpt='DSS-43' )) )
+    assert fresh.counts['searches'] == 2
+    cnfine = IntervalSet( [[et0, et0 + DAY]] )
+    assert_close( view, view_period_search()( cnfine ) )
+    assert_close( view43, view_period_search(
+        srfpt='DSS-43', obsfrm='DSS-43_TOPO' )( cnfine ) )
+
+
+def test_max_intervals_drops_least_recently_asked(fresh, et0):
+    span = {'start': et0, 'stop': et0 + DAY}
+    ask( fresh, ('view', span) )
+    ask( fresh, ('shade', span) )
+    ask( fresh, ('view', span) )
+    assert fresh.counts['searches'] == 2
+
+    sizes = [ entry.size() for entry in fresh.entries.values() ]
+    fresh.max_intervals = sum( sizes ) - 1
+    fresh.evict()
+    assert fresh.counts['evicted'] == 1
+    kind, = [ json.loads( key )[0] for key in fresh.entries ]
+    assert kind == 'view'
+
+    #
+    # Dropped: searched again when next asked.
+    #
+    ask( fresh, ('shade', span) )
+    assert fresh.counts['searches'] == 3
+
+
+def test_pending_entries_are_kept(fresh):
+    busy = _Entry()
+    busy.found = IntervalSet( [[0.0, 1.0], [2.0, 3.0]] )
+    busy.tasks.append( ( IntervalSet( [[5.0, 6.0]] ), None ) )
+    idle = _Entry()
+    idle.found = IntervalSet( [[0.0, 1.0]] )
+    fresh.entries['busy'] = busy
+    fresh.entries['idle'] = idle
+    fresh.max_intervals = 0
+    fresh.evict()
+    assert list( fresh.entries ) == ['busy']
+
+
+def test_bad_query(fresh):
+    with pytest.raises( QueryError ):
+        ask( fresh, ('visible', {'start': '2004 MAY 2 TDB'}) )
+    with pytest.raises( QueryError ):
+        ask( fresh, ('nothing', {'start': 0.0, 'stop': 1.0}) )
+    with pytest.raises( QueryError ):
+        ask( fresh, ('view', {'start': 0.0, 'stop': 1.0, 'colour': 'red'}) )
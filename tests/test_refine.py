@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Edge refinement and the tiered search against full searches.
+"""
+
+import numpy as np
+import pytest
+
+from interval_set import IntervalSet
+from mex_visible import viewpr, visibl
+from refine import edge_neighbourhoods, refine_edges
+
+#
+# Tolerance (s) for windows found by different searches, well above
+# the 1e-6 s GF convergence tolerance.
+#
+TOL = 1.0e-5
+
+TRUTH = IntervalSet( [[100.0, 250.0], [400.0, 410.0], [700.0, 900.0]] )
+
+
+def assert_close(window, expect, tol=TOL):
+    window = IntervalSet.from_cell( window )
+    expect = IntervalSet.from_cell( expect )
+    assert len( window ) == len( expect )
+    np.testing.assert_allclose( window.array, expect.array, rtol=0.0,
+                                atol=tol )
+
+
+def truth_search(calls):
+    """
+    Search that finds TRUTH within its confinement window and
+    records the confinement windows it was given.
+    """
+    def search(cnfine, step):
+        calls.append( IntervalSet.from_cell( cnfine ) )
+        return TRUTH & IntervalSet.from_cell( cnfine )
+    return search
+
+
+def test_neighbourhoods_cover_edges():
+    nbhd = edge_neighbourhoods( TRUTH, 5.0 )
+    assert np.all( nbhd.contains( TRUTH.array.ravel() ) )
+    assert nbhd.measure() < TRUTH.measure()
+
+
+def test_refine_within_margin():
+    coarse = IntervalSet( TRUTH.array + [[3.0, -2.0]] )
+    calls = []
+    window = refine_edges( coarse, 10.0, truth_search( calls ), 5.0,
+                           IntervalSet( [[0.0, 1000.0]] ) )
+    assert_close( window, TRUTH )
+    assert len( calls ) >= 1
+    assert all( c.measure() < 200.0 for c in calls )
+
+
+def test_refine_doubles_margin():
+    #
+    # One edge moved by 15 s: a 10 s margin misses it, 20 s holds.
+    #
+    shifted = TRUTH.array.copy()
+    shifted[2, 0] += 15.0
+    calls = []
+    window = refine_edges( IntervalSet( shifted ), 10.0,
+                           truth_search( calls ), 5.0,
+                           IntervalSet( [[0.0, 1000.0]] ) )
+    assert_close( window, TRUTH )
+    assert max( c.measure() for c in calls ) < 1000.0
+
+
+def test_refine_falls_back_to_full_search():
+    shifted = TRUTH.array.copy()
+    shifted[0, 1] -= 100.0
+    calls = []
+    confine = IntervalSet( [[0.0, 1000.0]] )
+    window = refine_edges( IntervalSet( shifted ), 1.0,
+                           truth_search( calls ), 5.0, confine, tries=2 )
+    assert_close( window, TRUTH )
+    assert calls[-1] == confine
+
+
+@pytest.mark.parametrize( 'margin', [ 60.0, 0.5 ] )
+def test_dsk_refine_matches_full_search(kernel_dir, margin):
+    full = visibl( verbose=False )
+    refined = visibl( dsk_margin=margin, verbose=False )
+    assert_close( refined['visible_dsk'], full['visible_dsk'] )
+    assert_close( refined['visible_ellipsoid'], full['visible_ellipsoid'] )
+
+
+@pytest.mark.parametrize( 'coarse', [ 'LT', 'NONE' ] )
+def test_tiered_view_period_matches_full_search(kernel_dir, coarse):
+    full = viewpr( verbose=False )
+    tiered = viewpr( tiered=coarse, verbose=False )
+    assert len( full['view'] ) > 0
+    assert_close( tiered['view'], full['view'] )
+
+
+def test_tiered_visibility_matches_full_search(kernel_dir):
+    full = visibl( verbose=False )
+    tiered = visibl( tiered='LT', dsk_margin=60.0, verbose=False )
+    for name in ( 'view', 'visible_ellipsoid', 'visible_dsk' ):
+        assert_close( tiered[name], full[name] )
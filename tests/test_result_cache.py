@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+ResultCache hits and misses, its key, and LRU eviction.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import spiceypy
+import spiceypy.utils.support_types as stypes
+
+import parallel_search
+from interval_set import IntervalSet
+from result_cache import ResultCache
+
+WINDOW = IntervalSet( [[10.0, 20.0], [30.0, 45.5]] )
+
+GFOCLT = ( 'ANY', 'MARS', 'ELLIPSOID', 'IAU_MARS', 'MEX', 'POINT', ' ',
+           'CN', 'DSS-14', 120.0 )
+
+
+def fill(calls):
+    """
+    Search stand-in that writes WINDOW to result.
+    """
+    def run(result):
+        calls.append( 1 )
+        return WINDOW.to_cell( cell=result )
+    return run
+
+
+def test_hit_and_miss(kernels, tmp_path):
+    cache = ResultCache( str( tmp_path ) )
+    cnfine = IntervalSet( [[0.0, 100.0]] ).to_cell()
+    calls = []
+    for _ in range( 2 ):
+        result = stypes.SPICEDOUBLE_CELL( 20 )
+        cache.search( 'gfposc', ('MEX', 1.0), cnfine, result,
+                      lambda: fill( calls )( result ) )
+        assert IntervalSet.from_cell( result ) == WINDOW
+    assert len( calls ) == 1
+    assert ( cache.hits, cache.misses ) == ( 1, 1 )
+
+
+def test_key_changes_with_inputs(kernels, metakr, tmp_path):
+    cache = ResultCache( str( tmp_path / 'cache' ) )
+    cnfine = IntervalSet( [[0.0, 100.0]] ).to_cell()
+    key = cache.key( 'gfposc', ('MEX', 1.0), cnfine )
+    assert cache.key( 'gfposc', ('MEX', 1.0), cnfine ) == key
+    assert cache.key( 'gfposc', ('MEX', 2.0), cnfine ) != key
+    assert cache.key( 'gfoclt', ('MEX', 1.0), cnfine ) != key
+    assert cache.key( 'gfposc', ('MEX', 1.0),
+                      IntervalSet( [[0.0, 99.0]] ).to_cell() ) != key
+
+    #
+    # One more kernel loaded.
+    #
+    extra = str( tmp_path / 'extra.tls' )
+    shutil.copyfile( os.path.join( os.path.dirname( metakr ),
+                                   'synth.tls' ), extra )
+    spiceypy.furnsh( extra )
+    try:
+        assert cache.key( 'gfposc', ('MEX', 1.0), cnfine ) != key
+    finally:
+        spiceypy.unload( extra )
+    assert cache.key( 'gfposc', ('MEX', 1.0), cnfine ) == key
+
+
+def test_tolerance_is_part_of_key(kernels, tmp_path):
+    cache = ResultCache( str( tmp_path ) )
+    et0 = spiceypy.str2et( '2004 MAY 2 TDB' )
+    cnfine = IntervalSet( [[et0, et0 + 86400.0]] ).to_cell()
+    for tol in ( None, 1.0e-3, 1.0e-3 ):
+        parallel_search.gfoclt( *( GFOCLT + (cnfine,) ), cache=cache,
+                                tol=tol )
+    assert ( cache.hits, cache.misses ) == ( 1, 2 )
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache( str( tmp_path ) )
+    for i, key in enumerate( 'abc' ):
+        cache.put( key, WINDOW.array )
+        os.utime( cache._path( key ), ( 1000.0 * i, 1000.0 * i ) )
+    #
+    # A hit makes 'a' the most recently used, so 'b' goes first.
+    #
+    assert cache.get( 'a' ) is not None
+    cache.max_bytes = 2 * os.path.getsize( cache._path( 'a' ) )
+    cache.evict()
+    assert sorted( os.listdir( str( tmp_path ) ) ) == [ 'a.npy', 'c.npy' ]
+    np.testing.assert_array_equal( cache.get( 'c' ), WINDOW.array )
+    assert cache.get( 'b' ) is None
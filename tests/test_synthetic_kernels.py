@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+The Mars DSK written by write_dsk: vertices on the ellipsoid, plates
+facing outwards, and every ray towards the centre hitting the surface
+close to the ellipsoid, the poles included.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pytest
+import spiceypy
+
+from synthetic_kernels import MARS_RADII
+
+
+@pytest.fixture
+def dsk(metakr):
+    """
+    (handle, dladsc) of the synthetic Mars DSK segment.
+    """
+    path, = glob.glob( os.path.join( os.path.dirname( metakr ),
+                                     '*.bds' ) )
+    handle = spiceypy.dasopr( path )
+    dladsc = spiceypy.dlabfs( handle )
+    yield handle, dladsc
+    spiceypy.dascls( handle )
+
+
+def mesh(handle, dladsc):
+    nv, np_ = spiceypy.dskz02( handle, dladsc )
+    verts = np.asarray( spiceypy.dskv02( handle, dladsc, 1, nv ) )
+    plates = np.asarray( spiceypy.dskp02( handle, dladsc, 1, np_ ) )
+    return verts, plates
+
+
+def test_vertices_on_ellipsoid(dsk):
+    verts, _ = mesh( *dsk )
+    a, b, c = MARS_RADII
+    level = ( verts[:, 0] / a ) ** 2 + ( verts[:, 1] / b ) ** 2 + \
+            ( verts[:, 2] / c ) ** 2
+    np.testing.assert_allclose( level, 1.0, rtol=0.0, atol=1.0e-12 )
+
+
+def test_plates_face_outwards(dsk):
+    verts, plates = mesh( *dsk )
+    corner = [ verts[plates[:, k] - 1] for k in range( 3 ) ]
+    normal = np.cross( corner[1] - corner[0], corner[2] - corner[0] )
+    centroid = ( corner[0] + corner[1] + corner[2] ) / 3.0
+    assert np.all( np.sum( normal * centroid, axis=1 ) > 0.0 )
+    assert np.all( np.linalg.norm( normal, axis=1 ) > 0.0 )
+
+
+def test_rays_to_centre_hit_near_ellipsoid(dsk):
+    handle, dladsc = dsk
+    a, b, c = MARS_RADII
+    lats = np.radians( np.concatenate( ( np.linspace( -90.0, 90.0, 37 ),
+                                         [-89.9, -85.0, 85.0, 89.9] ) ) )
+    lons = np.radians( np.arange( -180.0, 180.0, 7.5 ) + 1.3 )
+    misses = 0
+    for lat in lats:
+        for lon in lons:
+            direction = spiceypy.latrec( 1.0, lon, lat )
+            vertex = np.multiply( direction, 1.0e5 )
+            point, found = spiceypy.dskx02( handle, dladsc, vertex,
+                                            np.negative( direction ) )[1:]
+            if not found:
+                misses += 1
+                continue
+            #
+            # A flat plate lies inside the ellipsoid by at most its
+            # sag, a few km for this tessellation.
+            #
+            surf = spiceypy.surfpt( vertex, np.negative( direction ),
+                                    a, b, c )[0]
+            assert np.linalg.norm( surf ) - np.linalg.norm( point ) < 5.0
+            assert np.linalg.norm( point ) <= max( MARS_RADII ) + 1.0e-6
+    assert misses == 0
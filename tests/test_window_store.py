@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+WindowStore put, append and block-indexed range queries against
+IntervalSet on random windows of several index blocks.
+"""
+
+import numpy as np
+import pytest
+
+from interval_set import IntervalSet
+from window_store import BLOCK, WindowStore, _block_index
+
+SEEDS = range( 5 )
+
+SPAN = 40000
+
+
+def random_window(rng, count=3000, lo=0, hi=SPAN):
+    """
+    count random intervals with integer endpoints, so that intervals
+    touch and singletons occur.
+    """
+    left = rng.integers( lo, hi, count ).astype( float )
+    length = rng.integers( 0, 12, count ) * ( rng.random( count ) < 0.8 )
+    return IntervalSet( np.column_stack( ( left, left + length ) ) )
+
+
+def random_ranges(rng, count=200):
+    ranges = np.sort( rng.uniform( -100.0, SPAN + 100.0, (count, 2) ) )
+    #
+    # Integer edges land on interval endpoints.
+    #
+    ranges[::3] = np.round( ranges[::3] )
+    ranges[1::7, 1] = ranges[1::7, 0]
+    return ranges
+
+
+def assert_queries(store, name, window, rng):
+    for start, stop in random_ranges( rng ):
+        span = IntervalSet( [[start, stop]] )
+        assert store.query( name, start, stop, clip=True ) == window & span
+        overlap = ( window.ends >= start ) & ( window.begins <= stop )
+        assert store.query( name, start, stop ) == \
+               IntervalSet( window.array[overlap] )
+
+
+@pytest.fixture( params=SEEDS )
+def rng(request):
+    return np.random.default_rng( request.param )
+
+
+def test_put_and_query(tmp_path, rng):
+    store = WindowStore( str( tmp_path ) )
+    window = random_window( rng )
+    assert len( window ) > 4 * BLOCK
+    store.put( 'MEX/DSS-14/visible', window.to_cell(), search='visibl' )
+    assert store.names() == ['MEX/DSS-14/visible']
+    assert store.count( 'MEX/DSS-14/visible' ) == len( window )
+    assert store.info( 'MEX/DSS-14/visible' )['meta'] == \
+           {'search': 'visibl'}
+    assert IntervalSet( np.array( store.window( 'MEX/DSS-14/visible' ) ) ) \
+           == window
+    assert_queries( store, 'MEX/DSS-14/visible', window, rng )
+
+
+def test_append_matches_union(tmp_path, rng):
+    store = WindowStore( str( tmp_path ) )
+    expect = IntervalSet()
+    #
+    # Each piece starts inside the stored window, so that it merges
+    # with intervals of earlier blocks, or past its end.
+    #
+    for lo in ( 0, 15000, 12000, 30000, 39000, 5000 ):
+        piece = random_window( rng, 800, lo, min( lo + 10000, SPAN ) )
+        store.append( 'w', piece.to_cell() )
+        expect = expect | piece
+        data = np.array( store.window( 'w' ) )
+        assert IntervalSet( data ) == expect
+        np.testing.assert_array_equal( store._index( 'w' ),
+                                       _block_index( data ) )
+        assert store.info( 'w' )['count'] == len( expect )
+    store.append( 'w', IntervalSet().to_cell() )
+    assert store.count( 'w' ) == len( expect )
+    assert_queries( store, 'w', expect, rng )
+
+
+def test_empty_window(tmp_path):
+    store = WindowStore( str( tmp_path ) )
+    store.put( 'empty', IntervalSet().to_cell() )
+    assert len( store.query( 'empty', 0.0, 1.0 ) ) == 0
+    assert len( store.window( 'empty' ) ) == 0
+    store.remove( 'empty' )
+    assert 'empty' not in store
+    with pytest.raises( ValueError ):
+        store.put( '../outside', IntervalSet().to_cell() )
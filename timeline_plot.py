@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Timeline plots of many windows, one row per category.
+
+Each row (simultaneous, invisible, a station's view periods, the
+eclipses, ...) is a single PolyCollection of bars, the artist
+broken_barh builds, however many intervals it holds. What is drawn
+depends on the current x range: intervals outside it are skipped,
+gaps narrower than a pixel are merged and intervals narrower than a
+pixel are widened to one, so a row never has more bars than the axes
+has pixels across. Zooming an interactive plot redraws the bars for
+the new range.
+
+    tl = Timeline()                         # Agg canvas, no display
+    tl.add( 'DSS-14', result14['visible'] )
+    tl.add( 'DSS-43', result43['visible'] )
+    tl.add( 'eclipse', shade_result['penumbra'], color='k' )
+    tl.save( 'timeline.png' )
+
+ET windows are converted to UTC once, when added (the leapsecond
+kernel must be loaded, or pass table=); add_dates takes begin and
+end datetimes directly. For an interactive window pass ax from
+plt.subplots() instead.
+"""
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+
+from et_convert import LeapSecondTable, window2datetime
+from interval_set import IntervalSet
+
+COLORS = ['tab:blue', 'tab:orange', 'tab:green', 'tab:red', 'tab:purple',
+          'tab:brown', 'tab:pink', 'tab:gray', 'tab:olive', 'tab:cyan']
+
+HEIGHT = 0.6
+
+
+def level_of_detail(array, left, right, pixel):
+    """
+    The intervals of a normalized (N,2) array that overlap
+    [left, right], with gaps of at most pixel merged and every
+    interval at least pixel wide.
+    """
+    first = np.searchsorted( array[:, 1], left, side='left' )
+    last = np.searchsorted( array[:, 0], right, side='right' )
+    part = IntervalSet._wrap( array[first:last] ).fill( pixel ).array
+    if len( part ):
+        short = part[:, 1] - part[:, 0] < pixel
+        middle = 0.5 * ( part[short, 0] + part[short, 1] )
+        part = part.copy()
+        part[short, 0] = middle - 0.5 * pixel
+        part[short, 1] = middle + 0.5 * pixel
+    return part
+
+
+def _verts(part, y):
+    """
+    Rectangles for the intervals of part on row y, shape (N,4,2).
+    """
+    verts = np.empty( ( len( part ), 4, 2 ) )
+    verts[:, 0, 0] = verts[:, 1, 0] = part[:, 0]
+    verts[:, 2, 0] = verts[:, 3, 0] = part[:, 1]
+    verts[:, 0, 1] = verts[:, 3, 1] = y - 0.5 * HEIGHT
+    verts[:, 1, 1] = verts[:, 2, 1] = y + 0.5 * HEIGHT
+    return verts
+
+
+class Timeline(object):
+
+    def __init__(self, ax=None, width=12.0, dpi=100, table=None):
+        """
+        Draw on ax, or on a new Agg figure width inches wide.
+        """
+        if ax is None:
+            fig = Figure( figsize=( width, 2.0 ), dpi=dpi )
+            FigureCanvasAgg( fig )
+            ax = fig.add_subplot( 111 )
+        self.ax = ax
+        self.figure = ax.figure
+        self.table = table
+        self.rows = []
+        self._updating = False
+        ax.xaxis_date()
+        ax.callbacks.connect( 'xlim_changed', self._changed )
+
+    def add(self, label, window, color=None):
+        """
+        Add a row for an ET window (SPICE cell, IntervalSet or (N,2)
+        array).
+        """
+        if self.table is None:
+            self.table = LeapSecondTable()
+        begins, ends = window2datetime( window, 'ms', self.table,
+                                        as_datetime=False )
+        return self.add_dates( label, begins, ends, color )
+
+    def add_result(self, result, prefix='', colors=None):
+        """
+        Add a row for every window of an export.SearchResult.
+        """
+        if colors is None:
+            colors = {}
+        self.table = result.table
+        for label, window in result.windows.items():
+            self.add( prefix + label, window, colors.get( label ) )
+
+    def add_dates(self, label, begins, ends, color=None):
+        """
+        Add a row from arrays of begin and end datetimes.
+        """
+        begins = np.asarray( begins, dtype='datetime64[ms]' )
+        ends = np.asarray( ends, dtype='datetime64[ms]' )
+        begins, ends = mdates.date2num( begins ), mdates.date2num( ends )
+        array = IntervalSet( np.column_stack( ( begins, ends ) ) ).array
+        if color is None:
+            color = COLORS[len( self.rows ) % len( COLORS )]
+        y = len( self.rows )
+        artist = PolyCollection( [], facecolors=color, edgecolors='none' )
+        self.ax.add_collection( artist )
+        self.rows.append( { 'label': label, 'array': array, 'y': y,
+                            'artist': artist } )
+        self._layout()
+        return artist
+
+    def extent(self):
+        """
+        (left, right) date numbers spanning every row.
+        """
+        arrays = [row['array'] for row in self.rows if len( row['array'] )]
+        if not arrays:
+            return 0.0, 1.0
+        return ( min( a[0, 0] for a in arrays ),
+                 max( a[-1, 1] for a in arrays ) )
+
+    def _layout(self):
+        ax = self.ax
+        ax.set_yticks( [row['y'] for row in self.rows] )
+        ax.set_yticklabels( [row['label'] for row in self.rows] )
+        ax.set_ylim( -0.5, len( self.rows ) - 0.5 )
+        self.figure.set_figheight( max( 2.0, 0.4 * len( self.rows ) + 1.2 ) )
+        left, right = self.extent()
+        if right <= left:
+            right = left + 1.0
+        ax.set_xlim( left, right )
+
+    def _changed(self, ax):
+        if not self._updating:
+            self.update()
+
+    def update(self):
+        """
+        Redraw every row for the current x range.
+        """
+        self._updating = True
+        try:
+            left, right = self.ax.get_xlim()
+            pixels = max( self.ax.get_window_extent().width, 1.0 )
+            pixel = ( right - left ) / pixels
+            for row in self.rows:
+                part = level_of_detail( row['array'], left, right, pixel )
+                row['artist'].set_verts( _verts( part, row['y'] ) )
+        finally:
+            self._updating = False
+
+    def save(self, path, **kwargs):
+        self.update()
+        self.figure.autofmt_xdate()
+        self.figure.savefig( path, bbox_inches='tight', **kwargs )
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent, memory-mapped store of named windows.
+
+Each window, named like a path ('MEX/DSS-14/visible',
+'MEX/shade/penumbra'), is kept under the store directory as
+
+    <name>.win    the sorted, disjoint intervals as raw float64
+                  (begin, end) pairs, opened with np.memmap
+    <name>.idx    sparse time index: (first begin, last end) of every
+                  block of BLOCK intervals (one 4 KiB page)
+    <name>.json   block size, interval count and the search inputs
+
+A range query bisects the small index, then one block at each end of
+the range, so only the pages holding the answer are read however long
+the archive is:
+
+    store = WindowStore( './windows' )
+    store.save_result( 'MEX/DSS-14', visibl( verbose=False ) )
+    week = store.query( 'MEX/DSS-14/visible', et0, et0 + 7 * spd )
+
+append adds later intervals by rewriting only the tail of the file,
+so rolling-horizon searches (incremental.py) can extend an archive.
+put replaces a window atomically; append assumes a single writer.
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from interval_set import IntervalSet
+
+BLOCK = 256
+
+SUFFIXES = ( '.win', '.idx', '.json' )
+
+
+def _block_index(data):
+    """
+    (first begin, last end) of every BLOCK intervals of data.
+    """
+    if len( data ) == 0:
+        return np.empty( (0, 2) )
+    first = np.arange( 0, len( data ), BLOCK )
+    last = np.minimum( first + BLOCK, len( data ) ) - 1
+    return np.column_stack( ( data[first, 0], data[last, 1] ) )
+
+
+def _write(path, array):
+    #
+    # Write to a temporary file and rename so that readers in other
+    # processes never see a partial file.
+    #
+    fd, tmp = tempfile.mkstemp( dir=os.path.dirname( path ), suffix='.tmp' )
+    with os.fdopen( fd, 'wb' ) as f:
+        f.write( np.ascontiguousarray( array, dtype='<f8' ).tobytes() )
+    os.replace( tmp, path )
+
+
+class WindowStore(object):
+
+    def __init__(self, directory='./windows'):
+        self.directory = directory
+        if not os.path.isdir( directory ):
+            os.makedirs( directory )
+
+    def _path(self, name, suffix):
+        parts = name.strip( '/' ).split( '/' )
+        if not name or any( p in ( '', '.', '..' ) for p in parts ):
+            raise ValueError( 'bad window name {:s}'.format( repr( name ) ) )
+        return os.path.join( self.directory, *parts ) + suffix
+
+    def __contains__(self, name):
+        return os.path.exists( self._path( name, '.win' ) )
+
+    def names(self):
+        """
+        Names of all stored windows, sorted.
+        """
+        names = []
+        for root, _, files in os.walk( self.directory ):
+            for file in files:
+                if file.endswith( '.win' ):
+                    rel = os.path.relpath( os.path.join( root, file[:-4] ),
+                                           self.directory )
+                    names.append( rel.replace( os.sep, '/' ) )
+        return sorted( names )
+
+    def count(self, name):
+        return os.path.getsize( self._path( name, '.win' ) ) // 16
+
+    def info(self, name):
+        with open( self._path( name, '.json' ) ) as f:
+            return json.load( f )
+
+    #
+    # Reading.
+    #
+    def _data(self, name):
+        count = self.count( name )
+        if count == 0:
+            return np.empty( (0, 2) )
+        return np.memmap( self._path( name, '.win' ), dtype='<f8', mode='r',
+                          shape=(count, 2) )
+
+    def _index(self, name):
+        return np.fromfile( self._path( name, '.idx' ),
+                            dtype='<f8' ).reshape( -1, 2 )
+
+    def _locate(self, data, index, start, stop):
+        """
+        Slice of the intervals of data that overlap [start, stop].
+        """
+        b = np.searchsorted( index[:, 1], start, side='left' )
+        if b == len( index ):
+            return len( data ), len( data )
+        first = b * BLOCK + np.searchsorted( data[b * BLOCK:( b + 1 ) * BLOCK,
+                                                  1], start, side='left' )
+        b = np.searchsorted( index[:, 0], stop, side='right' ) - 1
+        if b < 0:
+            return 0, 0
+        last = b * BLOCK + np.searchsorted( data[b * BLOCK:( b + 1 ) * BLOCK,
+                                                 0], stop, side='right' )
+        return first, max( first, last )
+
+    def window(self, name):
+        """
+        The whole window as an IntervalSet backed by the memory map;
+        nothing is read until it is used.
+        """
+        return IntervalSet._wrap( self._data( name ) )
+
+    def query(self, name, start, stop, clip=False):
+        """
+        Intervals of the window that overlap [start, stop], as an
+        IntervalSet. With clip=True they are cut to [start, stop].
+        """
+        data = self._data( name )
+        if len( data ) == 0:
+            return IntervalSet()
+        first, last = self._locate( data, self._index( name ), start, stop )
+        array = np.array( data[first:last] )
+        if clip and len( array ):
+            array[0, 0] = max( array[0, 0], start )
+            array[-1, 1] = min( array[-1, 1], stop )
+        return IntervalSet._wrap( array )
+
+    #
+    # Writing.
+    #
+    def put(self, name, window, **meta):
+        """
+        Store window (a SPICE cell, an array or an IntervalSet) under
+        name, replacing what was there. meta is kept in <name>.json.
+        """
+        data = IntervalSet.from_cell( window ).array
+        path = self._path( name, '.win' )
+        if not os.path.isdir( os.path.dirname( path ) ):
+            os.makedirs( os.path.dirname( path ) )
+        _write( self._path( name, '.idx' ), _block_index( data ) )
+        _write( path, data )
+        self._write_info( name, len( data ), meta )
+
+    def append(self, name, window):
+        """
+        Merge window into the stored one. Only the intervals from the
+        first one the new intervals reach are rewritten.
+        """
+        new = IntervalSet.from_cell( window )
+        if name not in self:
+            self.put( name, new )
+            return
+        if len( new ) == 0:
+            return
+        data = self._data( name )
+        index = self._index( name )
+        info = self.info( name )
+
+        #
+        # The stored intervals before p are untouched; the rest are
+        # merged with the new ones. Start at a block boundary so the
+        # index can be redone from there.
+        #
+        p, _ = self._locate( data, index, new.array[0, 0], new.array[0, 0] )
+        p = ( p // BLOCK ) * BLOCK
+        tail = new.union( IntervalSet._wrap( np.array( data[p:] ) ) ).array
+        count = int( p ) + len( tail )
+        del data
+
+        with open( self._path( name, '.win' ), 'r+b' ) as f:
+            f.seek( p * 16 )
+            f.write( np.ascontiguousarray( tail, dtype='<f8' ).tobytes() )
+            f.truncate( count * 16 )
+        index = np.concatenate( ( index[:p // BLOCK],
+                                  _block_index( tail ) ) )
+        _write( self._path( name, '.idx' ), index )
+        self._write_info( name, count, info.get( 'meta', {} ) )
+
+    def _write_info(self, name, count, meta):
+        path = self._path( name, '.json' )
+        fd, tmp = tempfile.mkstemp( dir=os.path.dirname( path ),
+                                    suffix='.tmp' )
+        with os.fdopen( fd, 'w' ) as f:
+            json.dump( { 'block': BLOCK, 'count': count, 'meta': meta }, f,
+                       indent=1, default=str )
+        os.replace( tmp, path )
+
+    def remove(self, name):
+        for suffix in SUFFIXES:
+            try:
+                os.remove( self._path( name, suffix ) )
+            except OSError:
+                pass
+
+    def save_result(self, prefix, result):
+        """
+        Store every window of an export.SearchResult as
+        <prefix>/<label>, with the search inputs as metadata.
+        """
+        for label, window in result.windows.items():
+            self.put( prefix + '/' + label, window, search=result.name,
+                      inputs=result.inputs )